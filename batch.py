@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+AI Talks - Batch Runner
+Runs many panel discussions from a JSONL manifest with bounded parallelism,
+writing one output file per run and a summary report at the end.
+
+Each manifest line is a JSON object. Every field is optional except a topic:
+
+    {"id": "ubi", "topic": "Universal Basic Income: Necessity or Misguided Policy?"}
+    {"id": "geo", "topic_file": "topics/geo.txt", "max_chars": 30000, "output": "out/geo.txt"}
+
+Supported fields: id, topic, topic_file, prompt_file, final_prompt_file,
+ext_data_file, config, output, max_chars, max_tokens, temperature,
+challenge_prob, context, context_window, summary_every. Missing fields fall back to the command-line defaults.
+Each run's output file is written message by message while the run goes on,
+as are any --export files next to it (e.g. out/geo.jsonl for out/geo.txt).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils import read_file, parse_config, load_models_from_config, get_default_models
+from conversation import ConversationManager
+from rate_limiter import configure_rate_limits_from_config
+from resilience import configure_resilience_from_config
+from fake_provider import configure_fake_provider_from_config
+from context_strategies import CONTEXT_STRATEGIES, create_context_strategy_from_config
+from response_cache import DEFAULT_CACHE_FILE, clear_response_cache_file, configure_response_cache_from_config
+from transcript import DEFAULT_FLUSH_POLICY, FLUSH_POLICIES, TranscriptWriter
+from exporters import EXPORT_FORMATS, close_exporters, create_exporter, export_path_for
+from metrics import DEFAULT_METRICS_HOST, enable_metrics, start_metrics_server, write_metrics_snapshot
+from tracing import start_tracing, stop_tracing
+
+# Configuration defaults
+DEFAULT_MAX_CHARACTERS = 15000
+DEFAULT_MAX_TOKENS = 500
+DEFAULT_TEMPERATURE = 0.4
+DEFAULT_CHALLENGE_PROBABILITY = 0.2
+DEFAULT_PARALLEL = 4
+DEFAULT_OUTPUT_DIR = "batch_output"
+DEFAULT_CONTEXT_WINDOW = 10
+DEFAULT_SUMMARY_EVERY = 5
+
+# Guards the per-batch config cache, which run_one threads share
+_config_lock = threading.Lock()
+
+
+def setup_argument_parser():
+    """Configure command-line argument parsing"""
+    parser = argparse.ArgumentParser(
+        description="AI Talks - Run many panel discussions from a JSONL manifest"
+    )
+
+    parser.add_argument("manifest", type=str, help="Path to the JSONL manifest (one run per line)")
+    parser.add_argument("--parallel", type=int, default=DEFAULT_PARALLEL,
+                        help=f"Number of simulations to run at once (default: {DEFAULT_PARALLEL})")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Run all simulations on one asyncio event loop instead of worker threads")
+    parser.add_argument("--output-dir", type=str, default=DEFAULT_OUTPUT_DIR,
+                        help=f"Directory for per-run output files (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--summary", type=str, default=None,
+                        help="Path to the JSON summary report (default: <output-dir>/batch_summary.json)")
+    parser.add_argument("--config", type=str, default="config.txt",
+                        help="Default configuration file (default: config.txt)")
+    parser.add_argument("--prompt", type=str, default="prompt.txt",
+                        help="Default prompt file (default: prompt.txt)")
+    parser.add_argument("--final-prompt", type=str, default="prompt_fr.txt",
+                        help="Default final round prompt file (default: prompt_fr.txt)")
+    parser.add_argument("--ext-data", type=str, default="ext_data.txt",
+                        help="Default external data file (default: ext_data.txt)")
+    parser.add_argument("--max-chars", type=int, default=DEFAULT_MAX_CHARACTERS,
+                        help=f"Default maximum characters per conversation (default: {DEFAULT_MAX_CHARACTERS})")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS,
+                        help=f"Default maximum tokens per response (default: {DEFAULT_MAX_TOKENS})")
+    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE,
+                        help=f"Default temperature (default: {DEFAULT_TEMPERATURE})")
+    parser.add_argument("--challenge-prob", type=float, default=DEFAULT_CHALLENGE_PROBABILITY,
+                        help=f"Default challenge probability (default: {DEFAULT_CHALLENGE_PROBABILITY})")
+    parser.add_argument("--context", type=str, choices=CONTEXT_STRATEGIES, default="full",
+                        help="Default context strategy (default: full)")
+    parser.add_argument("--context-window", type=int, default=DEFAULT_CONTEXT_WINDOW,
+                        help=f"Default verbatim window for window/hybrid context (default: {DEFAULT_CONTEXT_WINDOW})")
+    parser.add_argument("--summary-every", type=int, default=DEFAULT_SUMMARY_EVERY,
+                        help=f"Default rolling-summary refresh interval (default: {DEFAULT_SUMMARY_EVERY})")
+    parser.add_argument("--flush", type=str, choices=FLUSH_POLICIES, default=DEFAULT_FLUSH_POLICY,
+                        help="How hard each message is pushed to its output file: none, message or fsync "
+                             f"(default: {DEFAULT_FLUSH_POLICY})")
+    parser.add_argument("--export", type=str, action="append", choices=EXPORT_FORMATS, default=[],
+                        help="Also export each run as per-turn records in this format, next to its output file "
+                             "(repeatable)")
+    parser.add_argument("--export-background", action="store_true",
+                        help="Write the --export files from background threads")
+    parser.add_argument("--metrics-port", type=int, default=None, metavar="PORT",
+                        help="Serve latency, error and throughput metrics in Prometheus format on "
+                             "http://HOST:PORT/metrics while the batch runs")
+    parser.add_argument("--metrics-host", type=str, default=DEFAULT_METRICS_HOST,
+                        help=f"Address the metrics endpoint listens on (default: {DEFAULT_METRICS_HOST})")
+    parser.add_argument("--metrics-json", type=str, default=None, metavar="PATH",
+                        help="Write a JSON snapshot of the metrics to PATH when the batch ends "
+                             "(default: <output-dir>/batch_metrics.json when --metrics-port is set)")
+    parser.add_argument("--trace", type=str, default=None, metavar="PATH",
+                        help="Write a Chrome/Perfetto trace of every run, round, turn and phase to PATH")
+    parser.add_argument("--cache", action="store_true",
+                        help="Answer repeated requests from a local response cache and store new responses in it")
+    parser.add_argument("--cache-read-only", action="store_true",
+                        help="Use the response cache without writing to it (implies --cache)")
+    parser.add_argument("--cache-file", type=str, default=DEFAULT_CACHE_FILE,
+                        help=f"Path to the response cache (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="Empty the response cache before running")
+
+    return parser
+
+
+def read_manifest(filepath):
+    """Read the JSONL manifest into a list of run records, assigning ids where missing"""
+    records = []
+    for line_number, line in enumerate(read_file(filepath).splitlines(), start=1):
+        line = line.strip()
+        # Ignore empty or commented-out lines
+        if not line or line.startswith('#'):
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on manifest line {line_number}: {e}")
+        record.setdefault("id", f"run{len(records) + 1:04d}")
+        records.append(record)
+    return records
+
+
+def read_optional(filepath):
+    """Read a text file, returning an empty string if it doesn't exist"""
+    try:
+        return read_file(filepath).strip()
+    except FileNotFoundError:
+        return ""
+
+
+def build_conversation(record, args, config_cache):
+    """Create a ConversationManager for one manifest record; returns (manager, output_file)"""
+    config_path = record.get("config", args.config)
+    with _config_lock:
+        config_data = config_cache.get(config_path)
+        if config_data is None:
+            config_data = parse_config(read_optional(config_path))
+            # Limits and breakers are shared per provider/API key across every
+            # run in the batch; they are in place before the config is cached,
+            # so no run can start calling providers without them
+            configure_rate_limits_from_config(config_data)
+            configure_resilience_from_config(config_data)
+            configure_fake_provider_from_config(config_data)
+            config_cache[config_path] = config_data
+
+    models_list = load_models_from_config(config_data) or get_default_models()
+
+    topic = record.get("topic")
+    if not topic:
+        if "topic_file" not in record:
+            raise ValueError("Manifest record needs a 'topic' or 'topic_file'")
+        topic = read_file(record["topic_file"]).strip()
+
+    output_file = record.get("output") or os.path.join(args.output_dir, f"{record['id']}.txt")
+
+    conversation = ConversationManager(
+        models_list=models_list,
+        topic=topic,
+        style_prompt=read_file(record.get("prompt_file", args.prompt)).strip(),
+        final_round_prompt=read_file(record.get("final_prompt_file", args.final_prompt)).strip(),
+        ext_data=read_optional(record.get("ext_data_file", args.ext_data)),
+        max_characters=record.get("max_chars", args.max_chars),
+        max_tokens=record.get("max_tokens", args.max_tokens),
+        temperature=record.get("temperature", args.temperature),
+        challenge_probability=record.get("challenge_prob", args.challenge_prob),
+        context_strategy=create_context_strategy_from_config(
+            record.get("context", args.context),
+            config_data,
+            record.get("context_window", args.context_window),
+            record.get("summary_every", args.summary_every)
+        ),
+        # Creates the output directory when the run starts
+        transcript=TranscriptWriter(output_file, args.flush),
+        exporters=[create_exporter(export_path_for(output_file, export_format), export_format,
+                                   background=args.export_background)
+                   for export_format in args.export]
+    )
+
+    return conversation, output_file
+
+
+def summarize_run(record, conversation, output_file, started, error=None):
+    """Build the summary entry for one finished (or failed) run"""
+    history = conversation.conversation_history if conversation else []
+    return {
+        "id": record["id"],
+        "status": "error" if error else "ok",
+        "error": error,
+        "output": output_file,
+        "messages": len(history),
+        "characters": conversation.total_characters if conversation else 0,
+        "usage": conversation.usage.total.as_dict() if conversation else None,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def close_outputs(conversation):
+    """Flush and close a failed run's partial output and export files"""
+    if conversation is None:
+        return
+    if conversation.transcript is not None:
+        conversation.transcript.close()
+    try:
+        close_exporters(conversation.exporters)
+    except Exception:
+        pass  # The run has already failed; its error is the one reported
+
+
+def run_one(record, args, config_cache):
+    """Run a single simulation in the calling thread"""
+    started = time.perf_counter()
+    conversation = None
+    output_file = None
+    try:
+        conversation, output_file = build_conversation(record, args, config_cache)
+        conversation.start_simulation()
+        conversation.write_to_file(output_file)
+        close_exporters(conversation.exporters)
+        return summarize_run(record, conversation, output_file, started)
+    except Exception as e:
+        close_outputs(conversation)
+        return summarize_run(record, conversation, output_file, started, error=str(e))
+
+
+async def arun_one(record, args, config_cache, semaphore):
+    """Run a single simulation on the event loop, bounded by `semaphore`"""
+    async with semaphore:
+        started = time.perf_counter()
+        conversation = None
+        output_file = None
+        try:
+            conversation, output_file = build_conversation(record, args, config_cache)
+            await conversation.run()
+            conversation.write_to_file(output_file)
+            close_exporters(conversation.exporters)
+            return summarize_run(record, conversation, output_file, started)
+        except Exception as e:
+            close_outputs(conversation)
+            return summarize_run(record, conversation, output_file, started, error=str(e))
+
+
+def print_result(result, done, total):
+    """Print a one-line progress report for a finished run"""
+    status = "ok" if result["status"] == "ok" else f"ERROR: {result['error']}"
+    print(f"[{done}/{total}] {result['id']}: {status} "
+          f"({result['characters']} chars, {result['seconds']:.1f}s)")
+
+
+def run_threaded(records, args):
+    """Run all records through a bounded thread pool"""
+    config_cache = {}
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        futures = [executor.submit(run_one, record, args, config_cache) for record in records]
+        for future in as_completed(futures):
+            results.append(future.result())
+            print_result(results[-1], len(results), len(records))
+    return results
+
+
+async def run_async(records, args):
+    """Run all records concurrently on one event loop"""
+    config_cache = {}
+    semaphore = asyncio.Semaphore(max(1, args.parallel))
+    tasks = [arun_one(record, args, config_cache, semaphore) for record in records]
+    results = []
+    for next_done in asyncio.as_completed(tasks):
+        results.append(await next_done)
+        print_result(results[-1], len(results), len(records))
+    return results
+
+
+def write_summary(results, records, summary_file, elapsed):
+    """Write the JSON summary report, with runs in manifest order"""
+    order = {record["id"]: i for i, record in enumerate(records)}
+    results = sorted(results, key=lambda result: order.get(result["id"], len(order)))
+
+    summary = {
+        "runs": len(results),
+        "succeeded": sum(1 for result in results if result["status"] == "ok"),
+        "failed": sum(1 for result in results if result["status"] != "ok"),
+        "total_characters": sum(result["characters"] for result in results),
+        "wall_seconds": round(elapsed, 3),
+        "results": results,
+    }
+
+    summary_dir = os.path.dirname(summary_file)
+    if summary_dir:
+        os.makedirs(summary_dir, exist_ok=True)
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    return summary
+
+
+def main():
+    parser = setup_argument_parser()
+    args = parser.parse_args()
+
+    try:
+        records = read_manifest(args.manifest)
+    except FileNotFoundError:
+        print(f"Error: Manifest file {args.manifest} not found.")
+        return 1
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    if not records:
+        print("Manifest contains no runs.")
+        return 0
+
+    # One response cache is shared by every run; its size limits come from the default config
+    if args.clear_cache:
+        clear_response_cache_file(args.cache_file)
+    if args.cache or args.cache_read_only:
+        try:
+            configure_response_cache_from_config(parse_config(read_optional(args.config)),
+                                                 args.cache_file, read_only=args.cache_read_only)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Error: {e}")
+            return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary_file = args.summary or os.path.join(args.output_dir, "batch_summary.json")
+
+    # Metrics are only collected when they are exported somewhere
+    metrics_file = args.metrics_json
+    if args.metrics_port is not None:
+        try:
+            server = start_metrics_server(args.metrics_port, args.metrics_host)
+        except OSError as e:
+            print(f"Error: Can't serve metrics on {args.metrics_host}:{args.metrics_port}: {e}")
+            return 1
+        print(f"Serving metrics on {server.url}")
+        metrics_file = metrics_file or os.path.join(args.output_dir, "batch_metrics.json")
+    elif metrics_file:
+        enable_metrics()
+
+    print("\nAI Talks - Batch Runner")
+    print(f"Runs: {len(records)}, parallel: {args.parallel}, engine: {'async' if args.use_async else 'threads'}\n")
+
+    if args.trace:
+        start_tracing(args.trace)
+    started = time.perf_counter()
+    try:
+        if args.use_async:
+            results = asyncio.run(run_async(records, args))
+        else:
+            results = run_threaded(records, args)
+    except KeyboardInterrupt:
+        print("\nBatch interrupted by user.")
+        return 130
+    finally:
+        if metrics_file:
+            write_metrics_snapshot(metrics_file)
+        if args.trace:
+            stop_tracing()
+
+    summary = write_summary(results, records, summary_file, time.perf_counter() - started)
+
+    print(f"\nBatch complete: {summary['succeeded']} succeeded, {summary['failed']} failed "
+          f"in {summary['wall_seconds']:.1f}s. Summary written to: {summary_file}")
+    if metrics_file:
+        print(f"Metrics written to: {metrics_file}")
+    if args.trace:
+        print(f"Trace written to: {args.trace}")
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+AI Talks - Orchestration Benchmark
+Runs complete simulations against the in-process fake provider (no network,
+no API keys) and measures the time spent in the orchestrator itself, i.e.
+everything except the provider calls, plus peak memory.
+
+Three sweeps vary one parameter at a time around a base point:
+
+    max_chars         total conversation size (default 15k to 10M characters)
+    panel             number of panelists (default 2 to 50)
+    response_tokens   words per fake reply
+
+Each point reports the time spent in generate_prompt, sanitize_output,
+add_message, run_conversation_round and write_to_file, the per-turn
+orchestrator overhead and the peak traced memory. Each sweep also gets a
+scaling exponent: the log-log slope of per-turn overhead against the swept
+parameter (overall and between neighbouring points). Roughly 0 means constant
+cost per turn; roughly 1 means the cost of a turn grows with the parameter,
+i.e. quadratic cost over a run. Prompts grow until they reach the provider's
+context cap, so the max_chars curve should flatten out at the large end.
+
+    python benchmark.py --output benchmark.json
+    python benchmark.py --max-chars 15000,1000000 --panels 5 --response-tokens 120
+
+With --imports it instead measures start-up cost in fresh interpreters: the
+time to import the CLI's modules, and for each provider the extra time its
+first client takes (mostly importing that provider's SDK), and the cost of
+importing every SDK up front.
+
+    python benchmark.py --imports
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from conversation import ConversationManager
+from context_strategies import create_context_strategy
+from fake_provider import configure_fake_provider
+from llm_clients import LLMClientPool
+
+# Sweep defaults
+DEFAULT_MAX_CHARS = "15000,100000,1000000,10000000"
+DEFAULT_PANELS = "2,5,10,20,50"
+DEFAULT_RESPONSE_TOKENS = "30,120,500"
+DEFAULT_BASE_MAX_CHARS = 100000
+DEFAULT_BASE_PANEL = 5
+DEFAULT_BASE_RESPONSE_TOKENS = 120
+DEFAULT_REPEAT = 3
+
+BENCHMARK_TOPIC = "Universal Basic Income: Necessity or Misguided Policy?"
+
+# Methods timed on each ConversationManager (provider calls are timed separately)
+TIMED_METHODS = ("generate_prompt", "sanitize_output", "add_message", "run_conversation_round", "write_to_file")
+TIMED_CLIENT_METHODS = ("generate", "generate_stream")
+
+# A model version per provider for the --imports benchmark
+IMPORT_BENCHMARK_MODELS = {
+    "openai": "gpt-4o-mini",
+    "anthropic": "claude-3-haiku-20240307",
+    "gemini": "gemini-1.5-flash",
+    "grok": "grok-2",
+    "mistral": "mistral-small-latest",
+    "fake": "fake-1",
+}
+
+# Run in a fresh interpreter: import the CLI, then optionally create one client
+IMPORT_BENCHMARK_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+loaded = time.perf_counter()
+client_seconds = None
+if len(sys.argv) > 1:
+    from llm_clients import create_llm_client
+    create_llm_client(sys.argv[1], "benchmark-key", sys.argv[2])
+    client_seconds = time.perf_counter() - loaded
+print(json.dumps({"startup_seconds": loaded - started, "client_seconds": client_seconds}))
+"""
+
+# The SDK module each provider's client imports (Grok reuses the OpenAI SDK)
+IMPORT_BENCHMARK_SDKS = {
+    "openai": "openai",
+    "anthropic": "anthropic",
+    "gemini": "google.generativeai",
+    "mistral": "mistralai",
+}
+
+# Run in a fresh interpreter: import each SDK module in turn (None if it isn't installed)
+IMPORT_SDKS_SCRIPT = """
+import importlib, json, sys, time
+seconds = {}
+for module in sys.argv[1:]:
+    started = time.perf_counter()
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        seconds[module] = None
+    else:
+        seconds[module] = time.perf_counter() - started
+print(json.dumps(seconds))
+"""
+
+
+def setup_argument_parser():
+    """Configure command-line argument parsing"""
+    parser = argparse.ArgumentParser(
+        description="AI Talks - Benchmark the conversation orchestrator against a fake provider"
+    )
+
+    parser.add_argument("--output", type=str, default=None,
+                        help="Path to the JSON report (default: print it to stdout)")
+    parser.add_argument("--max-chars", type=str, default=DEFAULT_MAX_CHARS,
+                        help=f"Comma-separated max_characters values to sweep (default: {DEFAULT_MAX_CHARS})")
+    parser.add_argument("--panels", type=str, default=DEFAULT_PANELS,
+                        help=f"Comma-separated panel sizes to sweep (default: {DEFAULT_PANELS})")
+    parser.add_argument("--response-tokens", type=str, default=DEFAULT_RESPONSE_TOKENS,
+                        help=f"Comma-separated reply lengths in words to sweep (default: {DEFAULT_RESPONSE_TOKENS})")
+    parser.add_argument("--base-max-chars", type=int, default=DEFAULT_BASE_MAX_CHARS,
+                        help=f"max_characters while another parameter is swept (default: {DEFAULT_BASE_MAX_CHARS})")
+    parser.add_argument("--base-panel", type=int, default=DEFAULT_BASE_PANEL,
+                        help=f"Panel size while another parameter is swept (default: {DEFAULT_BASE_PANEL})")
+    parser.add_argument("--base-response-tokens", type=int, default=DEFAULT_BASE_RESPONSE_TOKENS,
+                        help=f"Reply length while another parameter is swept (default: {DEFAULT_BASE_RESPONSE_TOKENS})")
+    parser.add_argument("--context", type=str, choices=("full", "window"), default="full",
+                        help="Context strategy to benchmark (default: full)")
+    parser.add_argument("--context-window", type=int, default=10,
+                        help="Verbatim window for --context window (default: 10)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream replies through an on_token callback, as the CLI and GUI do")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Timing runs per point; the fastest is reported (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Skip the extra traced run that measures peak memory")
+    parser.add_argument("--prompt", type=str, default="prompt.txt",
+                        help="Prompt file (default: prompt.txt)")
+    parser.add_argument("--final-prompt", type=str, default="prompt_fr.txt",
+                        help="Final round prompt file (default: prompt_fr.txt)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for speaker order and the fake replies (default: 0)")
+    parser.add_argument("--imports", action="store_true",
+                        help="Measure CLI start-up and per-provider SDK import time instead of the sweeps")
+    parser.add_argument("--fail-exponent", type=float, default=None,
+                        help="Exit with status 1 if the max_chars sweep's scaling exponent exceeds this "
+                             "(e.g. 0.5 catches per-turn cost growing with the conversation size)")
+
+    return parser
+
+
+def parse_values(text, name):
+    """Parse a comma-separated list of positive integers"""
+    try:
+        values = [int(float(value)) for value in text.split(",") if value.strip()]
+    except ValueError:
+        raise ValueError(f"{name} must be a comma-separated list of numbers, got {text!r}")
+    if not values or min(values) < 1:
+        raise ValueError(f"{name} needs at least one positive value, got {text!r}")
+    return values
+
+
+def read_optional(filepath, default):
+    """Read a text file, falling back to `default` if it doesn't exist"""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return default
+
+
+class PhaseTimer:
+    """Accumulates call counts and time for wrapped callables"""
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+
+    def wrap(self, name, function):
+        """Return `function` wrapped so its calls are counted and timed under `name`"""
+        self.calls.setdefault(name, 0)
+        self.seconds.setdefault(name, 0.0)
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.seconds[name] += perf_counter() - started
+                self.calls[name] += 1
+
+        return timed
+
+    def as_dict(self, turns):
+        phases = {}
+        for name in self.calls:
+            calls, seconds = self.calls[name], self.seconds[name]
+            phases[name] = {
+                "calls": calls,
+                "seconds": round(seconds, 6),
+                "mean_us": round(seconds / calls * 1e6, 3) if calls else 0.0,
+                "per_turn_us": round(seconds / turns * 1e6, 3) if turns else 0.0,
+            }
+        return phases
+
+
+class TimedClientPool(LLMClientPool):
+    """Client pool whose clients report their provider calls to a PhaseTimer"""
+    def __init__(self, timer):
+        super().__init__()
+        self.timer = timer
+
+    def get(self, provider, api_key, model_version, system_prompt=None):
+        client = super().get(provider, api_key, model_version, system_prompt)
+        if not getattr(client, "_benchmark_timed", False):
+            for method in TIMED_CLIENT_METHODS:
+                setattr(client, method, self.timer.wrap("provider_call", getattr(client, method)))
+            client._benchmark_timed = True
+        return client
+
+
+def make_panel(size):
+    """Model configurations for `size` fake panelists"""
+    return [
+        {"name": f"Panelist{i + 1:02d}", "provider": "fake", "apikey": "", "version": f"fake-{i + 1}"}
+        for i in range(size)
+    ]
+
+
+def run_simulation(point, args, prompts, trace_memory=False):
+    """
+    Run one full simulation for a sweep point. Returns the measurements;
+    with `trace_memory` only the peak traced memory is meaningful, since
+    tracing slows everything down.
+    """
+    configure_fake_provider(response_tokens=str(point["response_tokens"]), seed=args.seed)
+    random.seed(args.seed)
+
+    timer = PhaseTimer()
+    if args.context == "window":
+        context_strategy = create_context_strategy("window", window_turns=args.context_window)
+    else:
+        context_strategy = create_context_strategy("full")
+
+    conversation = ConversationManager(
+        models_list=make_panel(point["panel"]),
+        topic=BENCHMARK_TOPIC,
+        style_prompt=prompts[0],
+        final_round_prompt=prompts[1],
+        max_characters=point["max_chars"],
+        # Large enough that replies are only cut short by the character budget
+        max_tokens=point["response_tokens"] * 2,
+        client_pool=TimedClientPool(timer),
+        context_strategy=context_strategy
+    )
+    for method in TIMED_METHODS:
+        setattr(conversation, method, timer.wrap(method, getattr(conversation, method)))
+    if args.stream:
+        conversation.on_token = lambda speaker, delta: None
+
+    output_fd, output_file = tempfile.mkstemp(prefix="ai_talks_benchmark_", suffix=".txt")
+    os.close(output_fd)
+    try:
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        conversation.start_simulation()
+        conversation.write_to_file(output_file)
+        wall = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        os.remove(output_file)
+
+    turns = timer.calls.get("provider_call", 0)
+    provider_seconds = timer.seconds.get("provider_call", 0.0)
+    overhead = wall - provider_seconds
+    return {
+        "turns": turns,
+        "messages": len(conversation.conversation_history),
+        "characters": conversation.total_characters,
+        "wall_seconds": round(wall, 6),
+        "provider_seconds": round(provider_seconds, 6),
+        "overhead_seconds": round(overhead, 6),
+        "overhead_per_turn_us": round(overhead / turns * 1e6, 3) if turns else 0.0,
+        "phases": timer.as_dict(turns),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def measure_point(point, args, prompts):
+    """Time a point (fastest of --repeat runs) and optionally measure its peak memory"""
+    best = None
+    for _ in range(max(1, args.repeat)):
+        result = run_simulation(point, args, prompts)
+        if best is None or result["overhead_seconds"] < best["overhead_seconds"]:
+            best = result
+
+    if not args.no_memory:
+        best["peak_memory_bytes"] = run_simulation(point, args, prompts, trace_memory=True)["peak_memory_bytes"]
+
+    return dict(point, **best)
+
+
+def scaling_exponent(points, parameter, metric):
+    """Least-squares slope of log(metric) against log(parameter), or None if undefined"""
+    pairs = [(math.log(point[parameter]), math.log(value))
+             for point in points
+             for value in [metric(point)]
+             if value and value > 0]
+    if len(pairs) < 2:
+        return None
+    mean_x = sum(x for x, _ in pairs) / len(pairs)
+    mean_y = sum(y for _, y in pairs) / len(pairs)
+    spread = sum((x - mean_x) ** 2 for x, _ in pairs)
+    if spread == 0:
+        return None
+    return round(sum((x - mean_x) * (y - mean_y) for x, y in pairs) / spread, 3)
+
+
+def segment_exponents(points, parameter, metric):
+    """Scaling exponent between each pair of neighbouring points (the shape of the curve)"""
+    return [scaling_exponent(points[i:i + 2], parameter, metric) for i in range(len(points) - 1)]
+
+
+def run_sweep(parameter, values, args, prompts):
+    """Measure every value of one parameter with the others at their base values"""
+    points = []
+    for value in values:
+        point = {
+            "max_chars": args.base_max_chars,
+            "panel": args.base_panel,
+            "response_tokens": args.base_response_tokens,
+        }
+        point[parameter] = value
+        print(f"  {parameter}={value} ...", end="", flush=True, file=sys.stderr)
+        points.append(measure_point(point, args, prompts))
+        print(f" {points[-1]['turns']} turns, {points[-1]['overhead_per_turn_us']:.0f} us/turn overhead",
+              file=sys.stderr)
+
+    return {
+        "parameter": parameter,
+        "points": points,
+        "scaling": {
+            "overhead_per_turn": scaling_exponent(points, parameter, lambda p: p["overhead_per_turn_us"]),
+            "generate_prompt": scaling_exponent(points, parameter,
+                                                lambda p: p["phases"]["generate_prompt"]["mean_us"]),
+            "peak_memory": scaling_exponent(points, parameter, lambda p: p["peak_memory_bytes"]),
+            "overhead_per_turn_segments": segment_exponents(points, parameter,
+                                                            lambda p: p["overhead_per_turn_us"]),
+        },
+    }
+
+
+def time_startup(provider=None, repeat=DEFAULT_REPEAT):
+    """
+    Time a fresh interpreter importing the CLI (and creating a `provider`
+    client). Returns the fastest of `repeat` runs, with the whole process's
+    wall time, or {"error": ...} if the run failed.
+    """
+    command = [sys.executable, "-c", IMPORT_BENCHMARK_SCRIPT]
+    if provider:
+        command += [provider, IMPORT_BENCHMARK_MODELS[provider]]
+    return _fastest_run(command, repeat)
+
+
+def time_sdk_imports(repeat=DEFAULT_REPEAT):
+    """
+    Time importing every provider SDK, one after another, in a fresh
+    interpreter: what each start would pay if the SDKs were imported up
+    front. Later SDKs reuse modules the earlier ones loaded (HTTP clients,
+    pydantic), so only the total is the real up-front cost.
+    """
+    modules = list(dict.fromkeys(IMPORT_BENCHMARK_SDKS.values()))
+    return _fastest_run([sys.executable, "-c", IMPORT_SDKS_SCRIPT] + modules, repeat)
+
+
+def _fastest_run(command, repeat):
+    """
+    Run `command` (a script printing a JSON object of timings) `repeat` times
+    and return the output of the fastest run, with the whole process's wall
+    time, or {"error": ...} if a run failed
+    """
+    best = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        completed = subprocess.run(command, capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        process_seconds = time.perf_counter() - started
+        if completed.returncode != 0:
+            lines = completed.stderr.strip().splitlines()
+            return {"error": lines[-1] if lines else f"exit status {completed.returncode}"}
+
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result["process_seconds"] = process_seconds
+        if best is None or process_seconds < best["process_seconds"]:
+            best = result
+
+    return {key: round(value, 6) if value is not None else None for key, value in best.items()}
+
+
+def run_import_benchmark(args):
+    """Measure start-up time, and the extra cost of each provider's first client"""
+    print("AI Talks - Start-up Benchmark", file=sys.stderr)
+    startup = time_startup(repeat=args.repeat)
+    print(f"  CLI modules: {startup.get('startup_seconds', 0) * 1000:.1f} ms", file=sys.stderr)
+
+    sdks = time_sdk_imports(repeat=args.repeat)
+    sdk_seconds = {module: seconds for module, seconds in sdks.items() if module != "process_seconds"}
+    missing = sorted(module for module, seconds in sdk_seconds.items() if seconds is None)
+    for module, seconds in sdk_seconds.items():
+        print(f"  import {module}: " + ("not installed" if seconds is None else f"{seconds * 1000:.1f} ms"),
+              file=sys.stderr)
+
+    providers = {}
+    for provider in IMPORT_BENCHMARK_MODELS:
+        providers[provider] = time_startup(provider, repeat=args.repeat)
+        result = providers[provider]
+        if "error" in result:
+            print(f"  {provider}: {result['error']}", file=sys.stderr)
+        else:
+            print(f"  {provider}: +{result['client_seconds'] * 1000:.1f} ms", file=sys.stderr)
+
+    return {
+        "cli": startup,
+        "providers": providers,
+        "sdk_imports": sdk_seconds,
+        # What every start would pay with all SDKs imported up front; None
+        # unless every SDK is installed, since a partial sum would understate it
+        "all_sdks_seconds": None if missing or "error" in sdks else round(sum(sdk_seconds.values()), 6),
+        "missing_sdks": missing,
+    }
+
+
+def environment_info():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "created": time.time(),
+    }
+
+
+def write_report(report, output):
+    """Write the JSON report to `output`, or print it"""
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"Report written to: {output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+def main():
+    parser = setup_argument_parser()
+    args = parser.parse_args()
+
+    if args.imports:
+        write_report({"environment": environment_info(), "imports": run_import_benchmark(args)}, args.output)
+        return 0
+
+    try:
+        sweeps = (
+            ("max_chars", parse_values(args.max_chars, "--max-chars")),
+            ("panel", parse_values(args.panels, "--panels")),
+            ("response_tokens", parse_values(args.response_tokens, "--response-tokens")),
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    prompts = (
+        read_optional(args.prompt, "Debate the topic with the other panelists."),
+        read_optional(args.final_prompt, "Give your closing statement."),
+    )
+
+    print(f"AI Talks - Orchestration Benchmark ({args.context} context)", file=sys.stderr)
+    report = {
+        "environment": environment_info(),
+        "settings": {
+            "context": args.context,
+            "context_window": args.context_window if args.context == "window" else None,
+            "stream": args.stream,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "base": {
+                "max_chars": args.base_max_chars,
+                "panel": args.base_panel,
+                "response_tokens": args.base_response_tokens,
+            },
+        },
+        "sweeps": {},
+    }
+
+    started = time.perf_counter()
+    for parameter, values in sweeps:
+        print(f"Sweeping {parameter}:", file=sys.stderr)
+        report["sweeps"][parameter] = run_sweep(parameter, values, args, prompts)
+    report["wall_seconds"] = round(time.perf_counter() - started, 3)
+
+    write_report(report, args.output)
+
+    exponent = report["sweeps"]["max_chars"]["scaling"]["overhead_per_turn"]
+    if args.fail_exponent is not None and exponent is not None and exponent > args.fail_exponent:
+        print(f"Per-turn overhead scales as max_chars^{exponent} (limit {args.fail_exponent})", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Record/replay "cassettes" of provider traffic for offline simulations.
+
+In record mode every response a client hands back (with its latency), and every
+circuit-breaker availability check, is appended to a JSONL cassette file. In
+replay mode `create_llm_client` returns clients that serve those recordings
+instead of calling the providers. The cassette header stores the seed for
+`random`, so a replayed run reproduces the original byte for byte.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+
+CASSETTE_FORMAT = 1
+
+
+class CassetteRecorder:
+    """Appends interactions to a cassette file as they happen"""
+    def __init__(self, path, seed=None):
+        self.path = path
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8')
+        self._write({"cassette": CASSETTE_FORMAT, "seed": seed, "created": time.time()})
+
+    def _write(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            # Flush each line so a crashed run still leaves a usable cassette
+            self._file.flush()
+
+    def record_response(self, provider, model, key, latency, fields):
+        """Save one request's response (`fields` as produced by LLMResponse.cassette_fields)"""
+        self._write({"type": "response", "provider": provider, "model": model,
+                     "key": key, "latency": latency, "response": fields})
+
+    def record_availability(self, provider, model, available):
+        """Save the result of a circuit-breaker availability check"""
+        self._write({"type": "availability", "provider": provider, "model": model,
+                     "available": available})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Cassette:
+    """
+    A recorded cassette loaded for replay. Responses are matched by request
+    key; identical requests get their recordings back in the original order.
+    """
+    def __init__(self, path, reproduce_latency=False):
+        self.path = path
+        self.reproduce_latency = reproduce_latency
+        self.seed = None
+        self._responses = {}
+        self._availability = {}
+        self._lock = threading.Lock()
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid cassette line {line_number} in {path}: {e}")
+
+                if "cassette" in record:
+                    if record["cassette"] != CASSETTE_FORMAT:
+                        raise ValueError(f"Unsupported cassette format {record['cassette']} in {path}")
+                    self.seed = record.get("seed")
+                elif record.get("type") == "response":
+                    self._responses.setdefault(record["key"], deque()).append(record)
+                elif record.get("type") == "availability":
+                    key = (record["provider"], record["model"])
+                    self._availability.setdefault(key, deque()).append(record["available"])
+
+    def next_response(self, key):
+        """Pop the next recording for a request key, or None if there is none left"""
+        with self._lock:
+            recordings = self._responses.get(key)
+            return recordings.popleft() if recordings else None
+
+    def next_availability(self, provider, model):
+        """Pop the next recorded availability check (True once they run out)"""
+        with self._lock:
+            checks = self._availability.get((provider, model))
+            return checks.popleft() if checks else True
+
+
+_recorder = None
+_replay_cassette = None
+
+
+def get_cassette_recorder():
+    """The active recorder, or None when not recording"""
+    return _recorder
+
+
+def get_replay_cassette():
+    """The cassette being replayed, or None when not replaying"""
+    return _replay_cassette
+
+
+def start_recording(path, seed=None):
+    """Record every provider response from now on to a new cassette at `path`"""
+    global _recorder
+    stop_recording()
+    _recorder = CassetteRecorder(path, seed)
+    return _recorder
+
+
+def stop_recording():
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+    _recorder = None
+
+
+def start_replay(path, reproduce_latency=False):
+    """Serve responses from the cassette at `path` to clients created from now on"""
+    global _replay_cassette
+    _replay_cassette = Cassette(path, reproduce_latency)
+    return _replay_cassette
+
+
+def stop_replay():
+    global _replay_cassette
+    _replay_cassette = None
@@ -0,0 +1,148 @@
+"""
+Checkpoints for resuming interrupted simulations.
+
+A checkpoint is an append-only JSONL file: a header with the run's settings,
+then every message as it is added, with a state record (character count,
+speaking order and position, final round progress, RNG state...) after each
+turn. Appending keeps a checkpoint's cost per turn constant however long the
+conversation gets. On load, the last state record wins and any messages
+written after it are dropped.
+"""
+
+import json
+import os
+import threading
+
+
+CHECKPOINT_FORMAT = 1
+DEFAULT_CHECKPOINT_EVERY = 1
+
+
+class CheckpointWriter:
+    """
+    Appends messages and turn states to a checkpoint file. State records are
+    written every `every` turns; phase changes (e.g. the start of the final
+    round) are always written.
+    """
+    def __init__(self, path, every=DEFAULT_CHECKPOINT_EVERY):
+        self.path = path
+        self.every = max(1, every)
+        self._turns = 0
+        self._file = None
+        # Re-entrant so a signal handler can close the file mid-write
+        self._lock = threading.RLock()
+
+    def start(self, header, messages=(), turns=None, state=None):
+        """
+        Begin a new checkpoint file with `header`, any messages (with their
+        turn metadata) already in the conversation and, when resuming, the
+        state being resumed. The file is written to `<path>.tmp` and then moved
+        over `path`, so a checkpoint resumed from the same path is never left
+        emptied or half-rewritten.
+        """
+        with self._lock:
+            self._close_locked()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            self._file = open(temp_path, 'w', encoding='utf-8')
+            self._turns = 0
+            self._write_locked(dict(header, checkpoint=CHECKPOINT_FORMAT))
+            for message, turn in zip(messages, turns or [None] * len(messages)):
+                self._write_locked(self._message_record(message, turn))
+            if state is not None:
+                self._write_locked({"state": state})
+            self._close_locked()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _write_locked(self, record):
+        self._file.write(json.dumps(record) + "\n")
+
+    @staticmethod
+    def _message_record(message, turn):
+        return {"message": message} if turn is None else {"message": message, "turn": turn}
+
+    def append_message(self, message, turn=None):
+        """Record a message added to the conversation, with its turn metadata if it has any"""
+        with self._lock:
+            if self._file is not None:
+                self._write_locked(self._message_record(message, turn))
+
+    def save_state(self, state, force=False):
+        """Record the conversation state after a turn (only every `every` turns unless forced)"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._turns += 1
+            if force or self._turns >= self.every:
+                self._turns = 0
+                self._write_locked({"state": state})
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+    def _close_locked(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Close and delete the checkpoint (the run finished, so there is nothing to resume)"""
+        with self._lock:
+            self._close_locked()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class Checkpoint:
+    """
+    A checkpoint loaded for resuming: the header, the saved state and the
+    history up to it, with each message's turn metadata (None if it has none)
+    """
+    def __init__(self, header, state, messages, turns=None):
+        self.header = header
+        self.state = state
+        self.messages = messages
+        self.turns = turns if turns is not None else [None] * len(messages)
+
+
+def load_checkpoint(path):
+    """Read a checkpoint file, raising ValueError if it is unusable"""
+    header = None
+    state = None
+    messages = []
+    turns = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                # A run killed mid-write can leave a truncated last line
+                if not line.endswith("\n"):
+                    break
+                raise ValueError(f"Invalid checkpoint line {line_number} in {path}: {e}")
+
+            if "checkpoint" in record:
+                if record["checkpoint"] != CHECKPOINT_FORMAT:
+                    raise ValueError(f"Unsupported checkpoint format {record['checkpoint']} in {path}")
+                header = record
+            elif "message" in record:
+                messages.append(record["message"])
+                turns.append(record.get("turn"))
+            elif "state" in record:
+                state = record["state"]
+
+    if header is None:
+        raise ValueError(f"{path} is not a checkpoint file")
+    if state is None:
+        raise ValueError(f"Checkpoint {path} has no saved state yet")
+    count = state["messages"]
+    return Checkpoint(header, state, messages[:count], turns[:count])
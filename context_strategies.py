@@ -0,0 +1,345 @@
+"""
+Strategies for how much of the conversation each speaker is shown.
+
+Every strategy receives each message once through `append()` and produces the
+"Conversation so far" text through `render()`. Messages are strings or
+messages.Message objects, which are only rendered (str()) when the text is
+built. `render()` takes an optional
+character cap (derived from the speaker's per-provider/model token limit) and
+always keeps the newest messages when it has to trim.
+"""
+
+import bisect
+from abc import ABC, abstractmethod
+from collections import deque
+
+from llm_clients import get_shared_client_pool
+from rate_limiter import PROVIDER_CONFIG_PREFIXES
+
+
+# Tokens of conversation context each provider is given, leaving room for the
+# static prompt and the reply. Entries in CONTEXT_TOKEN_LIMITS_BY_VERSION take
+# precedence (longest matching version prefix wins).
+CONTEXT_TOKEN_LIMITS = {
+    "OpenAI": 100000,
+    "Anthropic": 150000,
+    "Gemini": 800000,
+    "Grok": 100000,
+    "Mistral": 100000,
+    "Fake": 100000,
+}
+
+CONTEXT_TOKEN_LIMITS_BY_VERSION = {
+    "gpt-3.5-turbo": 12000,
+    "gpt-4-0613": 6000,
+    "gemini-pro": 24000,
+    "gemini-1.0-pro": 24000,
+    "mistral-tiny": 24000,
+    "mistral-small": 24000,
+}
+
+CONTEXT_STRATEGIES = ("full", "window", "summary", "hybrid")
+
+SUMMARY_HEADER = "(Summary of the earlier discussion)"
+
+
+def get_context_token_limit(provider_name, model_version):
+    """Context token cap for a provider/model, or None if unlimited"""
+    version = (model_version or "").lower()
+    matches = [prefix for prefix in CONTEXT_TOKEN_LIMITS_BY_VERSION if version.startswith(prefix)]
+    if matches:
+        return CONTEXT_TOKEN_LIMITS_BY_VERSION[max(matches, key=len)]
+    return CONTEXT_TOKEN_LIMITS.get(provider_name)
+
+
+def configure_context_limits_from_config(config_data):
+    """Read <PROVIDER>_CONTEXT_TOKENS keys from a parsed config dict"""
+    for provider_name, prefix in PROVIDER_CONFIG_PREFIXES.items():
+        raw = config_data.get(f"{prefix}_CONTEXT_TOKENS")
+        if raw:
+            try:
+                CONTEXT_TOKEN_LIMITS[provider_name] = int(raw)
+            except ValueError:
+                raise ValueError(f"{prefix}_CONTEXT_TOKENS must be an integer, got {raw!r}")
+
+
+def _join_newest(messages, max_chars):
+    """Join messages with newlines, dropping the oldest ones until the text fits"""
+    messages = list(messages)
+    if max_chars is not None:
+        total = sum(len(message) + 1 for message in messages) - 1
+        while len(messages) > 1 and total > max_chars:
+            total -= len(messages.pop(0)) + 1
+    return "\n".join(map(str, messages))
+
+
+class ContextBuffer:
+    """
+    Append-only "Conversation so far" text block. New messages are queued and
+    folded into the cached text once, the next time it's read, so building a
+    prompt never walks the whole history again.
+    """
+    def __init__(self):
+        self._text = ""
+        self._pending = []
+        self._empty = True
+
+    def append(self, message):
+        """Queue a message to be joined into the context text"""
+        self._pending.append(message)
+
+    def clear(self):
+        """Drop all buffered text"""
+        self._text = ""
+        self._pending = []
+        self._empty = True
+
+    @property
+    def text(self):
+        """The messages joined by newlines, same as "\\n".join(history)"""
+        if self._pending:
+            if not self._empty:
+                self._pending.insert(0, self._text)
+            self._text = "\n".join(map(str, self._pending))
+            self._pending = []
+            self._empty = False
+        return self._text
+
+
+class ContextStrategy(ABC):
+    """Base class: the whole conversation, every time"""
+    name = "full"
+
+    @abstractmethod
+    def reset(self):
+        """Forget all messages"""
+        pass
+
+    @abstractmethod
+    def append(self, message):
+        """Add a new message"""
+        pass
+
+    @abstractmethod
+    def render(self, max_chars=None):
+        """Return the context text, trimmed to `max_chars` from the oldest end"""
+        pass
+
+    def refresh(self):
+        """Do any deferred work (e.g. summarizing) before the next render"""
+
+    async def arefresh(self):
+        """Async version of refresh()"""
+
+
+class FullHistoryContext(ContextStrategy):
+    """
+    The entire conversation (the original behaviour). Message start offsets
+    are tracked so that, once the history outgrows a token cap, only the
+    messages that fit are joined. The rendered messages of the last capped
+    window are kept and shifted on the next render, so each message is
+    rendered about once and a capped prompt costs time in proportion to the
+    cap rather than to the whole history.
+    """
+    name = "full"
+
+    def __init__(self):
+        self.buffer = ContextBuffer()
+        self.messages = []
+        self.offsets = []
+        self.length = 0
+        # Rendered messages of the last capped window, and its first message's index
+        self._window = []
+        self._window_start = 0
+
+    def reset(self):
+        self.buffer.clear()
+        self.messages = []
+        self.offsets = []
+        self.length = 0
+        self._window = []
+        self._window_start = 0
+
+    def append(self, message):
+        if self.offsets:
+            self.length += 1  # Joining newline
+        self.offsets.append(self.length)
+        self.length += len(message)
+        self.messages.append(message)
+        self.buffer.append(message)
+
+    def render(self, max_chars=None):
+        if max_chars is None or self.length <= max_chars:
+            return self.buffer.text
+
+        # Start at the first message that begins inside the last max_chars,
+        # but always keep at least the newest message
+        start = min(bisect.bisect_left(self.offsets, self.length - max_chars), len(self.messages) - 1)
+        window, first = self._window, self._window_start
+        last = first + len(window)
+        if start >= last:
+            window[:] = map(str, self.messages[start:])
+        else:
+            # Trim or extend the old end to the new cap, then add the new messages
+            if start < first:
+                window[:0] = map(str, self.messages[start:first])
+            elif start > first:
+                del window[:start - first]
+            window.extend(map(str, self.messages[last:]))
+        self._window_start = start
+        return "\n".join(window)
+
+
+class SlidingWindowContext(ContextStrategy):
+    """Only the last `window_turns` messages"""
+    name = "window"
+
+    def __init__(self, window_turns=10):
+        self.window_turns = window_turns
+        self.recent = deque(maxlen=window_turns)
+
+    def reset(self):
+        self.recent.clear()
+
+    def append(self, message):
+        self.recent.append(message)
+
+    def render(self, max_chars=None):
+        return _join_newest(self.recent, max_chars)
+
+
+class RollingSummaryContext(ContextStrategy):
+    """
+    A running summary of older messages followed by the newest ones verbatim.
+    Messages that fall out of the verbatim window wait in `pending` until
+    `summary_every` of them have built up; the summarizer then folds them into
+    the summary in one call. With `window_turns=0` this is a pure rolling
+    summary; with a window it is the summary + sliding window combination.
+    """
+    name = "summary"
+
+    def __init__(self, summarizer, summary_every=5, window_turns=0):
+        self.summarizer = summarizer
+        self.summary_every = max(1, summary_every)
+        self.window_turns = window_turns
+        self.reset()
+
+    def reset(self):
+        self.summary = ""
+        self.pending = []
+        self.recent = deque()
+
+    def append(self, message):
+        self.recent.append(message)
+        while len(self.recent) > self.window_turns:
+            self.pending.append(self.recent.popleft())
+
+    def _needs_refresh(self):
+        return len(self.pending) >= self.summary_every
+
+    def _apply_summary(self, summary):
+        # On failure the pending messages are kept and shown verbatim
+        if summary:
+            self.summary = summary
+            self.pending = []
+
+    def refresh(self):
+        if self._needs_refresh():
+            self._apply_summary(self.summarizer.summarize(self.summary, self.pending))
+
+    async def arefresh(self):
+        if self._needs_refresh():
+            self._apply_summary(await self.summarizer.asummarize(self.summary, self.pending))
+
+    def render(self, max_chars=None):
+        messages = []
+        if self.summary:
+            messages.append(f"{SUMMARY_HEADER}\n{self.summary}")
+        messages.extend(self.pending)
+        messages.extend(self.recent)
+        return _join_newest(messages, max_chars)
+
+
+class LLMSummarizer:
+    """Folds new messages into a running summary using a (cheap) LLM client"""
+    prompt_template = (
+        "You maintain a running summary of a panel discussion between AI panelists.\n\n"
+        "Current summary:\n{summary}\n\n"
+        "New messages:\n{messages}\n\n"
+        "Write an updated summary that keeps every panelist's key arguments, "
+        "questions and disagreements, attributed by name. Use plain text, at most "
+        "{max_words} words. Output only the summary."
+    )
+
+    def __init__(self, llm_client, max_tokens=400, max_words=250, temperature=0.2):
+        self.llm_client = llm_client
+        self.max_tokens = max_tokens
+        self.max_words = max_words
+        self.temperature = temperature
+        # Called with (llm_client, response) after every summary call
+        self.on_response = None
+
+    def _build_prompt(self, summary, messages):
+        return self.prompt_template.format(
+            summary=summary or "(none yet)",
+            messages="\n\n".join(map(str, messages)),
+            max_words=self.max_words
+        )
+
+    def _result(self, response):
+        if self.on_response:
+            self.on_response(self.llm_client, response)
+        return "" if response.is_error else response.text
+
+    def summarize(self, summary, messages):
+        """Return the updated summary, or "" if the call failed"""
+        response = self.llm_client.generate(
+            self._build_prompt(summary, messages), max_tokens=self.max_tokens, temperature=self.temperature
+        )
+        return self._result(response)
+
+    async def asummarize(self, summary, messages):
+        """Async version of summarize()"""
+        response = await self.llm_client.agenerate(
+            self._build_prompt(summary, messages), max_tokens=self.max_tokens, temperature=self.temperature
+        )
+        return self._result(response)
+
+
+def create_context_strategy(name="full", window_turns=10, summary_every=5, summarizer=None):
+    """Build a context strategy by name: full, window, summary or hybrid"""
+    if name == "full":
+        return FullHistoryContext()
+    if name == "window":
+        return SlidingWindowContext(window_turns)
+    if name in ("summary", "hybrid"):
+        if summarizer is None:
+            raise ValueError(f"The '{name}' context strategy needs a summary model")
+        strategy = RollingSummaryContext(summarizer, summary_every,
+                                         window_turns if name == "hybrid" else 0)
+        strategy.name = name
+        return strategy
+    raise ValueError(f"Unknown context strategy: {name} (choose from {', '.join(CONTEXT_STRATEGIES)})")
+
+
+def create_context_strategy_from_config(name, config_data, window_turns=10, summary_every=5):
+    """
+    Build a context strategy by name, taking the summary model for the
+    summary/hybrid strategies from the SUMMARY_MODEL_NAME, SUMMARY_MODEL_APIKEY,
+    SUMMARY_MODEL_VERSION and (optional) SUMMARY_MODEL_PROVIDER config keys
+    """
+    configure_context_limits_from_config(config_data)
+
+    summarizer = None
+    if name in ("summary", "hybrid"):
+        provider = config_data.get("SUMMARY_MODEL_NAME")
+        if not provider:
+            raise ValueError(f"The '{name}' context strategy needs SUMMARY_MODEL_NAME in the config")
+        llm_client = get_shared_client_pool().get(
+            provider=config_data.get("SUMMARY_MODEL_PROVIDER") or provider,
+            api_key=config_data.get("SUMMARY_MODEL_APIKEY", ""),
+            model_version=config_data.get("SUMMARY_MODEL_VERSION", "")
+        )
+        summarizer = LLMSummarizer(llm_client)
+
+    return create_context_strategy(name, window_turns, summary_every, summarizer)
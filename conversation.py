@@ -1,6 +1,63 @@
 import re
 import random
-from llm_clients import create_llm_client
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_clients import get_shared_client_pool
+from context_strategies import FullHistoryContext, get_context_token_limit
+from usage import UsageReport
+from exporters import turn_record
+from metrics import get_metrics
+from tracing import span
+from messages import Message, message_from_record, turn_flags, write_message
+
+
+class TokenRatioTracker:
+    """
+    Learns how many characters each provider/model produces per output token,
+    from the usage reported with earlier responses. Thread-safe: it is shared
+    by every conversation in the process, and concurrent final-round requests
+    report to it from worker threads.
+    """
+    default_chars_per_token = 4.0
+    
+    def __init__(self):
+        self._totals = {}  # (provider, version) -> [characters, tokens]
+        self._lock = threading.Lock()
+        
+    def observe(self, key, characters, tokens):
+        """Record a response of `characters` characters that cost `tokens` tokens"""
+        if not tokens or not characters:
+            return
+        with self._lock:
+            totals = self._totals.setdefault(key, [0, 0])
+            totals[0] += characters
+            totals[1] += tokens
+        
+    def chars_per_token(self, key):
+        """Observed ratio for this provider/model, or the default if none yet"""
+        with self._lock:
+            totals = self._totals.get(key)
+            if not totals:
+                return self.default_chars_per_token
+            return totals[0] / totals[1]
+        
+    def snapshot(self):
+        """The observed totals as [provider, version, characters, tokens] rows"""
+        with self._lock:
+            return [[key[0], key[1], totals[0], totals[1]] for key, totals in self._totals.items()]
+        
+    def restore(self, rows):
+        """Replace the totals of the providers/models in a snapshot"""
+        with self._lock:
+            for provider, version, characters, tokens in rows:
+                self._totals[(provider, version)] = [characters, tokens]
+
+
+_shared_token_ratios = TokenRatioTracker()
+
+# Usage report entry for the calls that write the rolling summary
+SUMMARIZER_USAGE_NAME = "(summary model)"
 
 
 class ConversationManager:
@@ -15,7 +72,16 @@ class ConversationManager:
                  max_characters=15000, 
                  max_tokens=500, 
                  temperature=0.4,
-                 challenge_probability=0.2):
+                 challenge_probability=0.2,
+                 client_pool=None,
+                 concurrent_final_round=False,
+                 final_round_workers=4,
+                 budget_aware_tokens=True,
+                 min_turn_tokens=50,
+                 context_strategy=None,
+                 transcript=None,
+                 checkpoint=None,
+                 exporters=None):
         # Configuration
         self.models_list = models_list
         self.topic = topic
@@ -27,6 +93,49 @@ class ConversationManager:
         self.temperature = temperature
         self.challenge_probability = challenge_probability
         
+        # Final round statements all see the same history, so they can
+        # optionally be requested in parallel (bounded by final_round_workers)
+        self.concurrent_final_round = concurrent_final_round
+        self.final_round_workers = final_round_workers
+        
+        # Cap each discussion turn's max_tokens by the remaining character
+        # budget, and skip a turn entirely if fewer than min_turn_tokens fit
+        self.budget_aware_tokens = budget_aware_tokens
+        self.min_turn_tokens = min_turn_tokens
+        self.token_ratios = _shared_token_ratios
+        
+        # Token usage and latency of every provider call, per speaker
+        self.usage = UsageReport()
+        
+        # LLM clients are pooled so each speaker reuses one client (and its
+        # HTTP connections) for the whole run, and across runs in one process
+        self.client_pool = client_pool if client_pool is not None else get_shared_client_pool()
+        
+        # How much of the history each prompt includes (full history by
+        # default), capped per provider/model by get_context_token_limit
+        self.context = context_strategy if context_strategy is not None else FullHistoryContext()
+        summarizer = getattr(self.context, "summarizer", None)
+        if summarizer is not None:
+            # Summary calls count towards the run's usage like panelist calls
+            summarizer.on_response = self._observe_summary_usage
+        self._speakers_by_name = {info['name']: info for info in models_list}
+        
+        # Optional TranscriptWriter that gets each message as it is added,
+        # so the output file is written while the conversation runs
+        self.transcript = transcript
+        
+        # Optional CheckpointWriter that records the history and the state
+        # after every turn, so an interrupted run can be resumed
+        self.checkpoint = checkpoint
+        self._resume_from = None
+        
+        # Optional exporters (see exporters.py) that get a structured record,
+        # with the turn's metadata, for each message as it is added
+        self.exporters = list(exporters or [])
+        self._turn_responses = {}
+        # Concurrent final-round requests record their responses from worker threads
+        self._turn_lock = threading.Lock()
+        
         # State
         self.conversation_history = []
         self.total_characters = 0
@@ -34,17 +143,48 @@ class ConversationManager:
         self.last_speaker = None
         self.simulation_running = False
         
+        # Where the run is: "discussion" or "final", the current round's
+        # (speaker order, next position, speakers so far) and, in the final
+        # round, the history length at its start and who has spoken
+        self.phase = "discussion"
+        self._round = None
+        self._round_number = 0
+        self._final_base = None
+        self._final_done = set()
+        self._deferred_final_statements = []
+        
+        # Static prompt pieces, compiled once per speaker/variant
+        self._prompt_parts_cache = {}
+        
         # Callbacks
         self.on_message = None  # Called when a new message is added
         self.on_progress = None  # Called when progress is updated
         self.on_status = None  # Called when status changes
+        self.on_request = None  # Called with the speaker's name just before their provider call
+        self.on_token = None  # Called with (speaker, text delta) while a reply streams in
+        self.on_provider_event = None  # Called with (speaker, event, details) on retries and breaker trips
     
     def initialize_conversation(self):
         """Set up the initial conversation state"""
         self.conversation_history = []
+        self.context.reset()
+        self.usage.reset()
+        if self.transcript is not None:
+            self.transcript.start()
+        self._start_exporters()
+        self._turn_responses = {}
+        self._prompt_parts_cache = {}
         self.total_characters = 0
         self.discussion_started = False
         self.last_speaker = None
+        self.phase = "discussion"
+        self._round = None
+        self._round_number = 0
+        self._final_base = None
+        self._final_done = set()
+        self._deferred_final_statements = []
+        if self.checkpoint is not None:
+            self.checkpoint.start(self._checkpoint_header())
         
         # Build an introduction text
         intro_lines = [
@@ -56,16 +196,47 @@ class ConversationManager:
         
         intro_text = "\n".join(intro_lines)
         self.add_message(intro_text)
+        self._save_checkpoint(force=True)
         
         return intro_text
     
-    def add_message(self, message):
-        """Add a message to the conversation history"""
+    def add_message(self, message, turn=None):
+        """
+        Add a message (a Message, or a string for an announcement) to the
+        conversation history. `turn` is the metadata of a panelist's turn (see
+        _turn_info), which also sets the message's round and flags.
+        """
+        message = message_from_record(message, turn)
+        if turn is not None:
+            message.round, message.flags = turn["round"], turn_flags(turn)
+        if self.checkpoint is not None:
+            self.checkpoint.append_message(str(message), turn)
+        if turn is not None:
+            metrics = get_metrics()
+            if metrics is not None:
+                metrics.observe_turn(turn["provider"], turn["version"], len(message))
+        self._record_message(message, turn)
+    
+    def _record_message(self, message, turn=None):
+        """Add a message everywhere but the checkpoint"""
         self.conversation_history.append(message)
+        self.context.append(message)
         self.total_characters += len(message)
+        if self.transcript is not None:
+            self.transcript.append(message)
+        if self.exporters:
+            record = turn_record(len(self.conversation_history) - 1, message, turn)
+            for exporter in self.exporters:
+                exporter.export(record)
         
+        # Callbacks get the rendered "[Speaker]" text, as they always have
         if self.on_message:
-            self.on_message(message)
+            with span("on_message"):
+                self.on_message(str(message))
+    
+    def _start_exporters(self):
+        for exporter in self.exporters:
+            exporter.start(self.topic)
     
     def sanitize_output(self, response_text, speaker):
         """
@@ -85,10 +256,16 @@ class ConversationManager:
         
         return response_text
     
-    def generate_prompt(self, speaker, is_final_round=False, do_challenge=False):
-        """Create the prompt for the current state of the conversation"""
-        # Combine the entire conversation history into a single text block
-        context_text = "\n".join(self.conversation_history)
+    def _get_prompt_parts(self, speaker, is_final_round, do_challenge, include_ext_data):
+        """
+        Return the (head, tail) text that goes around the conversation context.
+        These only depend on the speaker and a few flags, so they are built once
+        and reused for every later turn.
+        """
+        cache_key = (speaker, is_final_round, do_challenge, include_ext_data)
+        parts = self._prompt_parts_cache.get(cache_key)
+        if parts is not None:
+            return parts
         
         # Choose which prompt to use based on whether it's the final round
         current_prompt = self.final_round_prompt if is_final_round else self.style_prompt
@@ -98,21 +275,20 @@ class ConversationManager:
         if do_challenge:
             challenge_fragment = "Please challenge or question the last point made."
         
-        # Only add external data if it's not empty and discussion has started or it's final round
-        should_include_ext_data = self.ext_data_original and (self.discussion_started or is_final_round)
         external_data_string = ""
-        if should_include_ext_data:
+        if include_ext_data:
             external_data_string = (
                 "***** Here is additional, external data and additional guidelines for you! ***** \n\n"
                 f": {self.ext_data_original}\n\n\n"
             )
         
-        # Build the full prompt
-        user_prompt = (
+        head = (
             f"{current_prompt}\n\n"
             f">>>>> Discussion topic: {self.topic} <<<<<\n\n\n"
             f"****** The Conversation so far: ******\n\n"
-            f"{context_text}\n\n"
+        )
+        tail = (
+            f"\n\n"
             f"****** End of The Conversation ******\n\n\n"
             f"{challenge_fragment}\n\n\n"
             f"{external_data_string}"
@@ -122,50 +298,233 @@ class ConversationManager:
             f"You are the speaker named {speaker}, but do NOT start your response with '[{speaker}]'.\n"
         )
         
-        return user_prompt
+        parts = (head, tail)
+        self._prompt_parts_cache[cache_key] = parts
+        return parts
+    
+    def generate_prompt(self, speaker, is_final_round=False, do_challenge=False):
+        """Create the prompt for the current state of the conversation"""
+        # Only add external data if it's not empty and discussion has started or it's final round
+        should_include_ext_data = bool(self.ext_data_original and (self.discussion_started or is_final_round))
+        
+        head, tail = self._get_prompt_parts(speaker, is_final_round, do_challenge, should_include_ext_data)
+        
+        # The context text is maintained incrementally as messages are added
+        context_text = self.context.render(self._context_char_limit(speaker))
+        return "".join((head, context_text, tail))
+    
+    def _context_char_limit(self, speaker):
+        """Characters of context the speaker's model may be sent, or None for no cap"""
+        speaker_info = self._speakers_by_name.get(speaker)
+        if speaker_info is None:
+            return None
+        
+        llm_client = self._get_client(speaker_info)
+        key = (llm_client.provider_name, llm_client.model_version)
+        token_limit = get_context_token_limit(*key)
+        if token_limit is None:
+            return None
+        return int(token_limit * self.token_ratios.chars_per_token(key))
     
-    def generate_response(self, speaker_info, is_final_round=False, do_challenge=False):
+    def generate_response(self, speaker_info, is_final_round=False, do_challenge=False, max_tokens=None):
         """Generate a response from a specific AI model"""
+        with span("context_refresh"):
+            self.context.refresh()
+        prompt_text = self._prepare_turn(speaker_info, is_final_round, do_challenge)
+        return self._request_response(speaker_info, prompt_text, max_tokens=max_tokens)
+    
+    async def agenerate_response(self, speaker_info, is_final_round=False, do_challenge=False, max_tokens=None):
+        """Async version of generate_response"""
+        with span("context_refresh"):
+            await self.context.arefresh()
+        prompt_text = self._prepare_turn(speaker_info, is_final_round, do_challenge)
+        return await self._arequest_response(speaker_info, prompt_text, max_tokens=max_tokens)
+    
+    def _prepare_turn(self, speaker_info, is_final_round, do_challenge):
+        """Report the upcoming turn and build its prompt"""
         speaker_name = speaker_info['name']
-        speaker_api_key = speaker_info['apikey']
-        speaker_version = speaker_info['version']
         
         # Update status if callback exists
         if self.on_status:
             self.on_status(f"Generating response from {speaker_name}...")
         
         # Create the prompt
-        prompt_text = self.generate_prompt(speaker_name, is_final_round, do_challenge)
-        
-        # Create the appropriate client using our factory
-        llm_client = create_llm_client(
-            provider=speaker_name,
-            api_key=speaker_api_key,
-            model_version=speaker_version
-        )
-        
-        # Generate the response
-        response = llm_client.generate(
-            prompt=prompt_text, 
-            max_tokens=self.max_tokens,
-            temperature=self.temperature
+        with span("prompt"):
+            return self.generate_prompt(speaker_name, is_final_round, do_challenge)
+    
+    def _get_client(self, speaker_info):
+        """Fetch the speaker's pooled client (created on first use)"""
+        # An explicit provider (MODELn_PROVIDER) wins over guessing from the name
+        return self.client_pool.get(
+            provider=speaker_info.get('provider') or speaker_info['name'],
+            api_key=speaker_info['apikey'],
+            model_version=speaker_info['version']
         )
-        
+    
+    def _format_response(self, speaker_name, response):
+        """
+        Turn an LLMResponse into the Message added to the history, which
+        renders as "[Speaker]" followed by the text
+        """
         # Get the text from the response
         response_text = str(response)
         
-        # Post-process the text to remove any accidental prefix,
-        # then add our single "[Speaker]:"
-        cleaned_response = self.sanitize_output(response_text, speaker_name)
-        formatted_response = f"[{speaker_name}]\n{cleaned_response}"
+        # Post-process the text to remove any accidental prefix; the single
+        # "[Speaker]" header is added when the message is rendered
+        with span("sanitize_output"):
+            cleaned_response = self.sanitize_output(response_text, speaker_name)
         
-        return formatted_response
+        return Message.from_speaker(speaker_name, cleaned_response)
     
-    def run_conversation_round(self):
-        """Run a single round of conversation with all models"""
-        if not self.simulation_running:
-            return False
+    def _token_callback(self, speaker_name, stream):
+        """Return the per-delta callback for a turn, or None when not streaming"""
+        if not (stream and self.on_token):
+            return None
+        return lambda delta: self.on_token(speaker_name, delta)
+    
+    def _event_callback(self, speaker_name):
+        """Return the retry/circuit-breaker event callback for a turn, if wanted"""
+        if not self.on_provider_event:
+            return None
+        return lambda event, details: self.on_provider_event(speaker_name, event, details)
+    
+    def _request_response(self, speaker_info, prompt_text, stream=True, max_tokens=None):
+        """
+        Send an already-built prompt to the speaker's model and format the reply.
+        The reply is streamed through on_token when that callback is set.
+        """
+        with span("get_client"):
+            llm_client = self._get_client(speaker_info)
+        on_token = self._token_callback(speaker_info['name'], stream)
+        on_event = self._event_callback(speaker_info['name'])
+        max_tokens = max_tokens or self.max_tokens
+        if self.on_request:
+            self.on_request(speaker_info['name'])
+        
+        with span("provider_call", speaker=speaker_info['name'], stream=bool(on_token)):
+            if on_token:
+                response = llm_client.generate_stream(
+                    prompt=prompt_text,
+                    max_tokens=max_tokens,
+                    temperature=self.temperature,
+                    on_token=on_token,
+                    on_event=on_event
+                )
+            else:
+                response = llm_client.generate(
+                    prompt=prompt_text, 
+                    max_tokens=max_tokens,
+                    temperature=self.temperature,
+                    on_event=on_event
+                )
+        self._observe_usage(speaker_info['name'], llm_client, response)
+        return self._format_response(speaker_info['name'], response)
+    
+    async def _arequest_response(self, speaker_info, prompt_text, stream=True, max_tokens=None):
+        """Async version of _request_response"""
+        with span("get_client"):
+            llm_client = self._get_client(speaker_info)
+        on_token = self._token_callback(speaker_info['name'], stream)
+        on_event = self._event_callback(speaker_info['name'])
+        max_tokens = max_tokens or self.max_tokens
+        if self.on_request:
+            self.on_request(speaker_info['name'])
+        
+        with span("provider_call", speaker=speaker_info['name'], stream=bool(on_token)):
+            if on_token:
+                response = await llm_client.agenerate_stream(
+                    prompt=prompt_text,
+                    max_tokens=max_tokens,
+                    temperature=self.temperature,
+                    on_token=on_token,
+                    on_event=on_event
+                )
+            else:
+                response = await llm_client.agenerate(
+                    prompt=prompt_text, 
+                    max_tokens=max_tokens,
+                    temperature=self.temperature,
+                    on_event=on_event
+                )
+        self._observe_usage(speaker_info['name'], llm_client, response)
+        return self._format_response(speaker_info['name'], response)
+    
+    def _observe_usage(self, speaker_name, llm_client, response):
+        """Keep a panelist's response for their turn's metadata and account for it"""
+        with self._turn_lock:
+            self._turn_responses[speaker_name] = (llm_client, response)
+        self._record_usage(speaker_name, llm_client, response)
+    
+    def _observe_summary_usage(self, llm_client, response):
+        """LLMSummarizer.on_response: account for a summary call"""
+        self._record_usage(SUMMARIZER_USAGE_NAME, llm_client, response)
+    
+    def _record_usage(self, name, llm_client, response):
+        """
+        Add a response to the usage report and learn the provider/model's
+        characters-per-token ratio from it
+        """
+        self.usage.record(name, response)
+        if not response.is_error:
+            self.token_ratios.observe((llm_client.provider_name, llm_client.model_version),
+                                      len(response.text), response.completion_tokens)
+    
+    def _turn_info(self, speaker_info, do_challenge=False):
+        """
+        The metadata of the turn `speaker_info` just took: who spoke, on which
+        provider and model, in which round, whether they were asked to
+        challenge, and the reply's latency and token usage
+        """
+        with self._turn_lock:
+            llm_client, response = self._turn_responses.pop(speaker_info['name'], (None, None))
+        return {
+            "speaker": speaker_info['name'],
+            "provider": llm_client.provider_name if llm_client else speaker_info.get('provider'),
+            "version": llm_client.model_version if llm_client else speaker_info['version'],
+            "phase": self.phase,
+            "round": self._round_number if self.phase == "discussion" else None,
+            "challenge": do_challenge,
+            "latency": None if response is None or response.latency is None else round(response.latency, 3),
+            "usage": None if response is None else {
+                "prompt_tokens": response.prompt_tokens,
+                "completion_tokens": response.completion_tokens,
+                "cached_tokens": response.cached_tokens,
+                "from_cache": response.from_cache,
+            },
+            "finish_reason": None if response is None else response.finish_reason,
+            "error": None if response is None else response.error,
+        }
+    
+    def _turn_token_budget(self, speaker_info):
+        """
+        max_tokens for a discussion turn: the configured limit, lowered so the
+        reply (plus its "[Speaker]" header) fits in the remaining character
+        budget, using the chars-per-token ratio learned for this model.
+        """
+        if not self.budget_aware_tokens:
+            return self.max_tokens
+        
+        llm_client = self._get_client(speaker_info)
+        chars_per_token = self.token_ratios.chars_per_token((llm_client.provider_name, llm_client.model_version))
+        
+        remaining = self.max_total_characters - self.total_characters - len(f"[{speaker_info['name']}]\n")
+        # Leave a little headroom, since the ratio varies from reply to reply
+        return min(self.max_tokens, int(0.9 * remaining / chars_per_token))
+    
+    def _is_speaker_available(self, speaker_info):
+        """
+        False if the speaker's provider circuit breaker is open. The speaker is
+        then skipped for this turn rather than waiting on a failing provider.
+        """
+        if self._get_client(speaker_info).is_available():
+            return True
         
+        if self.on_status:
+            self.on_status(f"Skipping {speaker_info['name']}: provider unavailable (circuit open)")
+        return False
+    
+    def _shuffle_speakers(self):
+        """Return a random speaking order for the next round"""
         # Create a random permutation of the entire list
         speaker_batch = self.models_list[:]
         random.shuffle(speaker_batch)
@@ -179,80 +538,444 @@ class ConversationManager:
             random.shuffle(speaker_batch)
             reshuffle_count += 1
         
-        for speaker_info in speaker_batch:
+        return speaker_batch
+    
+    def _add_turn(self, speaker_info, response, do_challenge=False):
+        """
+        Record a discussion turn. Returns False (without adding it) if the
+        response would push the conversation past the character limit.
+        """
+        turn = self._turn_info(speaker_info, do_challenge)
+        
+        # Once the first speaker has spoken, set the flag
+        if not self.discussion_started:
+            self.discussion_started = True
+        
+        # Check if we've reached the maximum character limit
+        if self.total_characters + len(response) > self.max_total_characters:
+            return False
+        
+        # Add the response to the conversation
+        self.add_message(response, turn)
+        self.last_speaker = speaker_info['name']
+        
+        # Update progress if callback exists
+        if self.on_progress:
+            progress = (self.total_characters / self.max_total_characters) * 80  # 80% of progress
+            self.on_progress(progress)
+        
+        return True
+    
+    def _report_final_progress(self, completed):
+        """Update progress during the final round"""
+        if self.on_progress:
+            progress = 80 + (completed / len(self.models_list)) * 20  # Last 20% of progress
+            self.on_progress(progress)
+    
+    def _start_round(self):
+        """
+        Return (speaking order, first position, speakers so far) for the next
+        round. A round interrupted by a checkpoint resume carries on where it was.
+        """
+        if self._round is None:
+            self._round = (self._shuffle_speakers(), 0, 0)
+            self._round_number += 1
+        return self._round
+    
+    def run_conversation_round(self):
+        """Run a single round of conversation with all models"""
+        if not self.simulation_running:
+            return False
+        
+        speaker_batch, start, spoken = self._start_round()
+        with span("round", round=self._round_number):
+            for position in range(start, len(speaker_batch)):
+                speaker_info = speaker_batch[position]
+                if not self.simulation_running:
+                    return False
+                
+                with span("turn", speaker=speaker_info['name'], round=self._round_number):
+                    if not self._is_speaker_available(speaker_info):
+                        continue
+                    
+                    # Don't pay for a reply that can't fit in the remaining budget
+                    max_tokens = self._turn_token_budget(speaker_info)
+                    if max_tokens < min(self.min_turn_tokens, self.max_tokens):
+                        return False
+                    
+                    # Decide whether to challenge
+                    do_challenge = random.random() < self.challenge_probability
+                    
+                    # Generate the response
+                    response = self.generate_response(speaker_info, False, do_challenge, max_tokens)
+                    
+                    if not self._add_turn(speaker_info, response, do_challenge):
+                        return False
+                    spoken += 1
+                    self._round = (speaker_batch, position + 1, spoken)
+                    self._save_checkpoint()
+        
+        self._round = None
+        # Stop if every panelist's provider is currently unavailable
+        return spoken > 0
+    
+    async def arun_conversation_round(self):
+        """Async version of run_conversation_round"""
+        if not self.simulation_running:
+            return False
+        
+        speaker_batch, start, spoken = self._start_round()
+        with span("round", round=self._round_number):
+            for position in range(start, len(speaker_batch)):
+                speaker_info = speaker_batch[position]
+                if not self.simulation_running:
+                    return False
+                
+                with span("turn", speaker=speaker_info['name'], round=self._round_number):
+                    if not self._is_speaker_available(speaker_info):
+                        continue
+                    
+                    # Don't pay for a reply that can't fit in the remaining budget
+                    max_tokens = self._turn_token_budget(speaker_info)
+                    if max_tokens < min(self.min_turn_tokens, self.max_tokens):
+                        return False
+                    
+                    # Decide whether to challenge
+                    do_challenge = random.random() < self.challenge_probability
+                    
+                    # Generate the response
+                    response = await self.agenerate_response(speaker_info, False, do_challenge, max_tokens)
+                    
+                    if not self._add_turn(speaker_info, response, do_challenge):
+                        return False
+                    spoken += 1
+                    self._round = (speaker_batch, position + 1, spoken)
+                    self._save_checkpoint()
+        
+        self._round = None
+        # Stop if every panelist's provider is currently unavailable
+        return spoken > 0
+    
+    def _begin_final_round(self):
+        """
+        Add the final round marker, unless a resumed run is already in the
+        final round
+        """
+        if self.phase != "final":
+            # Add the final round marker
+            final_round_marker = "FINAL ROUND"
+            self.add_message(final_round_marker)
+            self.phase = "final"
+            self._final_base = len(self.conversation_history)
+            self._final_done = set()
+            self._save_checkpoint(force=True)
+    
+    def _add_deferred_final_statements(self):
+        """Add back the final statements restored from a checkpoint (which already holds them)"""
+        for message, turn in self._deferred_final_statements:
+            self._record_message(message_from_record(message, turn), turn)
+        self._deferred_final_statements = []
+    
+    def _final_statement_done(self, model_info, completed):
+        """Note that a panelist's final statement is in (or skipped) and save a checkpoint"""
+        self._final_done.add(model_info['name'])
+        self._save_checkpoint(force=True)
+        self._report_final_progress(completed)
+    
+    def run_final_round(self):
+        """Run the final round where each model gives a concluding statement"""
+        if not self.simulation_running:
+            return False
+        
+        self._begin_final_round()
+        
+        if self.concurrent_final_round:
+            return self._run_final_round_concurrently()
+        
+        self._add_deferred_final_statements()
+        
+        # Have each model give a final statement
+        for i, model_info in enumerate(self.models_list):
             if not self.simulation_running:
                 return False
             
-            # Decide whether to challenge
-            do_challenge = random.random() < self.challenge_probability
-            
-            # Generate the response
-            response = self.generate_response(speaker_info, False, do_challenge)
+            if model_info['name'] in self._final_done:
+                continue
             
-            # Once the first speaker has spoken, set the flag
-            if not self.discussion_started:
-                self.discussion_started = True
+            if not self._is_speaker_available(model_info):
+                self._final_statement_done(model_info, i + 1)
+                continue
             
-            # Check if we've reached the maximum character limit
-            if self.total_characters + len(response) > self.max_total_characters:
-                return False
-            
-            # Add the response to the conversation
-            self.add_message(response)
-            self.last_speaker = speaker_info['name']
-            
-            # Update progress if callback exists
-            if self.on_progress:
-                progress = (self.total_characters / self.max_total_characters) * 80  # 80% of progress
-                self.on_progress(progress)
+            # Generate the final response
+            with span("turn", speaker=model_info['name'], phase="final"):
+                final_message = self.generate_response(model_info, is_final_round=True)
+                self.add_message(final_message, self._turn_info(model_info))
+            self._final_statement_done(model_info, i + 1)
         
-        return True  # Return True if the round completed successfully
+        return True
     
-    def run_final_round(self):
-        """Run the final round where each model gives a concluding statement"""
+    async def arun_final_round(self):
+        """Async version of run_final_round"""
         if not self.simulation_running:
             return False
         
-        # Add the final round marker
-        final_round_marker = "FINAL ROUND"
-        self.add_message(final_round_marker)
+        self._begin_final_round()
+        
+        if self.concurrent_final_round:
+            return await self._arun_final_round_concurrently()
+        
+        self._add_deferred_final_statements()
         
         # Have each model give a final statement
         for i, model_info in enumerate(self.models_list):
             if not self.simulation_running:
                 return False
             
-            # Generate the final response
-            final_message = self.generate_response(model_info, is_final_round=True)
-            self.add_message(final_message)
+            if model_info['name'] in self._final_done:
+                continue
             
-            # Update progress if callback exists
-            if self.on_progress:
-                progress = 80 + ((i + 1) / len(self.models_list)) * 20  # Last 20% of progress
-                self.on_progress(progress)
+            if not self._is_speaker_available(model_info):
+                self._final_statement_done(model_info, i + 1)
+                continue
+            
+            with span("turn", speaker=model_info['name'], phase="final"):
+                final_message = await self.agenerate_response(model_info, is_final_round=True)
+                self.add_message(final_message, self._turn_info(model_info))
+            self._final_statement_done(model_info, i + 1)
         
         return True
     
-    def start_simulation(self):
-        """Start the full conversation simulation process"""
+    def _prepare_final_round(self):
+        """
+        Build every available speaker's final-round prompt up front, before any
+        statement is added. Returns a list of (model_info, prompt) pairs.
+        """
+        speakers = []
+        for model_info in self.models_list:
+            if model_info['name'] in self._final_done:
+                continue
+            if self._is_speaker_available(model_info):
+                speakers.append((model_info, self.generate_prompt(model_info['name'], is_final_round=True)))
+            else:
+                self._final_done.add(model_info['name'])
+        
+        # Statements from before a resume go in after the prompts are built
+        self._add_deferred_final_statements()
+        self._save_checkpoint(force=True)
+        
+        if self.on_status:
+            self.on_status(f"Generating final statements from {len(speakers)} panelists...")
+        
+        return speakers
+    
+    def _flush_final_statements(self, speakers, results, next_to_add):
+        """Add every finished statement whose predecessors are all in; returns the new cursor"""
+        while next_to_add < len(results) and results[next_to_add] is not None:
+            model_info = speakers[next_to_add][0]
+            self.add_message(results[next_to_add], self._turn_info(model_info))
+            self._final_done.add(model_info['name'])
+            self._save_checkpoint(force=True)
+            next_to_add += 1
+        return next_to_add
+    
+    
+    def _run_final_round_concurrently(self):
+        """
+        Request every concluding statement at once through a bounded thread pool.
+        All final speakers are given the same history (none of them sees another
+        panelist's closing remarks), and statements are still added in models_list
+        order, each as soon as every statement before it has arrived. Replies are
+        not streamed here, since parallel deltas would interleave.
+        """
+        self.context.refresh()
+        speakers = self._prepare_final_round()
+        results = [None] * len(speakers)
+        next_to_add = 0
+        completed = len(self.models_list) - len(speakers)  # Skipped speakers count as done
+        
+        max_workers = max(1, min(self.final_round_workers, len(speakers)))
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = {
+                executor.submit(self._request_response, model_info, prompt_text, False): i
+                for i, (model_info, prompt_text) in enumerate(speakers)
+            }
+            
+            for future in as_completed(futures):
+                if not self.simulation_running:
+                    return False
+                
+                results[futures[future]] = future.result()
+                completed += 1
+                next_to_add = self._flush_final_statements(speakers, results, next_to_add)
+                self._report_final_progress(completed)
+        finally:
+            # Don't wait on (or start) outstanding requests if the run was stopped
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return True
+    
+    async def _arun_final_round_concurrently(self):
+        """Async version of _run_final_round_concurrently, bounded by a semaphore"""
+        await self.context.arefresh()
+        speakers = self._prepare_final_round()
+        results = [None] * len(speakers)
+        next_to_add = 0
+        completed = len(self.models_list) - len(speakers)  # Skipped speakers count as done
+        
+        semaphore = asyncio.Semaphore(max(1, self.final_round_workers))
+        
+        async def request(i, model_info, prompt_text):
+            async with semaphore:
+                return i, await self._arequest_response(model_info, prompt_text, stream=False)
+        
+        tasks = [asyncio.ensure_future(request(i, model_info, prompt_text))
+                 for i, (model_info, prompt_text) in enumerate(speakers)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                i, result = await next_done
+                if not self.simulation_running:
+                    return False
+                
+                results[i] = result
+                completed += 1
+                next_to_add = self._flush_final_statements(speakers, results, next_to_add)
+                self._report_final_progress(completed)
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        return True
+    
+    def _checkpoint_header(self):
+        """The run settings stored at the top of a checkpoint (no API keys)"""
+        return {
+            "topic": self.topic,
+            "style_prompt": self.style_prompt,
+            "final_round_prompt": self.final_round_prompt,
+            "ext_data": self.ext_data_original,
+            "max_characters": self.max_total_characters,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "challenge_probability": self.challenge_probability,
+            "speakers": [info['name'] for info in self.models_list],
+        }
+    
+    def _save_checkpoint(self, force=False):
+        """Record the current state in the checkpoint, if there is one"""
+        if self.checkpoint is None:
+            return
+        
+        version, internal_state, gauss_next = random.getstate()
+        speaker_batch = None
+        if self._round is not None:
+            speaker_batch, position, spoken = self._round
+        state = {
+            "messages": len(self.conversation_history),
+            "total_characters": self.total_characters,
+            "last_speaker": self.last_speaker,
+            "discussion_started": self.discussion_started,
+            "phase": self.phase,
+            "round_number": self._round_number,
+            "round": None if speaker_batch is None else {
+                "order": [info['name'] for info in speaker_batch],
+                "position": position,
+                "spoken": spoken,
+            },
+            "final_base": self._final_base,
+            "final_done": sorted(self._final_done),
+            "random_state": [version, list(internal_state), gauss_next],
+            "token_ratios": self.token_ratios.snapshot(),
+        }
+        with span("checkpoint"):
+            self.checkpoint.save_state(state, force=force)
+    
+    def resume(self, checkpoint):
+        """
+        Continue a run from a loaded Checkpoint (see checkpoint.py) the next
+        time the simulation is started, instead of starting from the intro.
+        Every speaker in the checkpoint must be in models_list; the panel is
+        put back in its original order so the speaking order replays exactly.
+        """
+        state = checkpoint.state
+        speakers = checkpoint.header["speakers"]
+        names = set(speakers)
+        if state.get("round"):
+            names.update(state["round"]["order"])
+        missing = sorted(names - set(self._speakers_by_name))
+        if missing:
+            raise ValueError(f"Panelists in the checkpoint are not configured: {', '.join(missing)}")
+        self.models_list = [self._speakers_by_name[name] for name in speakers]
+        self._resume_from = checkpoint
+    
+    def _restore_checkpoint(self, checkpoint):
+        """Rebuild the conversation state saved in a checkpoint"""
+        state = checkpoint.state
+        self.conversation_history = []
+        self.context.reset()
+        self.usage.reset()
+        self._turn_responses = {}
+        self._prompt_parts_cache = {}
+        self.total_characters = 0
+        
+        # Statements already made in the final round are added back once the
+        # final round resumes (a concurrent one builds its prompts first)
+        messages = list(zip(checkpoint.messages, checkpoint.turns))
+        final_base = state.get("final_base")
+        restored = messages if final_base is None else messages[:final_base]
+        self._deferred_final_statements = messages[len(restored):]
+        
+        # Start the checkpoint afresh from the state being resumed
+        if self.checkpoint is not None:
+            self.checkpoint.start(self._checkpoint_header(), checkpoint.messages, checkpoint.turns, state)
+        if self.transcript is not None:
+            self.transcript.start()
+        self._start_exporters()
+        for message, turn in restored:
+            self._record_message(message_from_record(message, turn), turn)
+        
+        self.last_speaker = state["last_speaker"]
+        self.discussion_started = state["discussion_started"]
+        self.phase = state["phase"]
+        self._round_number = state.get("round_number", 0)
+        round_state = state.get("round")
+        self._round = None
+        if round_state:
+            self._round = ([self._speakers_by_name[name] for name in round_state["order"]],
+                           round_state["position"], round_state["spoken"])
+        self._final_base = final_base
+        self._final_done = set(state.get("final_done", []))
+        
+        version, internal_state, gauss_next = state["random_state"]
+        random.setstate((version, tuple(internal_state), gauss_next))
+        self.token_ratios.restore(state.get("token_ratios", []))
+    
+    def _begin_simulation(self):
+        """Reset state (or restore it from a checkpoint) and announce the start of a run"""
         self.simulation_running = True
         
+        if self._resume_from is not None:
+            self._restore_checkpoint(self._resume_from)
+            self._resume_from = None
+            if self.on_status:
+                self.on_status("Simulation resumed from checkpoint...")
+            return
+        
         # Initialize the conversation
         self.initialize_conversation()
         
         # Update status if callback exists
         if self.on_status:
             self.on_status("Simulation started...")
-        
-        # Run conversation rounds until we hit the character limit
-        while self.total_characters < self.max_total_characters and self.simulation_running:
-            if not self.run_conversation_round():
-                break
-        
-        # Run the final round if we're still running
+    
+    def _in_discussion(self):
+        """True while discussion rounds should continue"""
+        return (self.phase == "discussion" and self.simulation_running and
+                self.total_characters < self.max_total_characters)
+    
+    def _finish_simulation(self):
+        """Announce completion (if not stopped) and mark the run as finished"""
         if self.simulation_running:
-            self.run_final_round()
-            
             # Update status when complete
             if self.on_status:
                 self.on_status("Simulation complete!")
@@ -264,6 +987,44 @@ class ConversationManager:
         self.simulation_running = False
         return self.conversation_history
     
+    def start_simulation(self):
+        """Start the full conversation simulation process"""
+        with span("run", topic=self.topic):
+            self._begin_simulation()
+            
+            # Run conversation rounds until we hit the character limit
+            while self._in_discussion():
+                if not self.run_conversation_round():
+                    break
+            
+            # Run the final round if we're still running
+            if self.simulation_running:
+                with span("final_round"):
+                    self.run_final_round()
+        
+        return self._finish_simulation()
+    
+    async def run(self):
+        """
+        Run the full simulation as a coroutine. Behaves exactly like
+        start_simulation, but provider calls go through the clients' async
+        APIs so many conversations can share one event loop.
+        """
+        with span("run", topic=self.topic):
+            self._begin_simulation()
+            
+            # Run conversation rounds until we hit the character limit
+            while self._in_discussion():
+                if not await self.arun_conversation_round():
+                    break
+            
+            # Run the final round if we're still running
+            if self.simulation_running:
+                with span("final_round"):
+                    await self.arun_final_round()
+        
+        return self._finish_simulation()
+    
     def stop_simulation(self):
         """Stop the running simulation"""
         self.simulation_running = False
@@ -274,8 +1035,13 @@ class ConversationManager:
     
     def write_to_file(self, filename):
         """Write the conversation to a file"""
+        if self.transcript is not None and self.transcript.holds(filename, len(self.conversation_history)):
+            # Every message is already in the file; just make sure it's on disk
+            self.transcript.close()
+            return filename
+        
         with open(filename, 'w', encoding='utf-8') as f:
-            for line in self.conversation_history:
-                f.write(line + "\n\n")
+            for message in self.conversation_history:
+                write_message(f, message)
         
         return filename
\ No newline at end of file
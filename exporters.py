@@ -0,0 +1,275 @@
+"""
+Structured transcript exporters. Each message added to a conversation becomes
+one record (speaker, provider, model version, round, challenge flag, latency
+and token usage for a panelist's turn) that is written to JSONL, Markdown or
+HTML as soon as the message is added. Wrapping an exporter in
+BackgroundExporter moves the formatting and writing to a separate thread so
+exporting never holds up the simulation.
+"""
+
+import html
+import json
+import os
+import queue
+import threading
+
+from messages import Message
+
+
+EXPORT_FORMATS = ("jsonl", "markdown", "html")
+EXPORT_EXTENSIONS = {
+    ".jsonl": "jsonl",
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".html": "html",
+    ".htm": "html",
+}
+DEFAULT_EXTENSIONS = {"jsonl": ".jsonl", "markdown": ".md", "html": ".html"}
+
+
+def turn_record(index, message, turn=None):
+    """
+    The exported record for the message (a Message or its rendered text) at
+    `index` in the history. `turn` is the metadata ConversationManager keeps
+    for a panelist's turn; messages without it (the introduction, the final
+    round marker) are announcements.
+    """
+    if turn is None:
+        return {"index": index, "type": "announcement", "speaker": None, "text": str(message)}
+
+    # Without the "[Speaker]" header; the speaker is a field of its own
+    if isinstance(message, Message):
+        text = message.text
+    else:
+        header = f"[{turn['speaker']}]\n"
+        text = message[len(header):] if message.startswith(header) else message
+    return dict(turn, index=index, type="turn", text=text)
+
+
+class Exporter:
+    """
+    Base class for exporters: writes a header when a conversation starts, one
+    entry per record (flushed, so the file is readable while the run goes on)
+    and a footer when closed. Subclasses implement the format methods.
+    """
+    format = None
+
+    def __init__(self, path):
+        self.path = path
+        self.records_written = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def start(self, topic):
+        """Begin a new export, replacing the file's contents"""
+        with self._lock:
+            self._close_locked()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self.records_written = 0
+            self._file.write(self.format_header(topic))
+            self._file.flush()
+
+    def export(self, record):
+        """Write one record"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(self.format_record(record))
+            self._file.flush()
+            self.records_written += 1
+
+    def close(self):
+        """Write the footer and close the file"""
+        with self._lock:
+            self._close_locked()
+
+    def _close_locked(self):
+        if self._file is not None:
+            self._file.write(self.format_footer())
+            self._file.close()
+            self._file = None
+
+    def format_header(self, topic):
+        return ""
+
+    def format_record(self, record):
+        raise NotImplementedError
+
+    def format_footer(self):
+        return ""
+
+
+class JSONLExporter(Exporter):
+    """One JSON object per line, one line per message"""
+    format = "jsonl"
+
+    def format_record(self, record):
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def describe_turn(record):
+    """A one-line summary of a turn's metadata, for the human-readable formats"""
+    parts = ["Final round" if record.get("phase") == "final" else f"Round {record.get('round')}"]
+    if record.get("provider") or record.get("version"):
+        parts.append(" ".join(str(part) for part in (record.get("provider"), record.get("version")) if part))
+    if record.get("challenge"):
+        parts.append("challenge")
+    if record.get("latency") is not None:
+        parts.append(f"{record['latency']:.2f} s")
+    usage = record.get("usage") or {}
+    if usage.get("prompt_tokens") is not None or usage.get("completion_tokens") is not None:
+        parts.append(f"{usage.get('prompt_tokens') or 0} prompt + {usage.get('completion_tokens') or 0} completion tokens")
+    if usage.get("from_cache"):
+        parts.append("cached")
+    if record.get("error"):
+        parts.append(f"error: {record['error']}")
+    return " · ".join(parts)
+
+
+class MarkdownExporter(Exporter):
+    """A Markdown document with a section per turn"""
+    format = "markdown"
+
+    def format_header(self, topic):
+        return f"# {topic}\n\n"
+
+    def format_record(self, record):
+        if record["type"] == "announcement":
+            quoted = "\n".join(f"> {line}" if line else ">" for line in record["text"].splitlines())
+            return f"{quoted}\n\n"
+        return f"## {record['speaker']}\n\n_{describe_turn(record)}_\n\n{record['text']}\n\n"
+
+
+class HTMLExporter(Exporter):
+    """A standalone HTML page with an article per turn"""
+    format = "html"
+
+    STYLE = (
+        "body{font-family:sans-serif;max-width:50em;margin:2em auto;padding:0 1em;line-height:1.5}"
+        ".text{white-space:pre-wrap}"
+        ".meta{color:#666;font-size:.85em}"
+        ".announcement{font-style:italic;border-left:3px solid #ccc;padding-left:1em}"
+        ".challenge{border-left:3px solid #c60;padding-left:1em}"
+    )
+
+    def format_header(self, topic):
+        title = html.escape(topic)
+        return (
+            "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{title}</title>\n<style>{self.STYLE}</style>\n</head>\n<body>\n"
+            f"<h1>{title}</h1>\n"
+        )
+
+    def format_record(self, record):
+        text = html.escape(record["text"])
+        if record["type"] == "announcement":
+            return f"<section class=\"announcement text\" id=\"m{record['index']}\">{text}</section>\n"
+        css_class = "turn challenge" if record.get("challenge") else "turn"
+        return (
+            f"<article class=\"{css_class}\" id=\"m{record['index']}\">\n"
+            f"<h2>{html.escape(record['speaker'])}</h2>\n"
+            f"<p class=\"meta\">{html.escape(describe_turn(record))}</p>\n"
+            f"<div class=\"text\">{text}</div>\n"
+            "</article>\n"
+        )
+
+    def format_footer(self):
+        return "</body>\n</html>\n"
+
+
+EXPORTERS = {
+    "jsonl": JSONLExporter,
+    "markdown": MarkdownExporter,
+    "html": HTMLExporter,
+}
+
+
+class BackgroundExporter:
+    """
+    Runs another exporter on a worker thread: start and export only queue the
+    work, so a slow disk never holds up the simulation. Records are written in
+    order; close waits for the queue to drain, and re-raises the first error
+    the worker hit.
+    """
+    _STOP = object()
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self.path = exporter.path
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, name=f"export-{self.exporter.format}", daemon=True)
+            self._thread.start()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            method, argument = item
+            if self._error is None:
+                try:
+                    method(argument)
+                except Exception as e:
+                    self._error = e
+
+    def start(self, topic):
+        self._ensure_thread()
+        self._queue.put((self.exporter.start, topic))
+
+    def export(self, record):
+        self._ensure_thread()
+        self._queue.put((self.exporter.export, record))
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+        self.exporter.close()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+def export_format_for(path):
+    """The export format implied by a file's extension, or None"""
+    return EXPORT_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def create_exporter(path, export_format=None, background=False):
+    """
+    Create an exporter writing to `path`. The format defaults to the one
+    implied by the file extension (.jsonl, .md or .html).
+    """
+    export_format = export_format or export_format_for(path)
+    if export_format not in EXPORTERS:
+        raise ValueError(f"Can't tell the export format of '{path}' "
+                         f"(use a .jsonl, .md or .html file, or choose from {', '.join(EXPORT_FORMATS)})")
+    exporter = EXPORTERS[export_format](path)
+    return BackgroundExporter(exporter) if background else exporter
+
+
+def export_path_for(output_file, export_format):
+    """The export file that goes next to an output file, e.g. out/run.txt -> out/run.jsonl"""
+    return os.path.splitext(output_file)[0] + DEFAULT_EXTENSIONS[export_format]
+
+
+def close_exporters(exporters):
+    """Close every exporter, even if one of them fails; re-raises the first error"""
+    first_error = None
+    for exporter in exporters or ():
+        try:
+            exporter.close()
+        except Exception as e:
+            if first_error is None:
+                first_error = e
+    if first_error is not None:
+        raise first_error
@@ -0,0 +1,208 @@
+"""
+In-process fake LLM provider for load and scaling tests.
+
+Select it with a model name containing "fake" or with MODELn_PROVIDER=fake.
+Replies are deterministic synthetic text derived from the prompt; latency,
+streaming speed, failures and reply length are drawn from distributions set
+with FAKE_* config keys:
+
+    FAKE_LATENCY=lognormal:0.8,0.3     Seconds before the first token
+    FAKE_TOKENS_PER_SEC=normal:60,10   Streaming speed (0 = instant)
+    FAKE_RESPONSE_TOKENS=uniform:80,200
+    FAKE_ERROR_RATE=0.02               Share of calls failing with a 503
+    FAKE_RATE_LIMIT_RATE=0.01          Share of calls failing with a 429
+    FAKE_SEED=0
+
+A distribution is a number (fixed) or one of fixed:x, uniform:low,high,
+normal:mean,sd, lognormal:median,sigma or exp:mean.
+"""
+
+import asyncio
+import hashlib
+import math
+import random
+import threading
+import time
+
+from llm_clients import BaseLLMClient, LLMResponse
+from rate_limiter import estimate_tokens
+
+
+# The model version of a fake speaker configured without one
+DEFAULT_MODEL_VERSION = "fake"
+
+VOCABULARY = (
+    "the policy would shift incentives for workers and firms while public budgets "
+    "adjust to new evidence from pilots in several regions however critics argue "
+    "that long term effects remain uncertain and trade offs between growth equity "
+    "and stability deserve careful measurement before any broad rollout we should "
+    "consider data privacy security innovation markets education health climate "
+    "trust institutions technology labor automation inflation productivity"
+).split()
+
+
+class Distribution:
+    """A sampler parsed from a spec like "uniform:1,2" or "0.5" """
+    kinds = ("fixed", "uniform", "normal", "lognormal", "exp")
+
+    def __init__(self, spec):
+        self.spec = str(spec).strip()
+        kind, _, params = self.spec.partition(":")
+        if not params:
+            kind, params = "fixed", kind
+        if kind not in self.kinds:
+            raise ValueError(f"Unknown distribution '{kind}' in {self.spec!r} (choose from {', '.join(self.kinds)})")
+        try:
+            self.params = [float(value) for value in params.split(",")]
+        except ValueError:
+            raise ValueError(f"Invalid distribution parameters in {self.spec!r}")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}[kind]
+        if len(self.params) != expected:
+            raise ValueError(f"'{kind}' takes {expected} parameter(s), got {self.spec!r}")
+        self.kind = kind
+
+    def sample(self, rng):
+        """Draw a non-negative value"""
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.params)
+        elif self.kind == "lognormal":
+            median, sigma = self.params
+            value = rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        else:
+            value = rng.expovariate(1.0 / self.params[0]) if self.params[0] > 0 else 0.0
+        return max(0.0, value)
+
+
+class FakeProviderError(Exception):
+    """A simulated provider failure; `status_code` drives retry/rate-limit handling"""
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeSettings:
+    """Behaviour shared by every fake client"""
+    def __init__(self, latency="0", tokens_per_sec="0", response_tokens="120",
+                 error_rate=0.0, rate_limit_rate=0.0, seed=0):
+        self.latency = Distribution(latency)
+        self.tokens_per_sec = Distribution(tokens_per_sec)
+        self.response_tokens = Distribution(response_tokens)
+        self.error_rate = float(error_rate)
+        self.rate_limit_rate = float(rate_limit_rate)
+        self.seed = int(seed)
+
+
+_settings = FakeSettings()
+
+
+def get_fake_settings():
+    return _settings
+
+
+def configure_fake_provider(**settings):
+    """Replace the fake provider settings (see FakeSettings for the arguments)"""
+    global _settings
+    _settings = FakeSettings(**settings)
+
+
+def configure_fake_provider_from_config(config_data):
+    """Read FAKE_* keys from a parsed config dict"""
+    settings = {}
+    for key, setting in (("FAKE_LATENCY", "latency"),
+                         ("FAKE_TOKENS_PER_SEC", "tokens_per_sec"),
+                         ("FAKE_RESPONSE_TOKENS", "response_tokens"),
+                         ("FAKE_ERROR_RATE", "error_rate"),
+                         ("FAKE_RATE_LIMIT_RATE", "rate_limit_rate"),
+                         ("FAKE_SEED", "seed")):
+        if config_data.get(key):
+            settings[setting] = config_data[key]
+    if settings:
+        try:
+            configure_fake_provider(**settings)
+        except ValueError as e:
+            raise ValueError(f"Invalid fake provider setting: {e}")
+
+
+class FakeClient(BaseLLMClient):
+    """
+    Generates synthetic replies locally. The text depends only on the seed,
+    model version and prompt; timing and failures come from a seeded generator
+    shared by the client's calls.
+    """
+    def __init__(self, api_key, model_version, settings=None):
+        super().__init__(api_key or "fake", model_version or DEFAULT_MODEL_VERSION, "Fake")
+        self.settings = settings or get_fake_settings()
+        self._rng = random.Random(f"{self.settings.seed}:{self.model_version}")
+        self._rng_lock = threading.Lock()
+
+    def validate(self):
+        return True
+
+    def _plan(self, prompt, max_tokens):
+        """
+        Decide one call's outcome: (words, first-token delay, seconds per
+        token, whether the reply was cut off at max_tokens)
+        """
+        with self._rng_lock:
+            roll = self._rng.random()
+            if roll < self.settings.rate_limit_rate:
+                raise FakeProviderError("Simulated rate limit (429)", 429)
+            if roll < self.settings.rate_limit_rate + self.settings.error_rate:
+                raise FakeProviderError("Simulated service unavailable (503)", 503)
+            latency = self.settings.latency.sample(self._rng)
+            tokens_per_sec = self.settings.tokens_per_sec.sample(self._rng)
+
+        digest = hashlib.sha256(f"{self.settings.seed}:{self.model_version}:{prompt}".encode("utf-8")).digest()
+        text_rng = random.Random(digest)
+        length = max(1, int(round(self.settings.response_tokens.sample(text_rng))))
+        words = [text_rng.choice(VOCABULARY) for _ in range(min(length, max_tokens))]
+        return words, latency, (1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0), length > max_tokens
+
+    def _deltas(self, words):
+        """Split words into sentence-like deltas ("Word word word. ")"""
+        for i, word in enumerate(words):
+            if i % 12 == 0:
+                word = word.capitalize()
+            end = "." if i % 12 == 11 or i == len(words) - 1 else ""
+            yield f"{word}{end} "
+
+    def _usage(self, prompt, words, truncated, text=""):
+        return LLMResponse(
+            text=text,
+            provider=self.provider_name,
+            prompt_tokens=estimate_tokens(prompt),
+            completion_tokens=len(words),
+            finish_reason="length" if truncated else "stop"
+        )
+
+    def _generate(self, prompt, max_tokens, temperature):
+        words, latency, per_token, truncated = self._plan(prompt, max_tokens)
+        time.sleep(latency + per_token * len(words))
+        return self._usage(prompt, words, truncated, "".join(self._deltas(words)).strip())
+
+    async def _agenerate(self, prompt, max_tokens, temperature):
+        words, latency, per_token, truncated = self._plan(prompt, max_tokens)
+        await asyncio.sleep(latency + per_token * len(words))
+        return self._usage(prompt, words, truncated, "".join(self._deltas(words)).strip())
+
+    def _stream(self, prompt, max_tokens, temperature):
+        words, latency, per_token, truncated = self._plan(prompt, max_tokens)
+        time.sleep(latency)
+        for delta in self._deltas(words):
+            if per_token:
+                time.sleep(per_token)
+            yield delta
+        yield self._usage(prompt, words, truncated)
+
+    async def _astream(self, prompt, max_tokens, temperature):
+        words, latency, per_token, truncated = self._plan(prompt, max_tokens)
+        await asyncio.sleep(latency)
+        for delta in self._deltas(words):
+            if per_token:
+                await asyncio.sleep(per_token)
+            yield delta
+        yield self._usage(prompt, words, truncated)
@@ -6,13 +6,20 @@ A graphical interface for simulating panel discussions between different AI lang
 
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
+import asyncio
 import json
 import os
 import threading
 import sys
 
-from utils import read_file, write_file, parse_config, load_models_from_config, get_default_models, create_config_file_content
+from utils import read_file, write_file, parse_config, load_models_from_config, get_default_models, create_config_file_content, describe_provider_event
 from conversation import ConversationManager
+from rate_limiter import configure_rate_limits_from_config
+from resilience import configure_resilience_from_config
+from fake_provider import configure_fake_provider_from_config
+from context_strategies import CONTEXT_STRATEGIES, create_context_strategy_from_config
+from transcript import TranscriptWriter
+from gui_updates import GUIUpdateQueue
 
 # Default configuration
 DEFAULT_MAX_CHARACTERS = 15000
@@ -20,6 +27,8 @@ DEFAULT_MAX_TOKENS = 500
 DEFAULT_TEMPERATURE = 0.4
 DEFAULT_CHALLENGE_PROBABILITY = 0.2
 DEFAULT_OUTPUT_FILE = "conversation_output.txt"
+DEFAULT_SCROLLBACK_LINES = 5000
+DEFAULT_MAX_FPS = 30  # How often simulation events are drained into the widgets
 
 
 class AITalksGUI:
@@ -36,6 +45,12 @@ class AITalksGUI:
         # State variables
         self.conversation_manager = None
         self.simulation_thread = None
+        self.stop_requested = False
+        self.scrollback_lines = DEFAULT_SCROLLBACK_LINES
+        self.refresh_ms = 1000 // DEFAULT_MAX_FPS
+        
+        # Events from the simulation thread, applied to the widgets by poll_updates
+        self.updates = GUIUpdateQueue()
         
         # Create notebook (tabbed interface)
         self.notebook = ttk.Notebook(root)
@@ -51,6 +66,8 @@ class AITalksGUI:
         
         # Load default content
         self.load_default_content()
+        
+        self.poll_updates()
     
     def setup_config_tab(self):
         """Set up the configuration tab for models and API keys"""
@@ -222,6 +239,49 @@ class AITalksGUI:
         challenge_entry = ttk.Entry(challenge_frame, textvariable=self.challenge_var, width=10)
         challenge_entry.pack(side=tk.LEFT, padx=5)
         
+        # Engine selection
+        engine_frame = ttk.Frame(param_frame)
+        engine_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.async_var = tk.BooleanVar(value=False)
+        async_check = ttk.Checkbutton(engine_frame, text="Use asyncio engine", variable=self.async_var)
+        async_check.pack(side=tk.LEFT, padx=5)
+        
+        self.stream_var = tk.BooleanVar(value=True)
+        stream_check = ttk.Checkbutton(engine_frame, text="Stream responses", variable=self.stream_var)
+        stream_check.pack(side=tk.LEFT, padx=5)
+        
+        # Context strategy
+        context_frame = ttk.Frame(param_frame)
+        context_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(context_frame, text="Context:").pack(side=tk.LEFT, padx=5)
+        self.context_var = tk.StringVar(value="full")
+        context_combo = ttk.Combobox(context_frame, textvariable=self.context_var, values=CONTEXT_STRATEGIES,
+                                     state="readonly", width=8)
+        context_combo.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(context_frame, text="Window:").pack(side=tk.LEFT, padx=5)
+        self.context_window_var = tk.StringVar(value="10")
+        ttk.Entry(context_frame, textvariable=self.context_window_var, width=5).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(context_frame, text="Summarize every:").pack(side=tk.LEFT, padx=5)
+        self.summary_every_var = tk.StringVar(value="5")
+        ttk.Entry(context_frame, textvariable=self.summary_every_var, width=5).pack(side=tk.LEFT, padx=5)
+        
+        # Scrollback cap of the output display (0 keeps everything)
+        scrollback_frame = ttk.Frame(param_frame)
+        scrollback_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(scrollback_frame, text="Scrollback Lines (0 = unlimited):").pack(side=tk.LEFT, padx=5)
+        self.scrollback_var = tk.StringVar(value=str(DEFAULT_SCROLLBACK_LINES))
+        ttk.Entry(scrollback_frame, textvariable=self.scrollback_var, width=8).pack(side=tk.LEFT, padx=5)
+        
+        # Redraw rate cap for the live output
+        ttk.Label(scrollback_frame, text="Max Redraws per Second:").pack(side=tk.LEFT, padx=5)
+        self.fps_var = tk.StringVar(value=str(DEFAULT_MAX_FPS))
+        ttk.Entry(scrollback_frame, textvariable=self.fps_var, width=5).pack(side=tk.LEFT, padx=5)
+        
         # Buttons
         btn_frame = ttk.Frame(controls_frame)
         btn_frame.pack(fill=tk.X, padx=5, pady=15)
@@ -252,6 +312,11 @@ class AITalksGUI:
         self.status_var = tk.StringVar(value="Ready")
         status_label = ttk.Label(sim_frame, textvariable=self.status_var)
         status_label.pack(padx=10, pady=5)
+        
+        # Time to first token and tokens/s of the reply being streamed
+        self.stream_stats_var = tk.StringVar(value="")
+        stream_stats_label = ttk.Label(sim_frame, textvariable=self.stream_stats_var)
+        stream_stats_label.pack(padx=10, pady=(0, 5))
     
     def load_default_content(self):
         """Load default content from text files without showing message boxes"""
@@ -288,6 +353,9 @@ class AITalksGUI:
         try:
             config_text = read_file('config.txt')
             self.config_data = parse_config(config_text)
+            configure_rate_limits_from_config(self.config_data)
+            configure_resilience_from_config(self.config_data)
+            configure_fake_provider_from_config(self.config_data)
             
             # Load model data
             self.models_list = load_models_from_config(self.config_data)
@@ -357,8 +425,12 @@ class AITalksGUI:
             if not output_file:
                 output_file = DEFAULT_OUTPUT_FILE
             
-            # Create config content
-            config_content = create_config_file_content(models, output_file)
+            # Create config content, keeping settings the form doesn't edit
+            extra_settings = {
+                key: value for key, value in self.config_data.items()
+                if not key.startswith("MODEL") and key != "OUTPUT_FILE"
+            }
+            config_content = create_config_file_content(models, output_file, extra_settings)
             
             # Write to file
             write_file('config.txt', config_content)
@@ -405,10 +477,47 @@ class AITalksGUI:
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save content: {e}")
     
-    def update_output(self, message):
-        """Update the output text widget"""
-        self.output_text.insert(tk.END, message + "\n\n")
-        self.output_text.see(tk.END)
+    def poll_updates(self):
+        """Apply the events queued by the simulation thread, then check again next frame"""
+        frame = self.updates.drain()
+        if frame is not None:
+            self.apply_frame(frame)
+        self.root.after(self.refresh_ms, self.poll_updates)
+    
+    def apply_frame(self, frame):
+        """Apply one frame of queued events to the widgets (GUI thread only)"""
+        if frame.drop_stream:
+            self.output_text.delete("stream_start", tk.END)
+        
+        if frame.text:
+            if frame.stream_offset is None:
+                self.output_text.insert(tk.END, frame.text)
+            else:
+                # A new reply starts inside this frame; mark where, so it can
+                # be replaced by its finished message
+                self.output_text.insert(tk.END, frame.text[:frame.stream_offset])
+                self.output_text.mark_set("stream_start", "end-1c")
+                self.output_text.mark_gravity("stream_start", tk.LEFT)
+                self.output_text.insert(tk.END, frame.text[frame.stream_offset:])
+            self.trim_scrollback()
+            self.output_text.see(tk.END)
+        
+        if frame.progress is not None:
+            self.update_progress(frame.progress)
+        if frame.status is not None:
+            self.update_status(frame.status)
+        if frame.stream_stats is not None:
+            self.stream_stats_var.set(frame.stream_stats.describe())
+        for function, args in frame.calls:
+            function(*args)
+    
+    def trim_scrollback(self):
+        """Drop the oldest lines of the output display beyond the scrollback cap"""
+        if not self.scrollback_lines:
+            return
+        lines = int(self.output_text.index("end-1c").split(".")[0])
+        if lines > self.scrollback_lines:
+            self.output_text.delete("1.0", f"{lines - self.scrollback_lines + 1}.0")
         
     def update_progress(self, value):
         """Update the progress bar"""
@@ -417,6 +526,10 @@ class AITalksGUI:
     def update_status(self, status):
         """Update the status label"""
         self.status_var.set(status)
+        
+    def post_provider_event(self, speaker, event, details):
+        """Show retries and circuit breaker changes in the status label (from the simulation thread)"""
+        self.updates.post_status(describe_provider_event(speaker, event, details))
     
     def export_conversation(self):
         """Export the current conversation to a file"""
@@ -446,17 +559,22 @@ class AITalksGUI:
     def get_models_from_form(self):
         """Get model configurations from the form"""
         models = []
-        for entry in self.model_entries:
+        for i, entry in enumerate(self.model_entries):
             name = entry['name'].get().strip()
             apikey = entry['apikey'].get().strip()
             version = entry['version'].get().strip()
             
             if name:  # Only include models with a name
-                models.append({
+                model_info = {
                     'name': name,
                     'apikey': apikey,
                     'version': version
-                })
+                }
+                # The form has no provider field, so keep any MODELn_PROVIDER from the config
+                provider = self.config_data.get(f"MODEL{i + 1}_PROVIDER")
+                if provider:
+                    model_info['provider'] = provider
+                models.append(model_info)
         
         return models
     
@@ -466,6 +584,8 @@ class AITalksGUI:
         self.start_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.NORMAL)
         self.output_text.delete('1.0', tk.END)
+        self.updates.reset()
+        self.stream_stats_var.set("")
         self.update_status("Preparing simulation...")
         self.update_progress(0)
         
@@ -475,15 +595,25 @@ class AITalksGUI:
             max_tokens = int(self.token_limit_var.get())
             temperature = float(self.temp_var.get())
             challenge_prob = float(self.challenge_var.get())
+            context_window = int(self.context_window_var.get())
+            summary_every = int(self.summary_every_var.get())
+            scrollback_lines = int(self.scrollback_var.get())
+            max_fps = int(self.fps_var.get())
             
             if not (0 <= temperature <= 1):
                 raise ValueError("Temperature must be between 0 and 1")
             if not (0 <= challenge_prob <= 1):
                 raise ValueError("Challenge probability must be between 0 and 1")
+            if scrollback_lines < 0:
+                raise ValueError("Scrollback lines can't be negative")
+            if not (1 <= max_fps <= 120):
+                raise ValueError("Max redraws per second must be between 1 and 120")
         except ValueError as e:
             messagebox.showerror("Invalid Parameters", f"Please enter valid numbers for simulation parameters: {e}")
             self.reset_simulation_controls()
             return
+        self.scrollback_lines = scrollback_lines
+        self.refresh_ms = 1000 // max_fps
         
         # Get content from UI
         topic = self.topic_text.get('1.0', tk.END).strip()
@@ -509,6 +639,20 @@ class AITalksGUI:
         self.save_config()
         self.save_content_to_files()
         
+        # The summary model for the summary/hybrid strategies comes from the config
+        try:
+            context_strategy = create_context_strategy_from_config(
+                self.context_var.get(), self.config_data, context_window, summary_every
+            )
+        except ValueError as e:
+            messagebox.showerror("Invalid Context Strategy", str(e))
+            self.reset_simulation_controls()
+            return
+        
+        # The output file is written message by message, so stopping (or a
+        # crash) keeps everything generated so far
+        output_file = self.output_file_entry.get().strip() or DEFAULT_OUTPUT_FILE
+        
         # Create conversation manager
         self.conversation_manager = ConversationManager(
             models_list=models_list,
@@ -519,51 +663,67 @@ class AITalksGUI:
             max_characters=max_chars,
             max_tokens=max_tokens,
             temperature=temperature,
-            challenge_probability=challenge_prob
+            challenge_probability=challenge_prob,
+            context_strategy=context_strategy,
+            transcript=TranscriptWriter(output_file)
         )
         
-        # Set up callbacks
-        self.conversation_manager.on_message = self.update_output
-        self.conversation_manager.on_progress = self.update_progress
-        self.conversation_manager.on_status = self.update_status
+        # Set up callbacks. They run on the simulation thread, so they only
+        # queue the events; poll_updates applies them on the GUI thread
+        self.conversation_manager.on_message = self.updates.post_message
+        self.conversation_manager.on_progress = self.updates.post_progress
+        self.conversation_manager.on_status = self.updates.post_status
+        self.conversation_manager.on_provider_event = self.post_provider_event
+        if self.stream_var.get():
+            self.conversation_manager.on_request = self.updates.post_request
+            self.conversation_manager.on_token = self.updates.post_token
         
         # Start simulation thread
-        self.simulation_thread = threading.Thread(target=self.run_simulation_thread)
+        self.use_async = self.async_var.get()
+        self.stop_requested = False
+        self.simulation_thread = threading.Thread(target=self.run_simulation_thread, args=(output_file,))
         self.simulation_thread.daemon = True
         self.simulation_thread.start()
     
-    def run_simulation_thread(self):
-        """Run the conversation simulation in a separate thread"""
+    def run_simulation_thread(self, output_file):
+        """
+        Run the conversation simulation in a separate thread. It never touches
+        the widgets: everything it reports goes through the update queue.
+        """
         try:
-            # Run the simulation
-            self.conversation_manager.start_simulation()
-            
-            # Write output file when complete (only if the simulation wasn't stopped)
-            if self.conversation_manager.simulation_running:
-                output_file = self.output_file_entry.get().strip()
-                if not output_file:
-                    output_file = DEFAULT_OUTPUT_FILE
-                
+            # Run the simulation (on its own event loop when using the async engine)
+            if self.use_async:
+                asyncio.run(self.conversation_manager.run())
+            else:
+                self.conversation_manager.start_simulation()
+            
+            # Write output file when complete (only if the simulation wasn't stopped;
+            # simulation_running is already cleared once the run has finished)
+            if not self.stop_requested:
                 self.conversation_manager.write_to_file(output_file)
                 
                 # Update status
-                self.root.after(0, self.update_status, 
-                              f"Simulation complete. Output written to: {output_file}")
+                self.updates.post_status(f"Simulation complete. Output written to: {output_file}")
             
         except Exception as e:
-            self.root.after(0, messagebox.showerror, "Error", f"Simulation error: {str(e)}")
-            self.root.after(0, self.update_status, f"Error: {str(e)}")
+            self.updates.post_status(f"Error: {str(e)}")
+            self.updates.post_call(messagebox.showerror, "Error", f"Simulation error: {str(e)}")
         
         finally:
+            # Flush and close the output file, even if the run was stopped
+            self.conversation_manager.transcript.close()
+            
             # Reset UI
-            self.root.after(0, self.reset_simulation_controls)
+            self.updates.post_call(self.reset_simulation_controls)
     
     def stop_simulation(self):
         """Stop the simulation"""
+        self.stop_requested = True
         if self.conversation_manager:
             self.conversation_manager.stop_simulation()
         
-        self.update_status("Stopping simulation...")
+        # Queued, so a status still waiting in the queue doesn't overwrite it
+        self.updates.post_status("Stopping simulation...")
     
     def reset_simulation_controls(self):
         """Reset simulation controls"""
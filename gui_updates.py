@@ -0,0 +1,203 @@
+"""
+Thread-safe hand-off of simulation events to the GUI. The simulation worker
+posts messages, streamed tokens, progress and status from its own thread; the
+Tk main loop drains the queue on a timer (root.after) and applies everything
+that arrived since the last drain as one frame. The text is coalesced into a
+single insert, and only the latest progress and status values are kept.
+Nothing here touches Tk, so the worker never does either.
+
+Events are timestamped when they are posted, so the live throughput shown
+for a streamed reply (StreamStats) doesn't depend on how often the GUI
+redraws.
+"""
+
+import collections
+import time
+
+
+# Event kinds
+MESSAGE = "message"
+REQUEST = "request"
+TOKEN = "token"
+PROGRESS = "progress"
+STATUS = "status"
+CALL = "call"
+
+
+class StreamStats:
+    """
+    Live numbers for one speaker's streamed reply: time to the first token
+    (from the start of the request) and tokens per second since then. Each
+    streamed delta counts as one token, which is what the providers send.
+    """
+    __slots__ = ("speaker", "requested_at", "first_token_at", "last_token_at", "tokens")
+
+    def __init__(self, speaker, requested_at=None):
+        self.speaker = speaker
+        self.requested_at = requested_at
+        self.first_token_at = None
+        self.last_token_at = None
+        self.tokens = 0
+
+    def add_token(self, at):
+        if self.first_token_at is None:
+            self.first_token_at = at
+        self.last_token_at = at
+        self.tokens += 1
+
+    @property
+    def time_to_first_token(self):
+        """Seconds from the request to the first token, or None"""
+        if self.requested_at is None or self.first_token_at is None:
+            return None
+        return self.first_token_at - self.requested_at
+
+    @property
+    def tokens_per_second(self):
+        """Tokens after the first one over the time they took, or None with fewer than two"""
+        if self.tokens < 2 or self.last_token_at <= self.first_token_at:
+            return None
+        return (self.tokens - 1) / (self.last_token_at - self.first_token_at)
+
+    def describe(self):
+        """A one-line summary for the status bar"""
+        if self.first_token_at is None:
+            return f"{self.speaker}: waiting for the first token..."
+        parts = [f"{self.speaker}: {self.tokens} tokens"]
+        if self.tokens_per_second is not None:
+            parts.append(f"{self.tokens_per_second:.1f} tokens/s")
+        if self.time_to_first_token is not None:
+            parts.append(f"first token after {self.time_to_first_token:.2f} s")
+        return " · ".join(parts)
+
+
+class OutputFrame:
+    """
+    The changes from one drain of the queue. `drop_stream` means the text
+    streamed since the "stream_start" mark is to be deleted first (its
+    message arrived, or another speaker started). `text` is appended in one
+    go; if a new reply starts inside it, `stream_offset` is where the mark
+    goes. `progress` and `status` are None when they didn't change, and
+    `calls` are GUI functions to run afterwards, in order. `stream_stats` is
+    the StreamStats of the speaker last heard from, or None if no request or
+    token arrived in this frame.
+    """
+    __slots__ = ("drop_stream", "text", "stream_offset", "streaming_speaker", "progress", "status", "calls",
+                 "stream_stats")
+
+    def __init__(self, drop_stream, text, stream_offset, streaming_speaker, progress, status, calls,
+                 stream_stats=None):
+        self.drop_stream = drop_stream
+        self.text = text
+        self.stream_offset = stream_offset
+        self.streaming_speaker = streaming_speaker
+        self.progress = progress
+        self.status = status
+        self.calls = calls
+        self.stream_stats = stream_stats
+
+
+class GUIUpdateQueue:
+    """
+    Events from the simulation thread, waiting for the GUI thread. The post_*
+    methods can be called from any thread (they only append to a deque);
+    drain() and reset() belong to the GUI thread.
+    """
+    def __init__(self):
+        self._events = collections.deque()
+        # The speaker whose reply is being streamed into the widget
+        self.streaming_speaker = None
+        # StreamStats by speaker, for the reply each one is currently giving
+        self.stream_stats = {}
+
+    def post_message(self, message):
+        """A finished message (ConversationManager.on_message)"""
+        self._events.append((MESSAGE, message))
+
+    def post_request(self, speaker):
+        """A speaker's provider call is starting (ConversationManager.on_request)"""
+        self._events.append((REQUEST, speaker, time.perf_counter()))
+
+    def post_token(self, speaker, delta):
+        """A streamed text delta (ConversationManager.on_token)"""
+        self._events.append((TOKEN, speaker, delta, time.perf_counter()))
+
+    def post_progress(self, value):
+        self._events.append((PROGRESS, value))
+
+    def post_status(self, status):
+        self._events.append((STATUS, status))
+
+    def post_call(self, function, *args):
+        """Run `function(*args)` on the GUI thread with the next frame"""
+        self._events.append((CALL, function, args))
+
+    def reset(self):
+        """Drop pending events and forget the streamed reply (for a new run)"""
+        self._events.clear()
+        self.streaming_speaker = None
+        self.stream_stats = {}
+
+    def drain(self):
+        """Take every pending event and fold them into one OutputFrame (None if there were none)"""
+        if not self._events:
+            return None
+
+        parts = []
+        length = 0
+        drop_stream = False
+        stream_index = stream_offset = None  # Where a reply started in this frame
+        speaker = self.streaming_speaker
+        progress = status = stats = None
+        calls = []
+
+        while True:
+            try:
+                event = self._events.popleft()
+            except IndexError:
+                break
+            kind = event[0]
+
+            if kind == MESSAGE or (kind == TOKEN and event[1] != speaker):
+                if speaker is not None:
+                    # A finished message (or a reply that never became one)
+                    # replaces the text streamed for it
+                    if stream_offset is None:
+                        # The reply started in an earlier frame, so everything
+                        # queued so far in this one belongs to it
+                        drop_stream = True
+                        parts = []
+                        length = 0
+                    else:
+                        del parts[stream_index:]
+                        length = stream_offset
+                    stream_index = stream_offset = None
+                    speaker = None
+
+                if kind == MESSAGE:
+                    text = event[1] + "\n\n"
+                else:
+                    speaker = event[1]
+                    stream_index, stream_offset = len(parts), length
+                    text = f"[{speaker}]\n"
+                parts.append(text)
+                length += len(text)
+
+            if kind == TOKEN:
+                parts.append(event[2])
+                length += len(event[2])
+                stats = self.stream_stats.get(event[1])
+                if stats is None:
+                    stats = self.stream_stats[event[1]] = StreamStats(event[1])
+                stats.add_token(event[3])
+            elif kind == REQUEST:
+                stats = self.stream_stats[event[1]] = StreamStats(event[1], event[2])
+            elif kind == PROGRESS:
+                progress = event[1]
+            elif kind == STATUS:
+                status = event[1]
+            elif kind == CALL:
+                calls.append((event[1], event[2]))
+
+        self.streaming_speaker = speaker
+        return OutputFrame(drop_stream, "".join(parts), stream_offset, speaker, progress, status, calls, stats)
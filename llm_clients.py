@@ -1,22 +1,78 @@
-import google.generativeai as genai
-import anthropic
-from openai import OpenAI
-from mistralai import Mistral
 from abc import ABC, abstractmethod
+import asyncio
+import importlib
+import threading
+import time
+
+from rate_limiter import get_rate_limiter, estimate_tokens, is_rate_limit_error, get_retry_after
+from resilience import get_circuit_breaker, get_request_timeout, get_retry_policy, is_retryable_error
+from response_cache import get_response_cache, make_cache_key
+from cassette import get_cassette_recorder, get_replay_cassette
+from metrics import classify_error, get_metrics
+from tracing import span
+
+
+def _import_sdk(module_name, package_name):
+    """
+    Import a provider SDK the first time a client needs it. The SDKs are slow
+    to import, so a run only pays for the providers it actually uses.
+    """
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(f"This provider needs the '{package_name}' package (pip install {package_name})") from e
 
 
 class LLMResponse:
     """Standardized response object from all LLM API calls"""
-    def __init__(self, text="", error=None, provider=None):
+    def __init__(self, text="", error=None, provider=None, completion_tokens=None,
+                 prompt_tokens=None, cached_tokens=None, finish_reason=None, latency=None,
+                 from_cache=False, time_to_first_token=None):
         self.text = text
         self.error = error
         self.provider = provider
+        # Usage, when the provider reports it (None otherwise)
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens  # Output tokens
+        self.cached_tokens = cached_tokens  # Prompt tokens served from the provider's cache
+        self.finish_reason = finish_reason  # e.g. "stop", "length", "end_turn", "MAX_TOKENS"
+        self.latency = latency  # Seconds the caller waited, including queueing and retries
+        self.from_cache = from_cache  # Served from the local response cache, not the provider
+        self.time_to_first_token = time_to_first_token  # Seconds until the first streamed delta (streams only)
         self.success = error is None
         
     @property
     def is_error(self):
         return self.error is not None
         
+    @property
+    def total_tokens(self):
+        """Prompt plus completion tokens, or None if neither was reported"""
+        if self.prompt_tokens is None and self.completion_tokens is None:
+            return None
+        return (self.prompt_tokens or 0) + (self.completion_tokens or 0)
+        
+    def cache_fields(self):
+        """The fields stored in the response cache"""
+        return {
+            "text": self.text,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "finish_reason": self.finish_reason,
+        }
+        
+    def cassette_fields(self):
+        """The fields saved in a record/replay cassette"""
+        return dict(self.cache_fields(), error=self.error)
+        
+    def update_usage(self, other):
+        """Copy the usage and finish reason reported on another response"""
+        self.prompt_tokens = other.prompt_tokens
+        self.completion_tokens = other.completion_tokens
+        self.cached_tokens = other.cached_tokens
+        self.finish_reason = other.finish_reason
+        
     def __str__(self):
         if self.is_error:
             return f"Error from {self.provider}: {self.error}"
@@ -24,17 +80,411 @@ class LLMResponse:
 
 
 class BaseLLMClient(ABC):
-    """Abstract base class for all LLM clients"""
+    """
+    Abstract base class for all LLM clients.
+    
+    Subclasses implement `_generate` (and optionally `_agenerate`, `_stream` and
+    `_astream`) and may raise; the public `generate`/`agenerate` and
+    `generate_stream`/`agenerate_stream` methods validate the client, run the
+    call under the provider's shared rate limiter and circuit breaker, retry
+    transient failures with backoff, and turn any remaining exception into an
+    error LLMResponse.
+    
+    Each of those methods takes an optional `on_event(event, details)` callback
+    that is told about "retry", "rate_limited", "circuit_open" and
+    "circuit_closed" events as they happen.
+    
+    When a response cache is configured (see response_cache.py), successful
+    responses are stored and identical requests are answered from it without
+    calling the provider.
+    
+    `_stream`/`_astream` yield text deltas and may finish by yielding an
+    LLMResponse that carries only the usage and finish reason of the stream.
+    """
+    missing_config_error = "Missing API key"
+    
+    # How many times a rate-limited (429) request is queued up again
+    max_rate_limit_requeues = 3
+    
     def __init__(self, api_key, model_version, provider_name):
         self.api_key = api_key
         self.model_version = model_version
         self.provider_name = provider_name
+        self.timeout = get_request_timeout(provider_name)
+        self.retry_policy = get_retry_policy(provider_name)
+        self.rate_limiter = get_rate_limiter(provider_name, api_key)
+        self.circuit_breaker = get_circuit_breaker(provider_name, api_key)
+        self._async_client = None
+        self._async_loop = None
         
-    @abstractmethod
-    def generate(self, prompt, max_tokens=500, temperature=0.4):
+    def generate(self, prompt, max_tokens=500, temperature=0.4, on_event=None):
         """Generate text from the LLM given a prompt"""
+        cache, key, cached = self._cache_lookup(prompt, max_tokens, temperature)
+        if cached:
+            return self._served(prompt, max_tokens, temperature, cached)
+        response = self._call(prompt, max_tokens, lambda: self._generate(prompt, max_tokens, temperature),
+                              on_event=on_event)
+        return self._served(prompt, max_tokens, temperature, self._cache_store(cache, key, response))
+            
+    async def agenerate(self, prompt, max_tokens=500, temperature=0.4, on_event=None):
+        """Asynchronously generate text from the LLM given a prompt"""
+        cache, key, cached = self._cache_lookup(prompt, max_tokens, temperature)
+        if cached:
+            return self._served(prompt, max_tokens, temperature, cached)
+        response = await self._acall(prompt, max_tokens, lambda: self._agenerate(prompt, max_tokens, temperature),
+                                     on_event=on_event)
+        return self._served(prompt, max_tokens, temperature, self._cache_store(cache, key, response))
+        
+    def stream(self, prompt, max_tokens=500, temperature=0.4):
+        """Yield text deltas as the model produces them (errors are raised, not retried)"""
+        if not self.validate():
+            raise ValueError(self.missing_config_error)
+        ticket = self.rate_limiter.acquire(estimate_tokens(prompt) + max_tokens)
+        try:
+            for delta in self._stream(prompt, max_tokens, temperature):
+                if isinstance(delta, str):
+                    yield delta
+        finally:
+            self.rate_limiter.release(ticket)
+        
+    async def astream(self, prompt, max_tokens=500, temperature=0.4):
+        """Async version of stream()"""
+        if not self.validate():
+            raise ValueError(self.missing_config_error)
+        ticket = await self.rate_limiter.aacquire(estimate_tokens(prompt) + max_tokens)
+        try:
+            async for delta in self._astream(prompt, max_tokens, temperature):
+                if isinstance(delta, str):
+                    yield delta
+        finally:
+            self.rate_limiter.release(ticket)
+            
+    def generate_stream(self, prompt, max_tokens=500, temperature=0.4, on_token=None, on_event=None):
+        """
+        Generate text, passing each delta to `on_token` as it arrives.
+        Returns the complete LLMResponse, just like generate().
+        """
+        cache, key, cached = self._cache_lookup(prompt, max_tokens, temperature)
+        if cached:
+            # A cached reply arrives as a single delta
+            if on_token and cached.text:
+                on_token(cached.text)
+            cached.time_to_first_token = cached.latency
+            return self._served(prompt, max_tokens, temperature, cached)
+        fragments = []
+        started_at = time.monotonic()
+        response = self._call(
+            prompt, max_tokens,
+            lambda: self._collect_stream(self._stream(prompt, max_tokens, temperature), fragments, on_token,
+                                         started_at),
+            can_resend=lambda: not fragments,
+            on_event=on_event
+        )
+        return self._served(prompt, max_tokens, temperature, self._cache_store(cache, key, response))
+        
+    async def agenerate_stream(self, prompt, max_tokens=500, temperature=0.4, on_token=None, on_event=None):
+        """Async version of generate_stream()"""
+        cache, key, cached = self._cache_lookup(prompt, max_tokens, temperature)
+        if cached:
+            if on_token and cached.text:
+                on_token(cached.text)
+            cached.time_to_first_token = cached.latency
+            return self._served(prompt, max_tokens, temperature, cached)
+        fragments = []
+        started_at = time.monotonic()
+        response = await self._acall(
+            prompt, max_tokens,
+            lambda: self._acollect_stream(self._astream(prompt, max_tokens, temperature), fragments, on_token,
+                                          started_at),
+            can_resend=lambda: not fragments,
+            on_event=on_event
+        )
+        return self._served(prompt, max_tokens, temperature, self._cache_store(cache, key, response))
+        
+    def is_available(self):
+        """False while this provider's circuit breaker is refusing calls"""
+        available = self.circuit_breaker.is_available()
+        recorder = get_cassette_recorder()
+        if recorder is not None:
+            recorder.record_availability(self.provider_name, self.model_version, available)
+        return available
+        
+    def _cache_lookup(self, prompt, max_tokens, temperature):
+        """
+        Returns (cache, key, cached response or None). The cache is None when
+        response caching is off.
+        """
+        cache = get_response_cache()
+        if cache is None:
+            return None, None, None
+        
+        started_at = time.monotonic()
+        key = make_cache_key(self.provider_name, self.model_version, prompt, max_tokens, temperature)
+        fields = cache.get(key)
+        if fields is None:
+            return cache, key, None
+        response = LLMResponse(provider=self.provider_name, from_cache=True, **fields)
+        return cache, key, self._timed(response, started_at)
+        
+    def _cache_store(self, cache, key, response):
+        """Save a successful response in the cache (if caching is on) and return it"""
+        if cache is not None and not response.is_error:
+            cache.put(key, response.cache_fields())
+        return response
+        
+    def _served(self, prompt, max_tokens, temperature, response):
+        """
+        Record a response handed back to the caller (in the metrics, and when
+        recording a cassette) and return it
+        """
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.observe_response(self.provider_name, self.model_version, response)
+        recorder = get_cassette_recorder()
+        if recorder is not None:
+            key = make_cache_key(self.provider_name, self.model_version, prompt, max_tokens, temperature)
+            recorder.record_response(self.provider_name, self.model_version, key,
+                                     response.latency, response.cassette_fields())
+        return response
+        
+    def _collect_stream(self, deltas, fragments, on_token, started_at):
+        """
+        Forward each delta to on_token and build the final response, timing
+        the first delta from `started_at`
+        """
+        usage = None
+        first_token_at = None
+        for delta in deltas:
+            if isinstance(delta, LLMResponse):
+                usage = delta
+                continue
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            fragments.append(delta)
+            if on_token:
+                on_token(delta)
+        return self._stream_response(fragments, usage, started_at, first_token_at)
+        
+    async def _acollect_stream(self, deltas, fragments, on_token, started_at):
+        """Async version of _collect_stream"""
+        usage = None
+        first_token_at = None
+        async for delta in deltas:
+            if isinstance(delta, LLMResponse):
+                usage = delta
+                continue
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            fragments.append(delta)
+            if on_token:
+                on_token(delta)
+        return self._stream_response(fragments, usage, started_at, first_token_at)
+        
+    def _stream_response(self, fragments, usage, started_at, first_token_at):
+        response = LLMResponse(text="".join(fragments).strip(), provider=self.provider_name)
+        if usage is not None:
+            response.update_usage(usage)
+        if first_token_at is not None:
+            response.time_to_first_token = first_token_at - started_at
+        return response
+        
+    def _emit(self, on_event, event, started_at, **details):
+        """Report a retry/breaker event to the metrics and the caller's callback, if any"""
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.observe_event(self.provider_name, self.model_version, event)
+        if on_event:
+            details.update(
+                provider=self.provider_name,
+                model=self.model_version,
+                time=time.time(),
+                elapsed=time.monotonic() - started_at
+            )
+            on_event(event, details)
+        
+    def _count_error(self, error_type):
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.observe_error(self.provider_name, self.model_version, error_type)
+        
+    def _circuit_open_response(self):
+        self._count_error("circuit_open")
+        return self._create_error_response(
+            f"Provider unavailable (circuit open, retrying in {self.circuit_breaker.retry_in():.0f}s)"
+        )
+        
+    def _plan_resend(self, error, ticket, retries, requeues, can_resend, on_event, started_at):
+        """
+        Book-keep a failed attempt and decide whether to send it again.
+        Returns ("requeue" | "retry", delay in seconds), or None to give up.
+        """
+        self._count_error(classify_error(error))
+        rate_limited = is_rate_limit_error(error)
+        self.rate_limiter.release(ticket, rate_limited=rate_limited,
+                                  retry_after=get_retry_after(error), failed=True)
+        resendable = can_resend is None or can_resend()
+        
+        if rate_limited:
+            # A 429 isn't a provider failure, but it does end a half-open
+            # trial; the requeued call (or the next one) takes the slot again
+            self.circuit_breaker.release_trial()
+            # The limiter has already set a cooldown, so just get back in line
+            if resendable and requeues < self.max_rate_limit_requeues:
+                self._emit(on_event, "rate_limited", started_at, requeue=requeues + 1, error=str(error))
+                return "requeue", 0.0
+            return None
+            
+        if self.circuit_breaker.record_failure():
+            # No point retrying into a circuit that just opened
+            self._emit(on_event, "circuit_open", started_at,
+                       reset_timeout=self.circuit_breaker.reset_timeout, error=str(error))
+            return None
+            
+        if resendable and is_retryable_error(error) and retries < self.retry_policy.max_retries:
+            delay = self.retry_policy.get_delay(retries + 1)
+            self._emit(on_event, "retry", started_at, attempt=retries + 1,
+                       max_retries=self.retry_policy.max_retries, delay=delay, error=str(error))
+            return "retry", delay
+            
+        return None
+        
+    def _abandon(self, ticket):
+        """
+        Give back what an attempt holds when it is cancelled (e.g. its asyncio
+        task) rather than finished: the limiter slot, if it got one, and a
+        half-open breaker's trial
+        """
+        if ticket is not None:
+            self.rate_limiter.release(ticket, failed=True)
+        self.circuit_breaker.release_trial()
+        
+    def _timed(self, response, started_at):
+        response.latency = time.monotonic() - started_at
+        return response
+        
+    def _record_success(self, ticket, prompt, response, on_event, started_at):
+        # Charge the limiter what the provider reported, falling back to estimates
+        used_tokens = response.total_tokens
+        if response.prompt_tokens is None or response.completion_tokens is None:
+            used_tokens = estimate_tokens(prompt) + estimate_tokens(response.text)
+        self.rate_limiter.release(ticket, used_tokens=used_tokens)
+        if self.circuit_breaker.record_success():
+            self._emit(on_event, "circuit_closed", started_at)
+        
+    def _call(self, prompt, max_tokens, request, can_resend=None, on_event=None):
+        """
+        Run one provider request under the rate limiter and circuit breaker.
+        Rate-limited requests are queued up again, transient failures are
+        retried with exponential backoff, both only while nothing has been
+        streamed to the caller yet. Anything else becomes an error response.
+        """
+        if not self.validate():
+            self._count_error("missing_config")
+            return self._create_error_response(self.missing_config_error)
+            
+        estimated_tokens = estimate_tokens(prompt) + max_tokens
+        started_at = time.monotonic()
+        retries = requeues = 0
+        while True:
+            if not self.circuit_breaker.allow_request():
+                return self._timed(self._circuit_open_response(), started_at)
+                
+            with span("rate_limit_wait", "provider"):
+                ticket = self.rate_limiter.acquire(estimated_tokens)
+            try:
+                with span("request", "provider", provider=self.provider_name, model=self.model_version):
+                    response = request()
+            except Exception as e:
+                plan = self._plan_resend(e, ticket, retries, requeues, can_resend, on_event, started_at)
+                if plan is None:
+                    return self._timed(self._create_error_response(str(e)), started_at)
+                action, delay = plan
+                if action == "retry":
+                    retries += 1
+                    with span("retry_backoff", "provider", attempt=retries):
+                        time.sleep(delay)
+                else:
+                    requeues += 1
+                continue
+                
+            self._record_success(ticket, prompt, response, on_event, started_at)
+            return self._timed(response, started_at)
+            
+    async def _acall(self, prompt, max_tokens, request, can_resend=None, on_event=None):
+        """Async version of _call; `request` returns an awaitable"""
+        if not self.validate():
+            self._count_error("missing_config")
+            return self._create_error_response(self.missing_config_error)
+            
+        estimated_tokens = estimate_tokens(prompt) + max_tokens
+        started_at = time.monotonic()
+        retries = requeues = 0
+        while True:
+            if not self.circuit_breaker.allow_request():
+                return self._timed(self._circuit_open_response(), started_at)
+                
+            # A cancelled task gives back its limiter slot and breaker trial
+            try:
+                with span("rate_limit_wait", "provider"):
+                    ticket = await self.rate_limiter.aacquire(estimated_tokens)
+            except asyncio.CancelledError:
+                self._abandon(None)
+                raise
+            try:
+                with span("request", "provider", provider=self.provider_name, model=self.model_version):
+                    response = await request()
+            except asyncio.CancelledError:
+                self._abandon(ticket)
+                raise
+            except Exception as e:
+                plan = self._plan_resend(e, ticket, retries, requeues, can_resend, on_event, started_at)
+                if plan is None:
+                    return self._timed(self._create_error_response(str(e)), started_at)
+                action, delay = plan
+                if action == "retry":
+                    retries += 1
+                    with span("retry_backoff", "provider", attempt=retries):
+                        await asyncio.sleep(delay)
+                else:
+                    requeues += 1
+                continue
+                
+            self._record_success(ticket, prompt, response, on_event, started_at)
+            return self._timed(response, started_at)
+        
+    @abstractmethod
+    def _generate(self, prompt, max_tokens, temperature):
+        """Call the provider API and return an LLMResponse (may raise)"""
         pass
         
+    async def _agenerate(self, prompt, max_tokens, temperature):
+        """Async provider call; falls back to running `_generate` in a worker thread"""
+        return await asyncio.to_thread(self._generate, prompt, max_tokens, temperature)
+        
+    def _stream(self, prompt, max_tokens, temperature):
+        """Streaming provider call; falls back to a single delta with the whole text"""
+        response = self._generate(prompt, max_tokens, temperature)
+        yield response.text
+        yield response
+        
+    async def _astream(self, prompt, max_tokens, temperature):
+        """Async streaming provider call; falls back to a single delta with the whole text"""
+        response = await self._agenerate(prompt, max_tokens, temperature)
+        yield response.text
+        yield response
+        
+    def _get_async_client(self, factory):
+        """
+        Return the SDK async client for the running event loop. Async HTTP
+        clients are tied to the loop they were first used on, so a new one is
+        created if this client is reused from a different loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = factory()
+            self._async_loop = loop
+        return self._async_client
+        
     def validate(self):
         """Check if client is properly configured"""
         return bool(self.api_key)
@@ -50,34 +500,91 @@ class BaseLLMClient(ABC):
 
 class OpenAIClient(BaseLLMClient):
     """Client for OpenAI's GPT models"""
-    def __init__(self, api_key, model_version, system_prompt="You are a helpful assistant."):
-        super().__init__(api_key, model_version, "OpenAI")
+    base_url = None
+    
+    def __init__(self, api_key, model_version, system_prompt="You are a helpful assistant.", provider_name="OpenAI"):
+        super().__init__(api_key, model_version, provider_name)
         self.system_prompt = system_prompt
         self.client = None
         
         if api_key:
-            self.client = OpenAI(api_key=api_key)
-        
-    def generate(self, prompt, max_tokens=500, temperature=0.4):
-        if not self.validate():
-            return self._create_error_response("Missing API key")
+            # Retries are handled by BaseLLMClient, so the SDK's own are disabled
+            openai = _import_sdk("openai", "openai")
+            self.client = openai.OpenAI(api_key=api_key, base_url=self.base_url, timeout=self.timeout, max_retries=0)
             
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model_version,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            return LLMResponse(
-                text=response.choices[0].message.content.strip(),
-                provider=self.provider_name
-            )
-        except Exception as e:
-            return self._create_error_response(str(e))
+    def _new_async_client(self):
+        openai = _import_sdk("openai", "openai")
+        return openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, max_retries=0)
+            
+    def _request_args(self, prompt, max_tokens, temperature):
+        return dict(
+            model=self.model_version,
+            messages=[
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        
+    def _usage_response(self, usage, finish_reason, text=""):
+        details = getattr(usage, "prompt_tokens_details", None)
+        return LLMResponse(
+            text=text,
+            provider=self.provider_name,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            cached_tokens=getattr(details, "cached_tokens", None),
+            finish_reason=finish_reason
+        )
+        
+    def _parse_response(self, response):
+        choice = response.choices[0]
+        return self._usage_response(getattr(response, "usage", None), choice.finish_reason,
+                                    text=choice.message.content.strip())
+        
+    def _parse_chunk(self, chunk, state):
+        """Return a chunk's text delta, noting its finish reason and usage in `state`"""
+        if getattr(chunk, "usage", None):
+            state["usage"] = chunk.usage
+        if not chunk.choices:
+            return None
+        if chunk.choices[0].finish_reason:
+            state["finish_reason"] = chunk.choices[0].finish_reason
+        return chunk.choices[0].delta.content
+        
+    def _stream_args(self, prompt, max_tokens, temperature):
+        # Ask for a final chunk carrying token usage
+        return dict(stream=True, stream_options={"include_usage": True},
+                    **self._request_args(prompt, max_tokens, temperature))
+        
+    def _generate(self, prompt, max_tokens, temperature):
+        response = self.client.chat.completions.create(**self._request_args(prompt, max_tokens, temperature))
+        return self._parse_response(response)
+        
+    async def _agenerate(self, prompt, max_tokens, temperature):
+        client = self._get_async_client(self._new_async_client)
+        response = await client.chat.completions.create(**self._request_args(prompt, max_tokens, temperature))
+        return self._parse_response(response)
+        
+    def _stream(self, prompt, max_tokens, temperature):
+        chunks = self.client.chat.completions.create(**self._stream_args(prompt, max_tokens, temperature))
+        state = {}
+        for chunk in chunks:
+            delta = self._parse_chunk(chunk, state)
+            if delta:
+                yield delta
+        yield self._usage_response(state.get("usage"), state.get("finish_reason"))
+                
+    async def _astream(self, prompt, max_tokens, temperature):
+        client = self._get_async_client(self._new_async_client)
+        chunks = await client.chat.completions.create(**self._stream_args(prompt, max_tokens, temperature))
+        state = {}
+        async for chunk in chunks:
+            delta = self._parse_chunk(chunk, state)
+            if delta:
+                yield delta
+        yield self._usage_response(state.get("usage"), state.get("finish_reason"))
 
 
 class AnthropicClient(BaseLLMClient):
@@ -87,109 +594,237 @@ class AnthropicClient(BaseLLMClient):
         self.client = None
         
         if api_key:
-            self.client = anthropic.Anthropic(api_key=api_key)
+            anthropic = _import_sdk("anthropic", "anthropic")
+            self.client = anthropic.Anthropic(api_key=api_key, timeout=self.timeout, max_retries=0)
+            
+    def _new_async_client(self):
+        anthropic = _import_sdk("anthropic", "anthropic")
+        return anthropic.AsyncAnthropic(api_key=self.api_key, timeout=self.timeout, max_retries=0)
+            
+    def _request_args(self, prompt, max_tokens):
+        return dict(
+            model=self.model_version,
+            max_tokens=max_tokens,
+            messages=[{"role": "user", "content": prompt}]
+        )
         
-    def generate(self, prompt, max_tokens=500, temperature=0.4):
-        if not self.validate():
-            return self._create_error_response("Missing API key")
+    def _parse_response(self, message, include_text=True):
+        # Handle different response formats
+        if not include_text:
+            combined_text = ""
+        elif isinstance(message.content, list):
+            text_fragments = []
+            for block in message.content:
+                if hasattr(block, "text"):
+                    text_fragments.append(block.text)
+                else:
+                    text_fragments.append(str(block))
+            combined_text = " ".join(text_fragments).strip()
+        else:
+            combined_text = str(message.content).strip()
             
+        usage = getattr(message, "usage", None)
+        return LLMResponse(
+            text=combined_text,
+            provider=self.provider_name,
+            prompt_tokens=getattr(usage, "input_tokens", None),
+            completion_tokens=getattr(usage, "output_tokens", None),
+            cached_tokens=getattr(usage, "cache_read_input_tokens", None),
+            finish_reason=getattr(message, "stop_reason", None)
+        )
+        
+    def _generate(self, prompt, max_tokens, temperature):
+        message = self.client.messages.create(**self._request_args(prompt, max_tokens))
+        return self._parse_response(message)
+        
+    async def _agenerate(self, prompt, max_tokens, temperature):
+        client = self._get_async_client(self._new_async_client)
+        message = await client.messages.create(**self._request_args(prompt, max_tokens))
+        return self._parse_response(message)
+        
+    def _stream(self, prompt, max_tokens, temperature):
+        with self.client.messages.stream(**self._request_args(prompt, max_tokens)) as stream:
+            for text in stream.text_stream:
+                yield text
+            yield self._parse_response(stream.get_final_message(), include_text=False)
+                
+    async def _astream(self, prompt, max_tokens, temperature):
+        client = self._get_async_client(self._new_async_client)
+        async with client.messages.stream(**self._request_args(prompt, max_tokens)) as stream:
+            async for text in stream.text_stream:
+                yield text
+            yield self._parse_response(await stream.get_final_message(), include_text=False)
+
+
+class GeminiKeyGate:
+    """
+    genai.configure() sets one API key for the whole process, so requests
+    with different Gemini keys can't overlap. Requests under the active key
+    run concurrently; a request with another key waits until they have all
+    finished, then switches the key. Every acquire is paired with a release
+    once the request (or stream) is done.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._key = None
+        self._calls = 0
+        
+    def _try_acquire_locked(self, genai, api_key):
+        if self._calls and self._key != api_key:
+            return False
+        if self._key != api_key:
+            genai.configure(api_key=api_key)
+            self._key = api_key
+        self._calls += 1
+        return True
+        
+    def acquire(self, genai, api_key):
+        """Make `api_key` the active key (waiting for other keys' requests) and count a request"""
+        with self._condition:
+            while not self._try_acquire_locked(genai, api_key):
+                self._condition.wait()
+                
+    async def aacquire(self, genai, api_key):
+        """Async version of acquire(); waits in a worker thread so the event loop keeps running"""
+        with self._condition:
+            if self._try_acquire_locked(genai, api_key):
+                return
+        waiter = asyncio.ensure_future(asyncio.to_thread(self.acquire, genai, api_key))
         try:
-            message = self.client.messages.create(
-                model=self.model_version,
-                max_tokens=max_tokens,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # The thread still gets the key eventually; hand it straight back
+            waiter.add_done_callback(lambda done: done.cancelled() or done.exception() or self.release())
+            raise
             
-            # Handle different response formats
-            if isinstance(message.content, list):
-                text_fragments = []
-                for block in message.content:
-                    if hasattr(block, "text"):
-                        text_fragments.append(block.text)
-                    else:
-                        text_fragments.append(str(block))
-                combined_text = " ".join(text_fragments).strip()
-            else:
-                combined_text = str(message.content).strip()
-                
-            return LLMResponse(
-                text=combined_text,
-                provider=self.provider_name
-            )
-        except Exception as e:
-            return self._create_error_response(str(e))
+    def release(self):
+        with self._condition:
+            self._calls -= 1
+            if not self._calls:
+                self._condition.notify_all()
+
+
+_gemini_key_gate = GeminiKeyGate()
 
 
 class GeminiClient(BaseLLMClient):
     """Client for Google's Gemini models"""
+    missing_config_error = "Missing API key or configuration failed"
+    
     def __init__(self, api_key, model_version):
         super().__init__(api_key, model_version, "Gemini")
         self.is_configured = False
+        self.model = None
         
         if api_key:
+            # Imported here like the other clients' SDKs, so a missing package
+            # is reported when the client is created rather than swallowed below.
+            # The key is only set (process-wide) around each request, see GeminiKeyGate
+            genai = self._genai()
             try:
-                genai.configure(api_key=api_key)
+                self.model = genai.GenerativeModel(model_version)
                 self.is_configured = True
             except Exception:
                 pass
         
+    @staticmethod
+    def _genai():
+        return _import_sdk("google.generativeai", "google-generativeai")
+        
     def validate(self):
         """Check if client is properly configured"""
         return self.is_configured and bool(self.api_key)
         
-    def generate(self, prompt, max_tokens=500, temperature=0.4):
-        if not self.validate():
-            return self._create_error_response("Missing API key or configuration failed")
-            
+    def _generation_config(self, max_tokens, temperature):
+        return self._genai().types.GenerationConfig(
+            candidate_count=1,
+            stop_sequences=[],
+            max_output_tokens=max_tokens,
+            temperature=temperature,
+        )
+        
+    def _parse_response(self, response, include_text=True):
+        usage = getattr(response, "usage_metadata", None)
+        candidates = getattr(response, "candidates", None)
+        finish_reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+        return LLMResponse(
+            text=response.text.strip() if include_text and response.text else "",
+            provider=self.provider_name,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            completion_tokens=getattr(usage, "candidates_token_count", None),
+            cached_tokens=getattr(usage, "cached_content_token_count", None),
+            finish_reason=getattr(finish_reason, "name", finish_reason)
+        )
+        
+    def _generate(self, prompt, max_tokens, temperature):
+        _gemini_key_gate.acquire(self._genai(), self.api_key)
         try:
-            model = genai.GenerativeModel(self.model_version)
-            response = model.generate_content(
+            response = self.model.generate_content(
                 prompt,
-                generation_config=genai.types.GenerationConfig(
-                    candidate_count=1,
-                    stop_sequences=[],
-                    max_output_tokens=max_tokens,
-                    temperature=temperature,
-                )
+                generation_config=self._generation_config(max_tokens, temperature),
+                request_options={"timeout": self.timeout}
             )
-            return LLMResponse(
-                text=response.text.strip() if response.text else "",
-                provider=self.provider_name
-            )
-        except Exception as e:
-            return self._create_error_response(str(e))
-
-
-class GrokClient(BaseLLMClient):
-    """Client for Grok AI models"""
-    def __init__(self, api_key, model_version, system_prompt="You are a helpful assistant."):
-        super().__init__(api_key, model_version, "Grok")
-        self.system_prompt = system_prompt
-        self.client = None
+        finally:
+            _gemini_key_gate.release()
+        return self._parse_response(response)
         
-        if api_key:
-            self.client = OpenAI(api_key=api_key, base_url="https://api.x.ai/v1")
+    async def _agenerate(self, prompt, max_tokens, temperature):
+        await _gemini_key_gate.aacquire(self._genai(), self.api_key)
+        try:
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=self._generation_config(max_tokens, temperature),
+                request_options={"timeout": self.timeout}
+            )
+        finally:
+            _gemini_key_gate.release()
+        return self._parse_response(response)
         
-    def generate(self, prompt, max_tokens=500, temperature=0.4):
-        if not self.validate():
-            return self._create_error_response("Missing API key")
-            
+    def _stream(self, prompt, max_tokens, temperature):
+        # The key stays active until the stream is finished (or abandoned)
+        _gemini_key_gate.acquire(self._genai(), self.api_key)
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_version,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature
+            response = self.model.generate_content(
+                prompt,
+                generation_config=self._generation_config(max_tokens, temperature),
+                request_options={"timeout": self.timeout},
+                stream=True
             )
-            return LLMResponse(
-                text=response.choices[0].message.content.strip(),
-                provider=self.provider_name
+            chunk = None
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            _gemini_key_gate.release()
+        # The last chunk carries the usage totals and finish reason
+        if chunk is not None:
+            yield self._parse_response(chunk, include_text=False)
+                
+    async def _astream(self, prompt, max_tokens, temperature):
+        await _gemini_key_gate.aacquire(self._genai(), self.api_key)
+        try:
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=self._generation_config(max_tokens, temperature),
+                request_options={"timeout": self.timeout},
+                stream=True
             )
-        except Exception as e:
-            return self._create_error_response(str(e))
+            chunk = None
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            _gemini_key_gate.release()
+        if chunk is not None:
+            yield self._parse_response(chunk, include_text=False)
+
+
+class GrokClient(OpenAIClient):
+    """Client for Grok AI models (xAI serves an OpenAI-compatible API)"""
+    base_url = "https://api.x.ai/v1"
+    
+    def __init__(self, api_key, model_version, system_prompt="You are a helpful assistant."):
+        super().__init__(api_key, model_version, system_prompt=system_prompt, provider_name="Grok")
 
 
 class MistralClient(BaseLLMClient):
@@ -199,47 +834,234 @@ class MistralClient(BaseLLMClient):
         self.client = None
         
         if api_key:
-            self.client = Mistral(api_key=api_key)
-        
-    def generate(self, prompt, max_tokens=500, temperature=0.4):
-        if not self.validate():
-            return self._create_error_response("Missing API key")
+            mistralai = _import_sdk("mistralai", "mistralai")
+            self.client = mistralai.Mistral(api_key=api_key, timeout_ms=int(self.timeout * 1000))
             
-        try:
-            chat_response = self.client.chat.complete(
-                model=self.model_version,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            return LLMResponse(
-                text=chat_response.choices[0].message.content.strip(),
-                provider=self.provider_name
-            )
-        except Exception as e:
-            return self._create_error_response(str(e))
+    def _request_args(self, prompt, max_tokens, temperature):
+        return dict(
+            model=self.model_version,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        
+    def _usage_response(self, usage, finish_reason, text=""):
+        return LLMResponse(
+            text=text,
+            provider=self.provider_name,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            finish_reason=finish_reason
+        )
+        
+    def _parse_response(self, chat_response):
+        choice = chat_response.choices[0]
+        return self._usage_response(getattr(chat_response, "usage", None), choice.finish_reason,
+                                    text=choice.message.content.strip())
+        
+    def _parse_event(self, event, state):
+        """Return an event's text delta, noting its finish reason and usage in `state`"""
+        if getattr(event.data, "usage", None):
+            state["usage"] = event.data.usage
+        if not event.data.choices:
+            return None
+        if event.data.choices[0].finish_reason:
+            state["finish_reason"] = event.data.choices[0].finish_reason
+        return event.data.choices[0].delta.content
+        
+    def _generate(self, prompt, max_tokens, temperature):
+        chat_response = self.client.chat.complete(**self._request_args(prompt, max_tokens, temperature))
+        return self._parse_response(chat_response)
+        
+    async def _agenerate(self, prompt, max_tokens, temperature):
+        # The Mistral SDK exposes async variants on the same client
+        chat_response = await self.client.chat.complete_async(**self._request_args(prompt, max_tokens, temperature))
+        return self._parse_response(chat_response)
+        
+    def _stream(self, prompt, max_tokens, temperature):
+        state = {}
+        for event in self.client.chat.stream(**self._request_args(prompt, max_tokens, temperature)):
+            delta = self._parse_event(event, state)
+            if delta:
+                yield delta
+        yield self._usage_response(state.get("usage"), state.get("finish_reason"))
+                
+    async def _astream(self, prompt, max_tokens, temperature):
+        events = await self.client.chat.stream_async(**self._request_args(prompt, max_tokens, temperature))
+        state = {}
+        async for event in events:
+            delta = self._parse_event(event, state)
+            if delta:
+                yield delta
+        yield self._usage_response(state.get("usage"), state.get("finish_reason"))
+
+
+class ReplayClient(BaseLLMClient):
+    """
+    Serves responses recorded in a cassette (see cassette.py) instead of
+    calling the provider, optionally sleeping for each recorded latency.
+    No API key, rate limiting or retries are involved, but replayed responses
+    are recorded in the metrics like live ones.
+    """
+    def __init__(self, provider_name, model_version, cassette):
+        super().__init__(None, model_version, provider_name)
+        self.cassette = cassette
+        
+    def validate(self):
+        return True
+        
+    def is_available(self):
+        return self.cassette.next_availability(self.provider_name, self.model_version)
+        
+    def _next_recording(self, prompt, max_tokens, temperature):
+        """Return (LLMResponse, recorded latency) for this request"""
+        key = make_cache_key(self.provider_name, self.model_version, prompt, max_tokens, temperature)
+        recording = self.cassette.next_response(key)
+        if recording is None:
+            return self._create_error_response("No recorded response for this request in the cassette"), 0.0
+        latency = recording.get("latency") or 0.0
+        response = LLMResponse(provider=self.provider_name, latency=latency, **recording["response"])
+        return response, latency
+        
+    def generate(self, prompt, max_tokens=500, temperature=0.4, on_event=None):
+        response, latency = self._next_recording(prompt, max_tokens, temperature)
+        if self.cassette.reproduce_latency:
+            time.sleep(latency)
+        return self._served(prompt, max_tokens, temperature, response)
+        
+    async def agenerate(self, prompt, max_tokens=500, temperature=0.4, on_event=None):
+        response, latency = self._next_recording(prompt, max_tokens, temperature)
+        if self.cassette.reproduce_latency:
+            await asyncio.sleep(latency)
+        return self._served(prompt, max_tokens, temperature, response)
+        
+    def generate_stream(self, prompt, max_tokens=500, temperature=0.4, on_token=None, on_event=None):
+        response = self.generate(prompt, max_tokens, temperature)
+        if on_token and response.text:
+            on_token(response.text)
+        return response
+        
+    async def agenerate_stream(self, prompt, max_tokens=500, temperature=0.4, on_token=None, on_event=None):
+        response = await self.agenerate(prompt, max_tokens, temperature)
+        if on_token and response.text:
+            on_token(response.text)
+        return response
+        
+    def _generate(self, prompt, max_tokens, temperature):
+        response, _ = self._next_recording(prompt, max_tokens, temperature)
+        if response.is_error:
+            raise RuntimeError(response.error)
+        return response
+
+
+# Client-facing provider names, by canonical provider key
+PROVIDER_NAMES = {
+    "openai": "OpenAI",
+    "anthropic": "Anthropic",
+    "gemini": "Gemini",
+    "grok": "Grok",
+    "mistral": "Mistral",
+    "fake": "Fake",
+}
+
+
+def resolve_provider(provider):
+    """Map a speaker/provider name to one of the canonical provider keys"""
+    provider = provider.lower()
+    
+    # Checked first so e.g. "fake-gpt" doesn't select OpenAI
+    if "fake" in provider:
+        return "fake"
+    
+    elif "chad" in provider or "gpt" in provider or "openai" in provider:
+        return "openai"
+    
+    elif "claud" in provider or "anthropic" in provider:
+        return "anthropic"
+    
+    elif "gem" in provider or "google" in provider or "gianna" in provider:
+        return "gemini"
+    
+    elif "grok" in provider or "xai" in provider or "greg" in provider:
+        return "grok"
+    
+    elif "mistral" in provider or "marie" in provider or "mariel" in provider:
+        return "mistral"
+    
+    else:
+        raise ValueError(f"Unsupported provider: {provider}")
 
 
 def create_llm_client(provider, api_key, model_version, system_prompt=None):
     """Factory function to create appropriate LLM client based on provider"""
-    provider = provider.lower()
+    provider_key = resolve_provider(provider)
     
-    if "chad" in provider or "gpt" in provider or "openai" in provider:
+    # When replaying a cassette, every provider is served from the recording
+    cassette = get_replay_cassette()
+    if cassette is not None:
+        if provider_key == "fake":
+            # Recorded under the version FakeClient fills in when none is set
+            from fake_provider import DEFAULT_MODEL_VERSION
+            model_version = model_version or DEFAULT_MODEL_VERSION
+        return ReplayClient(PROVIDER_NAMES[provider_key], model_version, cassette)
+    
+    if provider_key == "openai":
         return OpenAIClient(api_key, model_version, system_prompt=system_prompt or "You are a helpful assistant.")
     
-    elif "claud" in provider or "anthropic" in provider:
+    elif provider_key == "anthropic":
         return AnthropicClient(api_key, model_version)
     
-    elif "gem" in provider or "google" in provider or "gianna" in provider:
+    elif provider_key == "gemini":
         return GeminiClient(api_key, model_version)
     
-    elif "grok" in provider or "xai" in provider or "greg" in provider:
+    elif provider_key == "grok":
         return GrokClient(api_key, model_version, system_prompt=system_prompt or "You are a helpful assistant.")
     
-    elif "mistral" in provider or "marie" in provider or "mariel" in provider:
-        return MistralClient(api_key, model_version)
+    elif provider_key == "fake":
+        # Imported here because fake_provider builds on this module
+        from fake_provider import FakeClient
+        return FakeClient(api_key, model_version)
     
     else:
-        raise ValueError(f"Unsupported provider: {provider}")
\ No newline at end of file
+        return MistralClient(api_key, model_version)
+
+
+class LLMClientPool:
+    """
+    Thread-safe cache of LLM clients keyed by provider, API key, model version
+    and system prompt. Reusing a client keeps its SDK HTTP connection pool
+    (and keep-alive connections) warm across turns and across simulations.
+    """
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        
+    def get(self, provider, api_key, model_version, system_prompt=None):
+        """Return the pooled client for this configuration, creating it on first use"""
+        key = (resolve_provider(provider), api_key, model_version, system_prompt)
+        
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = create_llm_client(provider, api_key, model_version, system_prompt=system_prompt)
+                self._clients[key] = client
+        
+        return client
+        
+    def clear(self):
+        """Drop all pooled clients"""
+        with self._lock:
+            self._clients.clear()
+            
+    def __len__(self):
+        return len(self._clients)
+
+
+_shared_client_pool = LLMClientPool()
+
+
+def get_shared_client_pool():
+    """Return the process-wide client pool shared by all simulations"""
+    return _shared_client_pool
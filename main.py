@@ -4,21 +4,40 @@ AI Talks - Panel Discussion Simulator
 A command-line tool that simulates a panel discussion between different AI language models.
 """
 
+import asyncio
 import random
 import sys
 import threading
 import time
 import argparse
 import os
+from contextlib import nullcontext
 
-from utils import read_file, write_file, parse_config, load_models_from_config, get_default_models
+from utils import read_file, write_file, parse_config, load_models_from_config, get_default_models, describe_provider_event
 from conversation import ConversationManager
+from rate_limiter import configure_rate_limits_from_config
+from resilience import configure_resilience_from_config
+from fake_provider import configure_fake_provider_from_config
+from context_strategies import CONTEXT_STRATEGIES, create_context_strategy_from_config
+from usage import format_usage_table
+from cassette import start_recording, start_replay, stop_recording
+from response_cache import (DEFAULT_CACHE_FILE, clear_response_cache_file, configure_response_cache_from_config,
+                            settings_seed)
+from transcript import DEFAULT_FLUSH_POLICY, FLUSH_POLICIES, TranscriptWriter, close_on_signals
+from checkpoint import DEFAULT_CHECKPOINT_EVERY, CheckpointWriter, load_checkpoint
+from exporters import close_exporters, create_exporter
+from metrics import DEFAULT_METRICS_HOST, enable_metrics, start_metrics_server, write_metrics_snapshot
+from tracing import start_tracing, stop_tracing
+from profiling import DEFAULT_PROFILE_TOP, PROFILE_MODES, RunProfiler
 
 # Configuration defaults
 DEFAULT_MAX_CHARACTERS = 15000
 DEFAULT_MAX_TOKENS = 500
 DEFAULT_TEMPERATURE = 0.4
 DEFAULT_CHALLENGE_PROBABILITY = 0.2
+DEFAULT_FINAL_ROUND_WORKERS = 4
+DEFAULT_CONTEXT_WINDOW = 10
+DEFAULT_SUMMARY_EVERY = 5
 DEFAULT_OUTPUT_FILE = "conversation_output.txt"
 
 
@@ -70,6 +89,61 @@ def setup_argument_parser():
         help="Path to the output file (default: from config or conversation_output.txt)"
     )
     
+    parser.add_argument(
+        "--flush",
+        type=str,
+        choices=FLUSH_POLICIES,
+        default=DEFAULT_FLUSH_POLICY,
+        help="How hard each message is pushed to the output file as it is written: "
+             "none (buffered), message (flushed) or fsync (flushed and fsynced) (default: message)"
+    )
+    
+    parser.add_argument(
+        "--export",
+        type=str,
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="Also write the conversation as structured per-turn records (speaker, provider, round, "
+             "latency, usage...) to PATH; the format comes from the extension: .jsonl, .md or .html (repeatable)"
+    )
+    
+    parser.add_argument(
+        "--export-background",
+        action="store_true",
+        help="Write the --export files from a background thread"
+    )
+    
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Where to save the checkpoint for resuming an interrupted run "
+             "(default: <output file>.checkpoint, or the --resume file; removed when the run completes)"
+    )
+    
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=DEFAULT_CHECKPOINT_EVERY,
+        help=f"Save the checkpoint state every N turns (default: {DEFAULT_CHECKPOINT_EVERY})"
+    )
+    
+    parser.add_argument(
+        "--no-checkpoint",
+        action="store_true",
+        help="Don't save a checkpoint"
+    )
+    
+    parser.add_argument(
+        "--resume",
+        type=str,
+        default=None,
+        metavar="CHECKPOINT",
+        help="Continue an interrupted run from its checkpoint (topic, prompts and limits come from the checkpoint)"
+    )
+    
     parser.add_argument(
         "--max-chars", 
         type=int, 
@@ -98,6 +172,170 @@ def setup_argument_parser():
         help=f"Probability of challenging the last speaker (default: {DEFAULT_CHALLENGE_PROBABILITY})"
     )
     
+    parser.add_argument(
+        "--concurrent-final-round",
+        action="store_true",
+        help="Request all final-round statements in parallel (each sees the same history)"
+    )
+    
+    parser.add_argument(
+        "--final-round-workers",
+        type=int,
+        default=DEFAULT_FINAL_ROUND_WORKERS,
+        help=f"Maximum parallel requests in a concurrent final round (default: {DEFAULT_FINAL_ROUND_WORKERS})"
+    )
+    
+    parser.add_argument(
+        "--no-token-budget",
+        action="store_true",
+        help="Always request --max-tokens, even when less of the character budget is left"
+    )
+    
+    parser.add_argument(
+        "--context",
+        type=str,
+        choices=CONTEXT_STRATEGIES,
+        default="full",
+        help="How much of the conversation each prompt includes (default: full)"
+    )
+    
+    parser.add_argument(
+        "--context-window",
+        type=int,
+        default=DEFAULT_CONTEXT_WINDOW,
+        help=f"Messages kept verbatim by the window and hybrid strategies (default: {DEFAULT_CONTEXT_WINDOW})"
+    )
+    
+    parser.add_argument(
+        "--summary-every",
+        type=int,
+        default=DEFAULT_SUMMARY_EVERY,
+        help=f"Refresh the rolling summary every K messages (default: {DEFAULT_SUMMARY_EVERY})"
+    )
+    
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Answer repeated requests from a local response cache and store new responses in it"
+    )
+    
+    parser.add_argument(
+        "--cache-read-only",
+        action="store_true",
+        help="Use the response cache without writing to it (implies --cache)"
+    )
+    
+    parser.add_argument(
+        "--cache-file",
+        type=str,
+        default=DEFAULT_CACHE_FILE,
+        help=f"Path to the response cache (default: {DEFAULT_CACHE_FILE})"
+    )
+    
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Empty the response cache before running"
+    )
+    
+    parser.add_argument(
+        "--record",
+        type=str,
+        default=None,
+        metavar="CASSETTE",
+        help="Record every provider response (with latency) to a cassette file"
+    )
+    
+    parser.add_argument(
+        "--replay",
+        type=str,
+        default=None,
+        metavar="CASSETTE",
+        help="Serve provider responses from a recorded cassette instead of the network"
+    )
+    
+    parser.add_argument(
+        "--replay-latency",
+        action="store_true",
+        help="When replaying, wait for each response as long as it originally took"
+    )
+    
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for speaking order and challenges (default: random, the cassette's when replaying, "
+             "or derived from the topic, prompts and panel with --cache)"
+    )
+    
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        metavar="PORT",
+        help="Serve latency, error and throughput metrics in Prometheus format on http://HOST:PORT/metrics"
+    )
+    
+    parser.add_argument(
+        "--metrics-host",
+        type=str,
+        default=DEFAULT_METRICS_HOST,
+        help=f"Address the metrics endpoint listens on (default: {DEFAULT_METRICS_HOST})"
+    )
+    
+    parser.add_argument(
+        "--metrics-json",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Write a JSON snapshot of the metrics to PATH when the run ends"
+    )
+    
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Write a Chrome/Perfetto trace of every run, round, turn and phase to PATH"
+    )
+    
+    parser.add_argument(
+        "--profile",
+        type=str,
+        choices=PROFILE_MODES,
+        default=None,
+        help="Profile the simulation and export with cProfile (cpu), tracemalloc (mem) or both, "
+             "and write hotspot and allocation reports when the run ends"
+    )
+    
+    parser.add_argument(
+        "--profile-output",
+        type=str,
+        default=None,
+        metavar="PREFIX",
+        help="Prefix of the profile reports (default: <output file without extension>.profile)"
+    )
+    
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=DEFAULT_PROFILE_TOP,
+        help=f"Functions and allocation sites listed in each profile report (default: {DEFAULT_PROFILE_TOP})"
+    )
+    
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Run the simulation on the asyncio engine (same output, async provider clients)"
+    )
+    
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print each response as it is generated, token by token"
+    )
+    
     parser.add_argument(
         "--no-progress", 
         action="store_true",
@@ -121,6 +359,49 @@ def on_message_generated(message):
     print("\n" + message + "\n")
 
 
+def on_provider_event(speaker, event, details):
+    """Callback for provider retries and circuit breaker changes"""
+    sys.stdout.write(f"\n{describe_provider_event(speaker, event, details)} "
+                     f"[+{details['elapsed']:.1f}s]\n")
+    sys.stdout.flush()
+
+
+class StreamPrinter:
+    """Prints streamed tokens live and avoids re-printing the finished message"""
+    
+    def __init__(self):
+        self.speaker = None
+        self.fragments = []
+    
+    def on_token(self, speaker, delta):
+        """Callback for each text delta of a streaming response"""
+        if speaker != self.speaker:
+            if self.speaker is not None:
+                sys.stdout.write("\n")
+            self.speaker = speaker
+            self.fragments = []
+            sys.stdout.write(f"\n[{speaker}]\n")
+        
+        self.fragments.append(delta)
+        sys.stdout.write(delta)
+        sys.stdout.flush()
+    
+    def on_message(self, message):
+        """Callback for a finished message; only prints what wasn't streamed"""
+        streamed = (self.speaker is not None and
+                    message == f"[{self.speaker}]\n{''.join(self.fragments).strip()}")
+        
+        if self.speaker is not None:
+            sys.stdout.write("\n")
+        self.speaker = None
+        self.fragments = []
+        
+        if streamed:
+            print()
+        else:
+            on_message_generated(message)
+
+
 def on_progress_update(progress):
     """Callback for when progress is updated"""
     # Update the progress bar
@@ -134,12 +415,41 @@ def on_status_change(status):
     sys.stdout.flush()
 
 
+def report_checkpoint(checkpoint):
+    """Close the checkpoint of an unfinished run and tell the user how to resume it"""
+    if checkpoint is None:
+        return
+    checkpoint.close()
+    if os.path.exists(checkpoint.path):
+        print(f"Resume with: python main.py --resume {checkpoint.path}")
+
+
 def main():
     # Parse command-line arguments
     parser = setup_argument_parser()
     args = parser.parse_args()
     
+    if args.record and args.replay:
+        parser.error("--record and --replay can't be used together")
+    
+    transcript = None
+    checkpoint = None
+    exporters = []
+    profiler = None
+    if args.trace:
+        start_tracing(args.trace)
     try:
+        # Metrics are only collected when they are exported somewhere
+        if args.metrics_port is not None:
+            try:
+                server = start_metrics_server(args.metrics_port, args.metrics_host)
+            except OSError as e:
+                print(f"Error: Can't serve metrics on {args.metrics_host}:{args.metrics_port}: {e}")
+                return 1
+            print(f"Serving metrics on {server.url}")
+        elif args.metrics_json:
+            enable_metrics()
+        
         # === A) Read configuration from config file ===
         try:
             config_text = read_file(args.config)
@@ -148,6 +458,25 @@ def main():
             print(f"Warning: Config file {args.config} not found. Using defaults.")
             config_data = {}
         
+        # Apply any per-provider rate limits, timeouts, retry settings and fake provider behaviour from the config
+        configure_rate_limits_from_config(config_data)
+        configure_resilience_from_config(config_data)
+        configure_fake_provider_from_config(config_data)
+        
+        # Optional on-disk response cache
+        if args.clear_cache:
+            clear_response_cache_file(args.cache_file)
+        if args.cache or args.cache_read_only:
+            configure_response_cache_from_config(config_data, args.cache_file, read_only=args.cache_read_only)
+        
+        # Replay cassettes store their seed, so a replayed run makes the same
+        # random choices as the recorded one (the seed is applied below)
+        seed = args.seed
+        if args.replay:
+            cassette = start_replay(args.replay, reproduce_latency=args.replay_latency)
+            if seed is None:
+                seed = cassette.seed
+        
         # === B) Load model definitions dynamically from config ===
         models_list = load_models_from_config(config_data)
         
@@ -157,36 +486,85 @@ def main():
             models_list = get_default_models()
         
         # === C) Read topic, style prompt, and final-round prompt ===
-        try:
-            topic = read_file(args.topic).strip()
-        except FileNotFoundError:
-            print(f"Error: Topic file {args.topic} not found.")
-            return 1
-        
-        try:
-            style_prompt = read_file(args.prompt).strip()
-        except FileNotFoundError:
-            print(f"Error: Prompt file {args.prompt} not found.")
-            return 1
-        
-        try:
-            final_round_prompt = read_file(args.final_prompt).strip()
-        except FileNotFoundError:
-            print(f"Error: Final round prompt file {args.final_prompt} not found.")
-            return 1
+        resumed = None
+        max_chars, max_tokens = args.max_chars, args.max_tokens
+        temperature, challenge_prob = args.temperature, args.challenge_prob
+        if args.resume:
+            # A resumed run keeps the topic, prompts and limits it started with
+            try:
+                resumed = load_checkpoint(args.resume)
+            except FileNotFoundError:
+                print(f"Error: Checkpoint {args.resume} not found.")
+                return 1
+            settings = resumed.header
+            topic = settings["topic"]
+            style_prompt = settings["style_prompt"]
+            final_round_prompt = settings["final_round_prompt"]
+            ext_data = settings["ext_data"]
+            max_chars, max_tokens = settings["max_characters"], settings["max_tokens"]
+            temperature, challenge_prob = settings["temperature"], settings["challenge_probability"]
+        else:
+            try:
+                topic = read_file(args.topic).strip()
+            except FileNotFoundError:
+                print(f"Error: Topic file {args.topic} not found.")
+                return 1
+            
+            try:
+                style_prompt = read_file(args.prompt).strip()
+            except FileNotFoundError:
+                print(f"Error: Prompt file {args.prompt} not found.")
+                return 1
+            
+            try:
+                final_round_prompt = read_file(args.final_prompt).strip()
+            except FileNotFoundError:
+                print(f"Error: Final round prompt file {args.final_prompt} not found.")
+                return 1
+            
+            # Try to read external data, but it's optional
+            try:
+                ext_data = read_file(args.ext_data).strip()
+            except FileNotFoundError:
+                print(f"Warning: External data file {args.ext_data} not found. Proceeding without it.")
+                ext_data = ""
         
-        # Try to read external data, but it's optional
-        try:
-            ext_data = read_file(args.ext_data).strip()
-        except FileNotFoundError:
-            print(f"Warning: External data file {args.ext_data} not found. Proceeding without it.")
-            ext_data = ""
+        # Cached responses only match identical prompts, so with the cache on
+        # an unseeded run takes its seed from its settings: re-running the same
+        # topic and config then shuffles the speakers the same way
+        if seed is None and (args.cache or args.cache_read_only):
+            panel = [(model['name'], model.get('provider'), model.get('version')) for model in models_list]
+            seed = settings_seed(topic, style_prompt, final_round_prompt, ext_data, panel,
+                                 max_chars, max_tokens, temperature, challenge_prob)
+        if args.record:
+            if seed is None:
+                seed = random.randrange(2 ** 32)
+            start_recording(args.record, seed)
+        if seed is not None:
+            random.seed(seed)
         
         # === D) Determine output file ===
         output_file = args.output
         if not output_file:
             output_file = config_data.get("OUTPUT_FILE", DEFAULT_OUTPUT_FILE)
         
+        # Messages are appended to the output file as they are added, and the
+        # file is flushed on Ctrl+C or SIGTERM, so an interrupted run keeps them
+        transcript = TranscriptWriter(output_file, args.flush)
+        
+        # The checkpoint is saved after every turn so the run can be resumed
+        if not args.no_checkpoint:
+            checkpoint_file = args.checkpoint or args.resume or f"{output_file}.checkpoint"
+            checkpoint = CheckpointWriter(checkpoint_file, args.checkpoint_every)
+        close_on_signals(transcript, checkpoint)
+        
+        # Structured exports are written alongside the plain-text output
+        try:
+            exporters = [create_exporter(path, background=args.export_background) for path in args.export]
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+        
         # === E) Create and configure the conversation manager ===
         conversation = ConversationManager(
             models_list=models_list,
@@ -194,42 +572,101 @@ def main():
             style_prompt=style_prompt,
             final_round_prompt=final_round_prompt,
             ext_data=ext_data,
-            max_characters=args.max_chars,
-            max_tokens=args.max_tokens,
-            temperature=args.temperature,
-            challenge_probability=args.challenge_prob
+            max_characters=max_chars,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            challenge_probability=challenge_prob,
+            concurrent_final_round=args.concurrent_final_round,
+            final_round_workers=args.final_round_workers,
+            budget_aware_tokens=not args.no_token_budget,
+            context_strategy=create_context_strategy_from_config(
+                args.context, config_data, args.context_window, args.summary_every
+            ),
+            transcript=transcript,
+            checkpoint=checkpoint,
+            exporters=exporters
         )
+        if resumed is not None:
+            conversation.resume(resumed)
         
         # Set up callbacks
-        conversation.on_message = on_message_generated
+        if args.stream:
+            stream_printer = StreamPrinter()
+            conversation.on_message = stream_printer.on_message
+            conversation.on_token = stream_printer.on_token
+        else:
+            conversation.on_message = on_message_generated
         
         if not args.no_progress:
             conversation.on_progress = on_progress_update
             
         conversation.on_status = on_status_change
+        conversation.on_provider_event = on_provider_event
         
         # === F) Run the simulation ===
         print(f"\nAI Talks - Panel Discussion Simulator")
         print(f"Topic: {topic}")
-        print(f"Models: {', '.join([model['name'] for model in models_list])}")
+        print(f"Models: {', '.join([model['name'] for model in conversation.models_list])}")
         print(f"Output file: {output_file}")
-        print("\nStarting simulation...\n")
+        if resumed is not None:
+            print(f"\nResuming from {args.resume} ({len(resumed.messages)} messages)...\n")
+        else:
+            print("\nStarting simulation...\n")
         
-        # Run the simulation in the main thread
-        conversation_history = conversation.start_simulation()
+        if args.profile:
+            profiler = RunProfiler(args.profile, args.profile_output or f"{os.path.splitext(output_file)[0]}.profile",
+                                   args.profile_top)
         
-        # === G) Write to output file ===
-        conversation.write_to_file(output_file)
+        with profiler or nullcontext():
+            # Run the simulation in the main thread
+            if args.use_async:
+                conversation_history = asyncio.run(conversation.run())
+            else:
+                conversation_history = conversation.start_simulation()
+            
+            # === G) Write to output file ===
+            conversation.write_to_file(output_file)
+            close_exporters(exporters)
+        
+        stop_recording()
+        if checkpoint is not None:
+            checkpoint.discard()
         
         print(f"\nConversation simulation complete. Output written to: {output_file}")
+        for exporter in exporters:
+            print(f"Exported to: {exporter.path}")
+        
+        # === H) Report token usage and latency ===
+        print("\nUsage and latency:\n")
+        print(format_usage_table(conversation.usage))
         return 0
         
     except KeyboardInterrupt:
         print("\nSimulation interrupted by user.")
+        if transcript is not None and transcript.messages_written:
+            transcript.close()
+            print(f"Partial conversation saved to: {transcript.path}")
+        report_checkpoint(checkpoint)
         return 130
     except Exception as e:
         print(f"Error: {str(e)}")
+        if transcript is not None:
+            transcript.close()
+        report_checkpoint(checkpoint)
         return 1
+    finally:
+        # Finish the exports of an interrupted or failed run (a no-op once closed)
+        try:
+            close_exporters(exporters)
+        except Exception as e:
+            print(f"Error writing exports: {str(e)}")
+        if args.metrics_json:
+            write_metrics_snapshot(args.metrics_json)
+        if args.trace:
+            print(f"Trace written to: {stop_tracing()}")
+        if profiler is not None:
+            for path in profiler.write_reports():
+                print(f"Profile written to: {path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+"""
+Compact conversation messages. A panelist's message keeps the speaker as an
+index into a process-wide table of interned names, the sanitized text, the
+round number and flags; the "[Speaker]\\n" header is only added when the
+message is rendered (str()) or written out. Announcements (the introduction,
+the final round marker) are messages without a speaker.
+"""
+
+import threading
+
+
+# Message flags
+CHALLENGE = 1  # The speaker was asked to challenge the last point
+FINAL = 2  # A final round statement
+
+NO_SPEAKER = -1
+
+# Interned speaker names, and their "[Name]\n" headers, by index
+_speaker_names = []
+_speaker_headers = []
+_speaker_indexes = {}
+_speaker_lock = threading.Lock()
+
+
+def intern_speaker(name):
+    """The speaker table index for `name`, adding it on first use"""
+    index = _speaker_indexes.get(name)
+    if index is None:
+        with _speaker_lock:
+            index = _speaker_indexes.get(name)
+            if index is None:
+                index = len(_speaker_names)
+                _speaker_names.append(name)
+                _speaker_headers.append(f"[{name}]\n")
+                _speaker_indexes[name] = index
+    return index
+
+
+class Message:
+    """
+    One message in a conversation. str() renders it exactly as it appears in
+    prompts and in the output file; len() is the length of that rendering.
+    """
+    __slots__ = ("speaker", "text", "round", "flags")
+
+    def __init__(self, text, speaker=NO_SPEAKER, round=None, flags=0):
+        self.speaker = speaker
+        self.text = text
+        self.round = round
+        self.flags = flags
+
+    @classmethod
+    def from_speaker(cls, name, text, round=None, flags=0):
+        return cls(text, intern_speaker(name), round, flags)
+
+    @property
+    def speaker_name(self):
+        """The speaker's name, or None for an announcement"""
+        return None if self.speaker == NO_SPEAKER else _speaker_names[self.speaker]
+
+    @property
+    def is_announcement(self):
+        return self.speaker == NO_SPEAKER
+
+    @property
+    def is_challenge(self):
+        return bool(self.flags & CHALLENGE)
+
+    @property
+    def is_final(self):
+        return bool(self.flags & FINAL)
+
+    @property
+    def header(self):
+        """The "[Speaker]\\n" line that starts the rendered message ("" for announcements)"""
+        return "" if self.speaker == NO_SPEAKER else _speaker_headers[self.speaker]
+
+    def __str__(self):
+        if self.speaker == NO_SPEAKER:
+            return self.text
+        return _speaker_headers[self.speaker] + self.text
+
+    def __len__(self):
+        if self.speaker == NO_SPEAKER:
+            return len(self.text)
+        return len(_speaker_headers[self.speaker]) + len(self.text)
+
+    def __repr__(self):
+        return f"Message({self.speaker_name!r}, {self.text[:40]!r}, round={self.round!r}, flags={self.flags})"
+
+
+def message_from_record(message, turn=None):
+    """
+    Rebuild a Message from its rendered text and turn metadata (as stored in
+    a checkpoint). Without metadata the text is kept as an announcement.
+    """
+    if isinstance(message, Message):
+        return message
+    if turn is None:
+        return Message(message)
+    speaker = intern_speaker(turn["speaker"])
+    header = _speaker_headers[speaker]
+    text = message[len(header):] if message.startswith(header) else message
+    return Message(text, speaker, turn.get("round"), turn_flags(turn))
+
+
+def turn_flags(turn):
+    """The message flags for a turn's metadata"""
+    return (CHALLENGE if turn.get("challenge") else 0) | (FINAL if turn.get("phase") == "final" else 0)
+
+
+def write_message(f, message, separator="\n\n"):
+    """Write a message and its separator to a text file without building the rendered string"""
+    if isinstance(message, Message):
+        if message.speaker != NO_SPEAKER:
+            f.write(_speaker_headers[message.speaker])
+        f.write(message.text)
+    else:
+        f.write(message)
+    f.write(separator)
@@ -0,0 +1,353 @@
+"""
+Process-wide metrics: request latency and time-to-first-token histograms per
+provider/model, request outcomes, error counters by type, provider events
+(retries, requeues, circuit breaker trips) and conversation throughput
+(turns and characters per second).
+
+Metrics are off unless enable_metrics() is called; the hooks in llm_clients.py
+and conversation.py cost a single None check when they are. The registry can
+be served in Prometheus text format from a local HTTP endpoint
+(start_metrics_server) and saved as a JSON snapshot (write_metrics_snapshot).
+"""
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rate_limiter import is_rate_limit_error
+
+
+# Upper bounds (seconds) of the histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TTFT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def classify_error(error):
+    """A short, low-cardinality label for a failed provider call"""
+    if is_rate_limit_error(error):
+        return "rate_limit"
+    name = type(error).__name__
+    if isinstance(error, TimeoutError) or "Timeout" in name or "DeadlineExceeded" in name:
+        return "timeout"
+    if isinstance(error, ConnectionError) or "Connection" in name:
+        return "connection"
+    for attr in ("status_code", "code", "status"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int):
+            return f"http_{status}"
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return f"http_{status}"
+    return name
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style (not thread-safe on its own)"""
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """(upper bound, observations <= bound) pairs, ending with +Inf"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q):
+        """Estimate the q-quantile by interpolating within its bucket (None when empty)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower = 0.0
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        # In the +Inf bucket: the best we can say is "above the last bound"
+        return self.buckets[-1] if self.buckets else None
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": _rounded(self.quantile(0.5)),
+            "p95": _rounded(self.quantile(0.95)),
+            "p99": _rounded(self.quantile(0.99)),
+            "buckets": {("+Inf" if bound == float("inf") else str(bound)): count
+                        for bound, count in self.cumulative()},
+        }
+
+
+def _rounded(value):
+    return None if value is None else round(value, 6)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and histograms keyed by label tuples. Rates are
+    averaged over the time since the registry was created (or reset);
+    Prometheus can compute windowed rates from the counters.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.monotonic()
+            self.latency = {}  # (provider, model) -> Histogram
+            self.ttft = {}  # (provider, model) -> Histogram
+            self.requests = {}  # (provider, model, outcome) -> count
+            self.errors = {}  # (provider, model, type) -> count
+            self.events = {}  # (provider, model, event) -> count
+            self.turns = {}  # (provider, model) -> count
+            self.characters = {}  # (provider, model) -> count
+            self.prompt_tokens = {}  # (provider, model) -> count
+            self.completion_tokens = {}  # (provider, model) -> count
+
+    @staticmethod
+    def _add(table, key, amount=1):
+        table[key] = table.get(key, 0) + amount
+
+    @staticmethod
+    def _histogram(table, key, buckets):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(buckets)
+        return histogram
+
+    def observe_response(self, provider, model, response):
+        """Record the LLMResponse handed back for one request"""
+        key = (provider, model)
+        if response.from_cache:
+            outcome = "cached"
+        else:
+            outcome = "error" if response.is_error else "ok"
+        with self._lock:
+            self._add(self.requests, key + (outcome,))
+            if response.latency is not None:
+                self._histogram(self.latency, key, LATENCY_BUCKETS).observe(response.latency)
+            if response.time_to_first_token is not None:
+                self._histogram(self.ttft, key, TTFT_BUCKETS).observe(response.time_to_first_token)
+            if not response.from_cache:
+                self._add(self.prompt_tokens, key, response.prompt_tokens or 0)
+                self._add(self.completion_tokens, key, response.completion_tokens or 0)
+
+    def observe_error(self, provider, model, error_type):
+        """Count a failed attempt (including ones that were retried)"""
+        with self._lock:
+            self._add(self.errors, (provider, model, error_type))
+
+    def observe_event(self, provider, model, event):
+        """Count a retry, rate-limit requeue or circuit breaker change"""
+        with self._lock:
+            self._add(self.events, (provider, model, event))
+
+    def observe_turn(self, provider, model, characters):
+        """Count a message added to a conversation by a panelist"""
+        key = (provider, model)
+        with self._lock:
+            self._add(self.turns, key)
+            self._add(self.characters, key, characters)
+
+    def snapshot(self):
+        """Everything in the registry as a JSON-friendly dict"""
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at
+            turns = sum(self.turns.values())
+            characters = sum(self.characters.values())
+            providers = {}
+            keys = set(self.latency) | set(self.ttft) | set(self.turns) | {key[:2] for key in self.requests}
+            keys |= {key[:2] for key in self.errors} | {key[:2] for key in self.events}
+            for key in sorted(keys, key=str):
+                provider, model = key
+                providers[f"{provider}/{model}"] = {
+                    "provider": provider,
+                    "model": model,
+                    "requests": {outcome: count for (p, m, outcome), count in self.requests.items() if (p, m) == key},
+                    "errors": {kind: count for (p, m, kind), count in self.errors.items() if (p, m) == key},
+                    "events": {event: count for (p, m, event), count in self.events.items() if (p, m) == key},
+                    "latency_seconds": self.latency[key].as_dict() if key in self.latency else None,
+                    "time_to_first_token_seconds": self.ttft[key].as_dict() if key in self.ttft else None,
+                    "prompt_tokens": self.prompt_tokens.get(key, 0),
+                    "completion_tokens": self.completion_tokens.get(key, 0),
+                    "turns": self.turns.get(key, 0),
+                    "characters": self.characters.get(key, 0),
+                }
+        return {
+            "uptime_seconds": round(elapsed, 3),
+            "turns": turns,
+            "characters": characters,
+            "turns_per_second": round(turns / elapsed, 6) if elapsed > 0 else 0.0,
+            "characters_per_second": round(characters / elapsed, 3) if elapsed > 0 else 0.0,
+            "providers": providers,
+        }
+
+    def render_prometheus(self):
+        """The registry in the Prometheus text exposition format"""
+        lines = []
+
+        def labels(names, values):
+            pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+            return "{" + pairs + "}" if pairs else ""
+
+        def counter(name, help_text, table, label_names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(table.items(), key=lambda item: str(item[0])):
+                lines.append(f"{name}{labels(label_names, key)} {value}")
+
+        def histogram(name, help_text, table):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in sorted(table.items(), key=lambda item: str(item[0])):
+                for bound, count in hist.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{name}_bucket{labels(('provider', 'model', 'le'), key + (le,))} {count}")
+                lines.append(f"{name}_sum{labels(('provider', 'model'), key)} {hist.sum}")
+                lines.append(f"{name}_count{labels(('provider', 'model'), key)} {hist.count}")
+
+        def gauge(name, help_text, value):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at
+            histogram("ai_talks_request_latency_seconds",
+                      "Time callers waited for a response, including queueing and retries", self.latency)
+            histogram("ai_talks_time_to_first_token_seconds",
+                      "Time until the first streamed token arrived", self.ttft)
+            counter("ai_talks_requests_total", "Requests by outcome (ok, error or cached)",
+                    self.requests, ("provider", "model", "outcome"))
+            counter("ai_talks_errors_total", "Failed provider attempts by error type",
+                    self.errors, ("provider", "model", "type"))
+            counter("ai_talks_provider_events_total", "Retries, rate-limit requeues and circuit breaker changes",
+                    self.events, ("provider", "model", "event"))
+            counter("ai_talks_prompt_tokens_total", "Prompt tokens reported by providers",
+                    self.prompt_tokens, ("provider", "model"))
+            counter("ai_talks_completion_tokens_total", "Completion tokens reported by providers",
+                    self.completion_tokens, ("provider", "model"))
+            counter("ai_talks_turns_total", "Panelist messages added to conversations",
+                    self.turns, ("provider", "model"))
+            counter("ai_talks_characters_total", "Characters of panelist messages added to conversations",
+                    self.characters, ("provider", "model"))
+            turns = sum(self.turns.values())
+            characters = sum(self.characters.values())
+            gauge("ai_talks_uptime_seconds", "Seconds since metrics collection started", round(elapsed, 3))
+            gauge("ai_talks_turns_per_second", "Average turns per second since metrics collection started",
+                  turns / elapsed if elapsed > 0 else 0.0)
+            gauge("ai_talks_characters_per_second",
+                  "Average characters per second since metrics collection started",
+                  characters / elapsed if elapsed > 0 else 0.0)
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Process-wide registry (None while metrics are off)
+_metrics = None
+
+
+def get_metrics():
+    """The process-wide metrics registry, or None when metrics are off"""
+    return _metrics
+
+
+def enable_metrics():
+    """Turn on metrics collection (keeping the registry if it is already on)"""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry()
+    return _metrics
+
+
+def disable_metrics():
+    """Turn off metrics collection"""
+    global _metrics
+    _metrics = None
+
+
+def write_metrics_snapshot(path, registry=None):
+    """Save a JSON snapshot of the registry (the process-wide one by default)"""
+    registry = registry or _metrics
+    if registry is None:
+        return None
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(registry.snapshot(), f, indent=2)
+    return path
+
+
+class MetricsServer:
+    """
+    Serves a registry over HTTP from a daemon thread: /metrics in the
+    Prometheus text format and /metrics.json as a JSON snapshot.
+    """
+    def __init__(self, registry, port, host=DEFAULT_METRICS_HOST):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    self._reply(registry.render_prometheus(), PROMETHEUS_CONTENT_TYPE)
+                elif path == "/metrics.json":
+                    self._reply(json.dumps(registry.snapshot(), indent=2), "application/json")
+                else:
+                    self.send_error(404)
+
+            def _reply(self, body, content_type):
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the simulation's output
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def start_metrics_server(port, host=DEFAULT_METRICS_HOST):
+    """Turn on metrics and serve them on http://host:port/metrics (port 0 picks a free port)"""
+    return MetricsServer(enable_metrics(), port, host)
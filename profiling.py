@@ -0,0 +1,112 @@
+"""
+CPU and memory profiling of a run (main.py --profile). The simulation and
+the export step are run under cProfile and/or tracemalloc, and when the run
+ends the hotspots (sorted by cumulative and by own time) and the top
+allocation sites are written to text reports. With the fake provider or a
+replayed cassette this profiles the orchestrator itself.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import tracemalloc
+
+
+PROFILE_MODES = ("cpu", "mem", "both")
+DEFAULT_PROFILE_TOP = 30
+
+
+class RunProfiler:
+    """
+    Profiles every `with profiler:` block. Time spent outside the blocks
+    (reading files, building clients before the run) is left out of the CPU
+    profile; memory is traced from the first block to the end of the last.
+    """
+    def __init__(self, mode, prefix, top=DEFAULT_PROFILE_TOP):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}' (choose from {', '.join(PROFILE_MODES)})")
+        self.prefix = prefix
+        self.top = top
+        self.cpu = cProfile.Profile() if mode in ("cpu", "both") else None
+        self.memory = mode in ("mem", "both")
+        self._snapshot = None
+        self._peak = 0
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            # Enough frames to tell the allocation sites' callers apart
+            tracemalloc.start(10)
+        if self.cpu is not None:
+            self.cpu.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.cpu is not None:
+            self.cpu.disable()
+        if self.memory and tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot()
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+        return False
+
+    def write_reports(self):
+        """Write the reports, stop tracing memory, and return the files written"""
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        paths = []
+        if self.cpu is not None:
+            paths.append(self._write_cpu_report())
+            # Raw stats, for snakeviz, gprof2dot or pstats
+            self.cpu.dump_stats(f"{self.prefix}.prof")
+            paths.append(f"{self.prefix}.prof")
+        if self.memory and self._snapshot is not None:
+            paths.append(self._write_memory_report())
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return paths
+
+    def _write_cpu_report(self):
+        path = f"{self.prefix}.cpu.txt"
+        buffer = io.StringIO()
+        stats = pstats.Stats(self.cpu, stream=buffer)
+        stats.strip_dirs()
+        buffer.write(f"CPU profile: {stats.total_calls} calls in {stats.total_tt:.3f} s\n\n")
+        buffer.write(f"=== Top {self.top} by cumulative time ===\n")
+        stats.sort_stats("cumulative").print_stats(self.top)
+        buffer.write(f"\n=== Top {self.top} by own time ===\n")
+        stats.sort_stats("tottime").print_stats(self.top)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(buffer.getvalue())
+        return path
+
+    def _write_memory_report(self):
+        path = f"{self.prefix}.mem.txt"
+        snapshot = self._snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        by_line = snapshot.statistics("lineno")
+        total = sum(stat.size for stat in by_line)
+
+        lines = [
+            f"Memory profile: peak {self._peak / 1024 / 1024:.1f} MiB traced, "
+            f"{total / 1024 / 1024:.1f} MiB still allocated at the end of the run",
+            "",
+            f"=== Top {self.top} allocation sites (still allocated) ===",
+        ]
+        for i, stat in enumerate(by_line[:self.top], start=1):
+            frame = stat.traceback[0]
+            lines.append(f"{i:3d}. {stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks  "
+                         f"{frame.filename}:{frame.lineno}")
+
+        lines += ["", f"=== Top {min(self.top, 10)} allocation sites with their callers ==="]
+        for stat in snapshot.statistics("traceback")[:min(self.top, 10)]:
+            lines.append(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks")
+            lines += [f"    {line}" for line in stat.traceback.format(most_recent_first=True)]
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        return path
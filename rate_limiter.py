@@ -0,0 +1,284 @@
+"""Per-provider request/token rate limiting with adaptive concurrency"""
+
+import asyncio
+import re
+import threading
+import time
+
+
+# Seconds to pause a provider after a 429 that didn't say how long to wait
+DEFAULT_RATE_LIMIT_COOLDOWN = 5.0
+
+# Rough prompt-size estimate used before the provider reports real usage
+CHARS_PER_TOKEN_ESTIMATE = 4
+
+# Config keys are <PREFIX>_RPM, <PREFIX>_TPM and <PREFIX>_MAX_CONCURRENCY
+PROVIDER_CONFIG_PREFIXES = {
+    "OpenAI": "OPENAI",
+    "Anthropic": "ANTHROPIC",
+    "Gemini": "GEMINI",
+    "Grok": "GROK",
+    "Mistral": "MISTRAL",
+    "Fake": "FAKE",
+}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate for text we haven't sent yet"""
+    return max(1, len(text) // CHARS_PER_TOKEN_ESTIMATE)
+
+
+_RATE_LIMIT_MESSAGE = re.compile(
+    r"\b(?:status(?:[ _]code)?|code|error|http)[\s:=-]{0,12}429\b"
+    r"|\b429\b[\s:-]{0,3}(?:too many requests|resource (?:has been )?exhausted)"
+    r"|\brate[ _-]?limit",
+    re.IGNORECASE
+)
+
+
+def is_rate_limit_error(error):
+    """Recognize a 429 / quota error from any of the provider SDKs"""
+    for attr in ("status_code", "code", "status"):
+        if getattr(error, attr, None) == 429:
+            return True
+
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+
+    name = type(error).__name__
+    if "RateLimit" in name or "ResourceExhausted" in name or "TooManyRequests" in name:
+        return True
+
+    # SDKs without a structured status put it in the message ("Error code:
+    # 429", "HTTP 429", "429 Too Many Requests"); a bare 429 elsewhere in the
+    # text (a token count, a request id) doesn't count
+    return bool(_RATE_LIMIT_MESSAGE.search(str(error)))
+
+
+def get_retry_after(error):
+    """Return the Retry-After delay (seconds) carried by an error, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute`.
+    Reservations may drive the balance negative; the caller then waits for
+    the returned delay, which keeps waiting callers in FIFO-ish order.
+    """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_second)
+        self.updated_at = now
+
+    def reserve(self, amount):
+        """Take `amount` tokens and return how many seconds to wait before using them"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate_per_second
+
+    def refund(self, amount):
+        """Give back tokens that were reserved but not used (negative to charge more)"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimitTicket:
+    """Bookkeeping for one admitted request"""
+    __slots__ = ("reserved_tokens", "started_at")
+
+    def __init__(self, reserved_tokens):
+        self.reserved_tokens = reserved_tokens
+        self.started_at = time.monotonic()
+
+
+class ProviderRateLimiter:
+    """
+    Gates calls to one provider/API key. Calls wait (instead of failing) for a
+    free concurrency slot, for request-per-minute and token-per-minute budget,
+    and for any cooldown after a 429. The concurrency limit adapts: it is
+    halved on a 429, shrinks when latency climbs well above the observed
+    baseline, and otherwise grows slowly back towards `max_concurrency`.
+    """
+    # Latency this many times above the baseline counts as congestion
+    latency_tolerance = 3.0
+    # How often waiting async callers re-check for a free slot
+    async_poll_interval = 0.05
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None,
+                 max_concurrency=64, initial_concurrency=8, min_concurrency=1):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = float(min(initial_concurrency, max_concurrency))
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.latency_baseline = None
+        self.rate_limited_count = 0
+        self._condition = threading.Condition()
+
+    def configure(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=None):
+        """Apply new limits; None leaves a setting unchanged"""
+        with self._condition:
+            if requests_per_minute is not None:
+                self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+            if tokens_per_minute is not None:
+                self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+            if max_concurrency is not None:
+                self.max_concurrency = max(self.min_concurrency, max_concurrency)
+                self.concurrency_limit = min(self.concurrency_limit, self.max_concurrency)
+            self._condition.notify_all()
+
+    def _admit_locked(self):
+        """Claim a concurrency slot if one is free (lock held); else return seconds to wait"""
+        cooldown = self.blocked_until - time.monotonic()
+        if cooldown > 0:
+            return cooldown
+        if self.in_flight < int(self.concurrency_limit):
+            self.in_flight += 1
+            return 0.0
+        return None
+
+    def _reserve_budget(self, estimated_tokens):
+        """Reserve RPM/TPM budget; returns (ticket, seconds to wait)"""
+        delay = 0.0
+        if self.request_bucket:
+            delay = max(delay, self.request_bucket.reserve(1))
+        if self.token_bucket:
+            delay = max(delay, self.token_bucket.reserve(estimated_tokens))
+        return RateLimitTicket(estimated_tokens), delay
+
+    def acquire(self, estimated_tokens=0):
+        """Block until the call may proceed; returns a ticket for release()"""
+        with self._condition:
+            while True:
+                wait = self._admit_locked()
+                if wait == 0.0:
+                    break
+                self._condition.wait(timeout=wait)
+
+        ticket, delay = self._reserve_budget(estimated_tokens)
+        if delay > 0:
+            time.sleep(delay)
+        ticket.started_at = time.monotonic()
+        return ticket
+
+    async def aacquire(self, estimated_tokens=0):
+        """Async version of acquire() that never blocks the event loop"""
+        while True:
+            with self._condition:
+                wait = self._admit_locked()
+            if wait == 0.0:
+                break
+            await asyncio.sleep(wait if wait is not None else self.async_poll_interval)
+
+        ticket, delay = self._reserve_budget(estimated_tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        ticket.started_at = time.monotonic()
+        return ticket
+
+    def release(self, ticket, used_tokens=None, rate_limited=False, retry_after=None, failed=False):
+        """Return the slot, reconcile token usage and adapt the concurrency limit"""
+        latency = time.monotonic() - ticket.started_at
+
+        if self.token_bucket and used_tokens is not None:
+            self.token_bucket.refund(ticket.reserved_tokens - used_tokens)
+
+        with self._condition:
+            self.in_flight -= 1
+
+            if rate_limited:
+                self.rate_limited_count += 1
+                self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+                cooldown = retry_after if retry_after is not None else DEFAULT_RATE_LIMIT_COOLDOWN
+                self.blocked_until = max(self.blocked_until, time.monotonic() + cooldown)
+            elif not failed:
+                self._observe_latency(latency)
+
+            self._condition.notify_all()
+
+    def _observe_latency(self, latency):
+        """Additive increase while latency is normal, gentle decrease when it isn't"""
+        if self.latency_baseline is None or latency < self.latency_baseline:
+            self.latency_baseline = latency
+        else:
+            # Let the baseline drift up slowly so it tracks real conditions
+            self.latency_baseline = 0.95 * self.latency_baseline + 0.05 * latency
+
+        if latency > self.latency_tolerance * self.latency_baseline:
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * 0.9)
+        else:
+            self.concurrency_limit = min(self.max_concurrency,
+                                         self.concurrency_limit + 1.0 / self.concurrency_limit)
+
+
+_limiters = {}
+_provider_settings = {}
+_registry_lock = threading.Lock()
+
+
+def get_rate_limiter(provider_name, api_key):
+    """Return the limiter shared by every client using this provider and API key"""
+    key = (provider_name, api_key)
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = ProviderRateLimiter(**_provider_settings.get(provider_name, {}))
+            _limiters[key] = limiter
+    return limiter
+
+
+def configure_rate_limits(provider_name, requests_per_minute=None, tokens_per_minute=None,
+                          max_concurrency=None):
+    """Set limits for a provider, applied to existing and future limiters"""
+    settings = {}
+    if requests_per_minute is not None:
+        settings["requests_per_minute"] = requests_per_minute
+    if tokens_per_minute is not None:
+        settings["tokens_per_minute"] = tokens_per_minute
+    if max_concurrency is not None:
+        settings["max_concurrency"] = max_concurrency
+
+    with _registry_lock:
+        _provider_settings.setdefault(provider_name, {}).update(settings)
+        existing = [limiter for (name, _), limiter in _limiters.items() if name == provider_name]
+
+    for limiter in existing:
+        limiter.configure(requests_per_minute, tokens_per_minute, max_concurrency)
+
+
+def configure_rate_limits_from_config(config_data):
+    """Read <PROVIDER>_RPM / _TPM / _MAX_CONCURRENCY keys from a parsed config dict"""
+    for provider_name, prefix in PROVIDER_CONFIG_PREFIXES.items():
+        values = {}
+        for suffix, setting in (("RPM", "requests_per_minute"),
+                                ("TPM", "tokens_per_minute"),
+                                ("MAX_CONCURRENCY", "max_concurrency")):
+            raw = config_data.get(f"{prefix}_{suffix}")
+            if raw:
+                try:
+                    values[setting] = int(raw)
+                except ValueError:
+                    raise ValueError(f"{prefix}_{suffix} must be an integer, got {raw!r}")
+        if values:
+            configure_rate_limits(provider_name, **values)
@@ -0,0 +1,211 @@
+"""Timeouts, retry with exponential backoff, and per-provider circuit breakers"""
+
+import random
+import threading
+import time
+
+from rate_limiter import PROVIDER_CONFIG_PREFIXES
+
+
+# Seconds before a provider request is abandoned
+DEFAULT_REQUEST_TIMEOUT = 60.0
+
+# HTTP statuses worth retrying (429 is handled by the rate limiter)
+RETRYABLE_STATUS_CODES = {408, 409, 500, 502, 503, 504, 529}
+
+
+def is_retryable_error(error):
+    """Recognize transient failures (timeouts, dropped connections, 5xx) from any SDK"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+
+    for attr in ("status_code", "code", "status"):
+        if getattr(error, attr, None) in RETRYABLE_STATUS_CODES:
+            return True
+
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) in RETRYABLE_STATUS_CODES:
+        return True
+
+    name = type(error).__name__
+    return any(marker in name for marker in (
+        "Timeout", "Connection", "InternalServer", "ServiceUnavailable",
+        "Overloaded", "DeadlineExceeded", "ServerError",
+    ))
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+    def __init__(self, max_retries=2, base_delay=1.0, max_delay=20.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # A private generator, so jitter never shifts the seeded global
+        # `random` sequence that decides speaking order and challenges
+        self._random = random.Random()
+
+    def get_delay(self, attempt):
+        """Seconds to wait before retry number `attempt` (1-based)"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return self._random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker. After `failure_threshold`
+    consecutive failures the circuit opens and calls are refused for
+    `reset_timeout` seconds; then a single trial call is let through, which
+    closes the circuit on success or re-opens it on failure.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        """True if a call would currently be allowed (doesn't claim the trial slot)"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at >= self.reset_timeout
+            if self.state == self.HALF_OPEN:
+                return not self._trial_in_flight
+            return True
+
+    def allow_request(self):
+        """Claim permission to call the provider"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+
+            return True
+
+    def retry_in(self):
+        """Seconds until an open circuit lets a trial call through"""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        """Returns True if this success closed a previously tripped circuit"""
+        with self._lock:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            return recovered
+
+    def release_trial(self):
+        """
+        Give back a half-open trial slot without counting the outcome (e.g.
+        the trial was rate limited or cancelled, which says nothing about
+        whether the provider has recovered), so the next call can be the trial
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Returns True if this failure tripped the circuit open"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                tripped = self.state != self.OPEN
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                return tripped
+            return False
+
+
+_breakers = {}
+_timeouts = {}
+_retry_policies = {}
+_breaker_settings = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider_name, api_key):
+    """Return the breaker shared by every client using this provider and API key"""
+    key = (provider_name, api_key)
+    with _registry_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(**_breaker_settings.get(provider_name, {}))
+            _breakers[key] = breaker
+    return breaker
+
+
+def get_request_timeout(provider_name):
+    """Request timeout in seconds for a provider"""
+    return _timeouts.get(provider_name, DEFAULT_REQUEST_TIMEOUT)
+
+
+def get_retry_policy(provider_name):
+    """Retry policy for a provider"""
+    with _registry_lock:
+        policy = _retry_policies.get(provider_name)
+        if policy is None:
+            policy = _retry_policies[provider_name] = RetryPolicy()
+    return policy
+
+
+def configure_resilience(provider_name, timeout=None, max_retries=None,
+                         breaker_threshold=None, breaker_reset=None):
+    """
+    Set timeout/retry/breaker settings for a provider. Timeouts apply to
+    clients created afterwards; the other settings apply immediately.
+    """
+    if timeout is not None:
+        _timeouts[provider_name] = timeout
+    if max_retries is not None:
+        get_retry_policy(provider_name).max_retries = max_retries
+
+    settings = {}
+    if breaker_threshold is not None:
+        settings["failure_threshold"] = breaker_threshold
+    if breaker_reset is not None:
+        settings["reset_timeout"] = breaker_reset
+    if settings:
+        with _registry_lock:
+            _breaker_settings.setdefault(provider_name, {}).update(settings)
+            existing = [breaker for (name, _), breaker in _breakers.items() if name == provider_name]
+        for breaker in existing:
+            for attr, value in settings.items():
+                setattr(breaker, attr, value)
+
+
+def configure_resilience_from_config(config_data):
+    """
+    Read <PROVIDER>_TIMEOUT / _MAX_RETRIES / _BREAKER_THRESHOLD / _BREAKER_RESET
+    keys from a parsed config dict
+    """
+    for provider_name, prefix in PROVIDER_CONFIG_PREFIXES.items():
+        values = {}
+        for suffix, setting, cast in (("TIMEOUT", "timeout", float),
+                                      ("MAX_RETRIES", "max_retries", int),
+                                      ("BREAKER_THRESHOLD", "breaker_threshold", int),
+                                      ("BREAKER_RESET", "breaker_reset", float)):
+            raw = config_data.get(f"{prefix}_{suffix}")
+            if raw:
+                try:
+                    values[setting] = cast(raw)
+                except ValueError:
+                    raise ValueError(f"{prefix}_{suffix} must be a number, got {raw!r}")
+        if values:
+            configure_resilience(provider_name, **values)
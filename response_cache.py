@@ -0,0 +1,186 @@
+"""Persistent SQLite cache of LLM responses with LRU eviction"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_CACHE_FILE = ".ai_talks_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return " ".join(prompt.split())
+
+
+def make_cache_key(provider, model_version, prompt, max_tokens, temperature):
+    """Cache key for one request: provider, version, prompt hash, max_tokens, temperature"""
+    prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return json.dumps([provider, model_version, prompt_hash, max_tokens, float(temperature)])
+
+
+def settings_seed(*settings):
+    """
+    A random seed derived from a run's settings (JSON-serializable values).
+    Cache keys include the whole prompt, which depends on the speaking order,
+    so an unseeded run with the cache on uses this to make the same random
+    choices, and send the same prompts, every time it is re-run.
+    """
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big")
+
+
+class ResponseCache:
+    """
+    Successful responses stored in a local SQLite file. Entries are evicted
+    least-recently-used first once there are more than `max_entries` of them
+    or they take more than `max_bytes`. A read-only cache serves hits but
+    never writes (not even the LRU timestamps).
+    """
+    def __init__(self, path=DEFAULT_CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, read_only=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if read_only and not os.path.exists(path):
+            raise FileNotFoundError(f"Response cache {path} does not exist")
+
+        # One connection shared by every thread, serialized by self._lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if not read_only:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_used)")
+            self._db.commit()
+
+        # Kept in memory so eviction checks don't scan the table on every write
+        self.entries, self.size = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if not read_only:
+            # The limits may have been lowered since the file was last used
+            with self._lock:
+                self._evict_locked()
+                self._db.commit()
+
+    def get(self, key):
+        """Return the cached response fields for `key`, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.read_only:
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+        return json.loads(row[0])
+
+    def put(self, key, fields):
+        """Store response fields under `key`, evicting old entries if needed"""
+        if self.read_only:
+            return
+        data = json.dumps(fields)
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time())
+            )
+            if previous:
+                self.size -= previous[0]
+            else:
+                self.entries += 1
+            self.size += len(data)
+            self._evict_locked()
+            self._db.commit()
+
+    def _evict_locked(self):
+        """Drop least-recently-used entries until both limits are met"""
+        while self.entries > self.max_entries or (self.size > self.max_bytes and self.entries > 0):
+            # Evict in batches rather than one row per query
+            batch = max(1, self.entries - self.max_entries, self.entries // 20)
+            rows = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY last_used LIMIT ?", (batch,)
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.entries -= 1
+                self.size -= size
+                if self.entries <= self.max_entries and self.size <= self.max_bytes:
+                    break
+
+    def clear(self):
+        """Delete every entry"""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self.entries = self.size = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """The process-wide response cache, or None when caching is off"""
+    return _response_cache
+
+
+def configure_response_cache(path=DEFAULT_CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES,
+                             max_bytes=DEFAULT_MAX_BYTES, read_only=False):
+    """Turn on the process-wide response cache (replacing any previous one)"""
+    global _response_cache
+    disable_response_cache()
+    _response_cache = ResponseCache(path, max_entries, max_bytes, read_only)
+    return _response_cache
+
+
+def disable_response_cache():
+    """Turn off the process-wide response cache"""
+    global _response_cache
+    if _response_cache is not None:
+        _response_cache.close()
+    _response_cache = None
+
+
+def clear_response_cache_file(path=DEFAULT_CACHE_FILE):
+    """Empty the cache stored at `path`, if it exists"""
+    if os.path.exists(path):
+        cache = ResponseCache(path)
+        cache.clear()
+        cache.close()
+
+
+def configure_response_cache_from_config(config_data, path=DEFAULT_CACHE_FILE, read_only=False):
+    """Enable the cache with CACHE_MAX_ENTRIES / CACHE_MAX_MB limits from a parsed config dict"""
+    limits = {}
+    for key, setting, scale in (("CACHE_MAX_ENTRIES", "max_entries", 1),
+                                ("CACHE_MAX_MB", "max_bytes", 1024 * 1024)):
+        raw = config_data.get(key)
+        if raw:
+            try:
+                limits[setting] = int(float(raw) * scale)
+            except ValueError:
+                raise ValueError(f"{key} must be a number, got {raw!r}")
+    return configure_response_cache(path, read_only=read_only, **limits)
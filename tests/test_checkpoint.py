@@ -0,0 +1,104 @@
+"""Writing and loading checkpoints"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import CheckpointWriter, load_checkpoint
+
+
+HEADER = {"topic": "Testing", "speakers": ["Alice", "Bob"]}
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "run.checkpoint")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_run(self, every=1):
+        writer = CheckpointWriter(self.path, every)
+        writer.start(HEADER)
+        writer.append_message("[Alice]\nHello", {"speaker": "Alice"})
+        writer.save_state({"messages": 1, "position": 1})
+        writer.append_message("[Bob]\nHi")
+        writer.save_state({"messages": 2, "position": 2})
+        return writer
+
+    def test_round_trip(self):
+        self.write_run().close()
+
+        checkpoint = load_checkpoint(self.path)
+        self.assertEqual(checkpoint.header["topic"], "Testing")
+        self.assertEqual(checkpoint.state, {"messages": 2, "position": 2})
+        self.assertEqual(checkpoint.messages, ["[Alice]\nHello", "[Bob]\nHi"])
+        self.assertEqual(checkpoint.turns, [{"speaker": "Alice"}, None])
+
+    def test_messages_after_the_last_state_are_dropped(self):
+        writer = self.write_run()
+        writer.append_message("[Alice]\nUnsaved")
+        writer.close()
+
+        checkpoint = load_checkpoint(self.path)
+        self.assertEqual(len(checkpoint.messages), 2)
+        self.assertEqual(checkpoint.state["messages"], 2)
+
+    def test_truncated_last_line_is_ignored(self):
+        self.write_run().close()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"message": "[Alice]\\nCut o')
+
+        checkpoint = load_checkpoint(self.path)
+        self.assertEqual(checkpoint.state["messages"], 2)
+        self.assertEqual(len(checkpoint.messages), 2)
+
+    def test_corrupt_complete_line_is_an_error(self):
+        self.write_run().close()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('not json\n{"state": {"messages": 2}}\n')
+
+        with self.assertRaises(ValueError):
+            load_checkpoint(self.path)
+
+    def test_state_is_written_every_n_turns(self):
+        writer = self.write_run(every=2)
+        writer.close()
+
+        # Only the second state record made it to the file
+        self.assertEqual(load_checkpoint(self.path).state["messages"], 2)
+        writer = CheckpointWriter(self.path, every=3)
+        writer.start(HEADER, ["[Alice]\nHello"])
+        writer.save_state({"messages": 1})
+        writer.close()
+        with self.assertRaises(ValueError):
+            load_checkpoint(self.path)
+
+    def test_restart_over_the_resumed_file_keeps_it_loadable(self):
+        self.write_run().close()
+        checkpoint = load_checkpoint(self.path)
+
+        # Resuming with the checkpoint as its own target rewrites it in place
+        writer = CheckpointWriter(self.path)
+        writer.start(HEADER, checkpoint.messages, checkpoint.turns, checkpoint.state)
+        self.assertEqual(load_checkpoint(self.path).messages, checkpoint.messages)
+        self.assertFalse(os.path.exists(f"{self.path}.tmp"))
+
+        writer.append_message("[Alice]\nAgain")
+        writer.save_state({"messages": 3, "position": 3})
+        writer.close()
+        self.assertEqual(load_checkpoint(self.path).messages[-1], "[Alice]\nAgain")
+
+    def test_discard_removes_the_file(self):
+        writer = self.write_run()
+        writer.discard()
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+"""Context strategies: the interface and the capped full history"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_strategies import ContextStrategy, FullHistoryContext
+
+
+class ContextStrategyTest(unittest.TestCase):
+    def test_incomplete_strategy_cannot_be_created(self):
+        class AppendOnly(ContextStrategy):
+            def append(self, message):
+                pass
+
+        with self.assertRaises(TypeError):
+            AppendOnly()
+
+    def test_full_history_keeps_the_newest_messages_that_fit(self):
+        context = FullHistoryContext()
+        messages = [f"[P{i}]\n" + "x" * i for i in range(1, 30)]
+        for message in messages:
+            context.append(message)
+            self.assertEqual(context.render(), "\n".join(context.messages))
+            for max_chars in (1, 20, 60, 200):
+                kept = []
+                for candidate in reversed(context.messages):
+                    if kept and len("\n".join([candidate] + kept)) > max_chars:
+                        break
+                    kept.insert(0, candidate)
+                self.assertEqual(context.render(max_chars), "\n".join(kept))
+
+
+if __name__ == "__main__":
+    unittest.main()
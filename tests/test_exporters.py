@@ -0,0 +1,124 @@
+"""JSONL, Markdown and HTML transcript exports"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exporters import (BackgroundExporter, HTMLExporter, JSONLExporter, MarkdownExporter, create_exporter,
+                       export_path_for, turn_record)
+from messages import Message
+
+
+TURN = {
+    "speaker": "Alice",
+    "provider": "OpenAI",
+    "version": "gpt-4o",
+    "phase": "discussion",
+    "round": 2,
+    "challenge": True,
+    "latency": 1.234,
+    "usage": {"prompt_tokens": 120, "completion_tokens": 30, "cached_tokens": 0, "from_cache": False},
+    "finish_reason": "stop",
+    "error": None,
+}
+
+
+def records():
+    return [
+        turn_record(0, "Greetings, <curious> minds!\n\nToday's topic"),
+        turn_record(1, Message("I disagree & here's why.", "Alice"), TURN),
+        turn_record(2, "[Bob]\nFair point.", dict(TURN, speaker="Bob", challenge=False, phase="final")),
+    ]
+
+
+class TurnRecordTest(unittest.TestCase):
+    def test_announcement_and_turns(self):
+        announcement, alice, bob = records()
+        self.assertEqual(announcement["type"], "announcement")
+        self.assertIsNone(announcement["speaker"])
+        self.assertEqual((alice["type"], alice["index"], alice["round"]), ("turn", 1, 2))
+        # The "[Speaker]" header is dropped, from a Message or from rendered text
+        self.assertEqual(alice["text"], "I disagree & here's why.")
+        self.assertEqual(bob["text"], "Fair point.")
+
+
+class ExporterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def export(self, exporter_class, name):
+        exporter = exporter_class(os.path.join(self.directory, "out", name))
+        exporter.start("Cats & <dogs>")
+        for record in records():
+            exporter.export(record)
+        exporter.close()
+        self.assertEqual(exporter.records_written, 3)
+        with open(exporter.path, encoding='utf-8') as f:
+            return f.read()
+
+    def test_jsonl(self):
+        lines = self.export(JSONLExporter, "run.jsonl").splitlines()
+        self.assertEqual([json.loads(line) for line in lines], records())
+
+    def test_markdown(self):
+        text = self.export(MarkdownExporter, "run.md")
+        self.assertTrue(text.startswith("# Cats & <dogs>\n\n"))
+        self.assertIn("> Greetings, <curious> minds!\n>\n> Today's topic", text)
+        self.assertIn("## Alice\n\n_Round 2 · OpenAI gpt-4o · challenge · 1.23 s · "
+                      "120 prompt + 30 completion tokens_\n\nI disagree & here's why.", text)
+        self.assertIn("## Bob\n\n_Final round · ", text)
+
+    def test_html(self):
+        text = self.export(HTMLExporter, "run.html")
+        self.assertTrue(text.startswith("<!DOCTYPE html>"))
+        self.assertTrue(text.endswith("</body>\n</html>\n"))
+        self.assertIn("<title>Cats &amp; &lt;dogs&gt;</title>", text)
+        self.assertIn("<section class=\"announcement text\" id=\"m0\">Greetings, &lt;curious&gt; minds!", text)
+        self.assertIn("<article class=\"turn challenge\" id=\"m1\">", text)
+        self.assertIn("<div class=\"text\">I disagree &amp; here&#x27;s why.</div>", text)
+        self.assertIn("<article class=\"turn\" id=\"m2\">", text)
+
+    def test_restart_replaces_the_file(self):
+        exporter = JSONLExporter(os.path.join(self.directory, "run.jsonl"))
+        exporter.start("First")
+        exporter.export(records()[0])
+        exporter.start("Second")
+        exporter.export(records()[1])
+        exporter.close()
+        with open(exporter.path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)["index"] for line in f], [1])
+
+    def test_background_exporter_writes_the_same_file(self):
+        expected = self.export(MarkdownExporter, "direct.md")
+        exporter = create_exporter(os.path.join(self.directory, "out", "background.md"), background=True)
+        self.assertIsInstance(exporter, BackgroundExporter)
+        exporter.start("Cats & <dogs>")
+        for record in records():
+            exporter.export(record)
+        exporter.close()
+        with open(exporter.path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), expected)
+
+
+class ExportPathTest(unittest.TestCase):
+    def test_format_from_extension(self):
+        self.assertIsInstance(create_exporter("run.MD"), MarkdownExporter)
+        self.assertIsInstance(create_exporter("run.htm"), HTMLExporter)
+        self.assertIsInstance(create_exporter("run.txt", "jsonl"), JSONLExporter)
+        with self.assertRaises(ValueError):
+            create_exporter("run.txt")
+
+    def test_export_path_next_to_the_output(self):
+        self.assertEqual(export_path_for(os.path.join("out", "geo.txt"), "html"), os.path.join("out", "geo.html"))
+
+
+if __name__ == "__main__":
+    unittest.main()
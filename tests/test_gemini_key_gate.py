@@ -0,0 +1,89 @@
+"""GeminiKeyGate: one process-wide Gemini API key at a time"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_clients import GeminiKeyGate
+
+
+class RecordingGenai:
+    """Stands in for the genai module: records configure() calls"""
+    def __init__(self):
+        self.keys = []
+
+    def configure(self, api_key):
+        self.keys.append(api_key)
+
+
+class GeminiKeyGateTest(unittest.TestCase):
+    def setUp(self):
+        self.gate = GeminiKeyGate()
+        self.genai = RecordingGenai()
+
+    def test_same_key_requests_overlap_and_configure_once(self):
+        self.gate.acquire(self.genai, "key-a")
+        self.gate.acquire(self.genai, "key-a")
+        self.gate.release()
+        self.gate.release()
+        self.assertEqual(self.genai.keys, ["key-a"])
+
+    def test_other_key_waits_for_requests_in_flight(self):
+        self.gate.acquire(self.genai, "key-a")
+        switched = threading.Event()
+
+        def other_key():
+            self.gate.acquire(self.genai, "key-b")
+            switched.set()
+            self.gate.release()
+
+        thread = threading.Thread(target=other_key)
+        thread.start()
+        time.sleep(0.05)
+        # Key A's request is still running, so the key must not change under it
+        self.assertFalse(switched.is_set())
+        self.assertEqual(self.genai.keys, ["key-a"])
+
+        self.gate.release()
+        thread.join(1)
+        self.assertTrue(switched.is_set())
+        self.assertEqual(self.genai.keys, ["key-a", "key-b"])
+
+    def test_async_wait_keeps_the_loop_running(self):
+        async def scenario():
+            await self.gate.aacquire(self.genai, "key-a")
+            waiter = asyncio.ensure_future(self.gate.aacquire(self.genai, "key-b"))
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiter.done())
+            self.gate.release()
+            await asyncio.wait_for(waiter, 1)
+            self.gate.release()
+
+        asyncio.run(scenario())
+        self.assertEqual(self.genai.keys, ["key-a", "key-b"])
+
+    def test_cancelled_async_wait_gives_the_key_back(self):
+        async def scenario():
+            await self.gate.aacquire(self.genai, "key-a")
+            waiter = asyncio.ensure_future(self.gate.aacquire(self.genai, "key-b"))
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            self.gate.release()
+            # The cancelled waiter's thread takes key B and hands it straight back
+            await asyncio.sleep(0.05)
+
+        asyncio.run(scenario())
+        self.gate.acquire(self.genai, "key-c")
+        self.gate.release()
+        self.assertEqual(self.genai.keys, ["key-a", "key-b", "key-c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Coalescing simulation events into GUI frames"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui_updates import REQUEST, TOKEN, GUIUpdateQueue, StreamStats
+
+
+class GUIUpdateQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.updates = GUIUpdateQueue()
+
+    def test_empty_queue_gives_no_frame(self):
+        self.assertIsNone(self.updates.drain())
+
+    def test_messages_progress_and_status_coalesce(self):
+        self.updates.post_message("[Alice]\nHello")
+        self.updates.post_progress(10)
+        self.updates.post_status("Round 1")
+        self.updates.post_message("[Bob]\nHi")
+        self.updates.post_progress(20)
+        self.updates.post_status("Round 2")
+
+        frame = self.updates.drain()
+        self.assertEqual(frame.text, "[Alice]\nHello\n\n[Bob]\nHi\n\n")
+        self.assertEqual((frame.progress, frame.status), (20, "Round 2"))
+        self.assertFalse(frame.drop_stream)
+        self.assertIsNone(self.updates.drain())
+
+    def test_calls_run_in_order(self):
+        self.updates.post_call(print, "a")
+        self.updates.post_message("[Alice]\nHello")
+        self.updates.post_call(len, "bc")
+        self.assertEqual(self.updates.drain().calls, [(print, ("a",)), (len, ("bc",))])
+
+    def test_reply_streamed_and_finished_in_one_frame(self):
+        self.updates.post_message("[Alice]\nHello")
+        self.updates.post_token("Bob", "Hi")
+        self.updates.post_token("Bob", " there")
+        self.updates.post_message("[Bob]\nHi there")
+
+        frame = self.updates.drain()
+        # The streamed text is replaced by the finished message
+        self.assertEqual(frame.text, "[Alice]\nHello\n\n[Bob]\nHi there\n\n")
+        self.assertFalse(frame.drop_stream)
+        self.assertIsNone(frame.streaming_speaker)
+
+    def test_reply_streamed_across_frames(self):
+        self.updates.post_message("[Alice]\nHello")
+        self.updates.post_token("Bob", "Hi")
+        frame = self.updates.drain()
+        self.assertEqual(frame.text, "[Alice]\nHello\n\n[Bob]\nHi")
+        self.assertEqual(frame.stream_offset, len("[Alice]\nHello\n\n"))
+        self.assertEqual(frame.streaming_speaker, "Bob")
+
+        self.updates.post_token("Bob", " there")
+        frame = self.updates.drain()
+        self.assertEqual(frame.text, " there")
+        self.assertIsNone(frame.stream_offset)
+
+        self.updates.post_token("Bob", "!")
+        self.updates.post_message("[Bob]\nHi there!")
+        frame = self.updates.drain()
+        # The earlier frames' streamed text is dropped and replaced
+        self.assertTrue(frame.drop_stream)
+        self.assertEqual(frame.text, "[Bob]\nHi there!\n\n")
+
+    def test_new_speaker_drops_an_unfinished_reply(self):
+        self.updates.post_token("Alice", "Half a")
+        self.updates.post_token("Bob", "Hi")
+        frame = self.updates.drain()
+        self.assertEqual(frame.text, "[Bob]\nHi")
+        self.assertEqual(frame.stream_offset, 0)
+        self.assertEqual(frame.streaming_speaker, "Bob")
+
+    def test_stream_stats(self):
+        # Events with fixed timestamps, as post_request/post_token queue them
+        self.updates._events.extend([
+            (REQUEST, "Bob", 10.0),
+            (TOKEN, "Bob", "Hi", 10.5),
+            (TOKEN, "Bob", " there", 10.75),
+            (TOKEN, "Bob", "!", 11.0),
+        ])
+        stats = self.updates.drain().stream_stats
+        self.assertEqual(stats.tokens, 3)
+        self.assertAlmostEqual(stats.time_to_first_token, 0.5)
+        self.assertAlmostEqual(stats.tokens_per_second, 4.0)
+        self.assertEqual(stats.describe(), "Bob: 3 tokens · 4.0 tokens/s · first token after 0.50 s")
+
+    def test_reset_forgets_the_stream(self):
+        self.updates.post_token("Bob", "Hi")
+        self.updates.drain()
+        self.updates.post_message("[Alice]\nHello")
+        self.updates.reset()
+        self.assertIsNone(self.updates.drain())
+        self.assertIsNone(self.updates.streaming_speaker)
+        self.assertEqual(self.updates.stream_stats, {})
+
+
+class StreamStatsTest(unittest.TestCase):
+    def test_needs_two_tokens_for_a_rate(self):
+        stats = StreamStats("Bob")
+        self.assertEqual(stats.describe(), "Bob: waiting for the first token...")
+        stats.add_token(1.0)
+        self.assertIsNone(stats.tokens_per_second)
+        self.assertIsNone(stats.time_to_first_token)
+        self.assertEqual(stats.describe(), "Bob: 1 tokens")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Adaptive concurrency, cooldowns and rate-limit detection in ProviderRateLimiter"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import ProviderRateLimiter, TokenBucket, is_rate_limit_error
+
+
+class StatusError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RateLimitErrorTest(unittest.TestCase):
+    def test_structured_status(self):
+        self.assertTrue(is_rate_limit_error(StatusError("Too many", status_code=429)))
+        self.assertFalse(is_rate_limit_error(StatusError("Bad request", status_code=400)))
+
+    def test_status_in_message(self):
+        for message in ("Error code: 429 - {'error': {'type': 'requests'}}", "HTTP 429",
+                        "429 Too Many Requests", "429 Resource has been exhausted (e.g. check quota).",
+                        "API error occurred: Status 429", "Rate limit reached for gpt-4o"):
+            self.assertTrue(is_rate_limit_error(Exception(message)), message)
+
+    def test_other_429s_in_message(self):
+        for message in ("This model's maximum context length is 4290 tokens",
+                        "Error code: 400 - max_tokens: 429 is too large", "request req_429ab failed",
+                        "model gpt-429 not found"):
+            self.assertFalse(is_rate_limit_error(Exception(message)), message)
+
+
+class AdaptiveConcurrencyTest(unittest.TestCase):
+    def call(self, limiter, latency=None, **release_args):
+        ticket = limiter.acquire()
+        if latency is not None:
+            ticket.started_at = time.monotonic() - latency
+        limiter.release(ticket, **release_args)
+
+    def test_rate_limit_halves_the_limit_and_cools_down(self):
+        limiter = ProviderRateLimiter(max_concurrency=16, initial_concurrency=8)
+        self.call(limiter, rate_limited=True, retry_after=0.1)
+
+        self.assertEqual(limiter.concurrency_limit, 4)
+        self.assertEqual(limiter.rate_limited_count, 1)
+        started = time.monotonic()
+        limiter.release(limiter.acquire())
+        self.assertGreaterEqual(time.monotonic() - started, 0.08)
+
+    def test_limit_never_drops_below_the_minimum(self):
+        limiter = ProviderRateLimiter(initial_concurrency=2, min_concurrency=1)
+        for _ in range(3):
+            limiter.blocked_until = 0.0
+            self.call(limiter, rate_limited=True, retry_after=0)
+        self.assertEqual(limiter.concurrency_limit, 1)
+
+    def test_normal_latency_grows_the_limit_up_to_the_maximum(self):
+        limiter = ProviderRateLimiter(max_concurrency=5, initial_concurrency=4)
+        self.call(limiter, latency=0.1)
+        self.assertAlmostEqual(limiter.concurrency_limit, 4.25)
+        for _ in range(50):
+            self.call(limiter, latency=0.1)
+        self.assertEqual(limiter.concurrency_limit, 5)
+
+    def test_latency_spike_shrinks_the_limit(self):
+        limiter = ProviderRateLimiter(initial_concurrency=8)
+        self.call(limiter, latency=0.1)
+        before = limiter.concurrency_limit
+        self.call(limiter, latency=1.0)
+        self.assertAlmostEqual(limiter.concurrency_limit, before * 0.9)
+
+    def test_failed_calls_leave_the_limit_alone(self):
+        limiter = ProviderRateLimiter(initial_concurrency=8)
+        self.call(limiter, latency=5.0, failed=True)
+        self.assertEqual(limiter.concurrency_limit, 8)
+        self.assertIsNone(limiter.latency_baseline)
+
+    def test_callers_wait_for_a_free_slot(self):
+        limiter = ProviderRateLimiter(initial_concurrency=1)
+        ticket = limiter.acquire()
+        admitted = threading.Event()
+
+        def second_call():
+            limiter.release(limiter.acquire())
+            admitted.set()
+
+        thread = threading.Thread(target=second_call)
+        thread.start()
+        self.assertFalse(admitted.wait(0.05))
+        limiter.release(ticket)
+        thread.join(1)
+        self.assertTrue(admitted.is_set())
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_async_callers_respect_the_cooldown(self):
+        limiter = ProviderRateLimiter()
+        self.call(limiter, rate_limited=True, retry_after=0.1)
+
+        async def call():
+            started = time.monotonic()
+            limiter.release(await limiter.aacquire())
+            return time.monotonic() - started
+
+        self.assertGreaterEqual(asyncio.run(call()), 0.08)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_reservations_beyond_the_balance_wait(self):
+        bucket = TokenBucket(rate_per_minute=600, capacity=10)
+        self.assertEqual(bucket.reserve(10), 0.0)
+        # 5 tokens short at 10 tokens per second
+        self.assertAlmostEqual(bucket.reserve(5), 0.5, places=1)
+        bucket.refund(5)
+        self.assertLess(bucket.reserve(1), 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Circuit breaker and rate limiter bookkeeping around failed, rate-limited and cancelled calls"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_clients import BaseLLMClient, LLMResponse
+from resilience import CircuitBreaker, configure_resilience
+
+
+RESET_TIMEOUT = 0.05
+
+
+class StatusError(Exception):
+    """An SDK-style error carrying an HTTP status (and a zero Retry-After for 429s)"""
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": {"retry-after": "0"}})()
+
+
+class ScriptedClient(BaseLLMClient):
+    """Raises the scripted errors in turn, then answers "ok" """
+    def __init__(self, provider_name, errors):
+        super().__init__("key", "v1", provider_name)
+        self.errors = list(errors)
+
+    def _generate(self, prompt, max_tokens, temperature):
+        if self.errors:
+            raise self.errors.pop(0)
+        return LLMResponse(text="ok", provider=self.provider_name)
+
+
+def scripted_client(test, errors):
+    provider_name = f"Scripted-{test.id()}"
+    configure_resilience(provider_name, max_retries=0, breaker_threshold=1, breaker_reset=RESET_TIMEOUT)
+    return ScriptedClient(provider_name, errors)
+
+
+class RateLimitedTrialTest(unittest.TestCase):
+    def test_requeued_trial_can_close_the_circuit(self):
+        client = scripted_client(self, [StatusError(503), StatusError(429)])
+
+        self.assertTrue(client.generate("hi").is_error)
+        self.assertEqual(client.circuit_breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(RESET_TIMEOUT * 2)
+        # The trial is rate limited, requeued, and then succeeds
+        response = client.generate("hi")
+        self.assertFalse(response.is_error, response.error)
+        self.assertEqual(client.circuit_breaker.state, CircuitBreaker.CLOSED)
+
+    def test_abandoned_trial_frees_the_slot(self):
+        requeues = ScriptedClient.max_rate_limit_requeues
+        client = scripted_client(self, [StatusError(503)] + [StatusError(429)] * (requeues + 1))
+
+        self.assertTrue(client.generate("hi").is_error)
+        time.sleep(RESET_TIMEOUT * 2)
+        # The trial gives up after being rate limited every time...
+        self.assertTrue(client.generate("hi").is_error)
+
+        # ...but the breaker isn't stuck half-open with the slot taken
+        self.assertTrue(client.is_available())
+        self.assertFalse(client.generate("hi").is_error)
+        self.assertEqual(client.circuit_breaker.state, CircuitBreaker.CLOSED)
+
+
+class HangingClient(ScriptedClient):
+    """Scripted errors first, then async requests that never finish"""
+    async def _agenerate(self, prompt, max_tokens, temperature):
+        if self.errors:
+            raise self.errors.pop(0)
+        await asyncio.sleep(3600)
+
+
+class CancelledCallTest(unittest.TestCase):
+    def test_cancelled_trial_releases_limiter_and_breaker(self):
+        provider_name = f"Scripted-{self.id()}"
+        configure_resilience(provider_name, max_retries=0, breaker_threshold=1, breaker_reset=RESET_TIMEOUT)
+        client = HangingClient(provider_name, [StatusError(503)])
+
+        async def cancel_trial():
+            self.assertTrue((await client.agenerate("hi")).is_error)
+            await asyncio.sleep(RESET_TIMEOUT * 2)
+            task = asyncio.ensure_future(client.agenerate("hi"))
+            await asyncio.sleep(0.01)
+            self.assertEqual(client.rate_limiter.in_flight, 1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_trial())
+        self.assertEqual(client.rate_limiter.in_flight, 0)
+        self.assertTrue(client.is_available())
+
+
+if __name__ == "__main__":
+    unittest.main()
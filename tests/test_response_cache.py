@@ -0,0 +1,121 @@
+"""The on-disk response cache: keys, LRU eviction and read-only mode"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache, make_cache_key, settings_seed
+
+
+def key(prompt, max_tokens=100, temperature=0.4):
+    return make_cache_key("OpenAI", "gpt-4o", prompt, max_tokens, temperature)
+
+
+class CacheKeyTest(unittest.TestCase):
+    def test_whitespace_is_ignored(self):
+        self.assertEqual(key("Hello   world\n\n[Alice]\nHi"), key(" Hello world [Alice] Hi "))
+
+    def test_request_settings_are_part_of_the_key(self):
+        self.assertNotEqual(key("Hello"), key("Hello!"))
+        self.assertNotEqual(key("Hello"), key("Hello", max_tokens=200))
+        self.assertNotEqual(key("Hello"), key("Hello", temperature=0.5))
+        self.assertNotEqual(key("Hello"), make_cache_key("OpenAI", "gpt-4o-mini", "Hello", 100, 0.4))
+        # An int temperature is the same request as the equal float
+        self.assertEqual(key("Hello", temperature=1), key("Hello", temperature=1.0))
+
+    def test_settings_seed_is_stable(self):
+        self.assertEqual(settings_seed("Topic", [("Alice", None, "v1")], 3000),
+                         settings_seed("Topic", [("Alice", None, "v1")], 3000))
+        self.assertNotEqual(settings_seed("Topic", 3000), settings_seed("Other topic", 3000))
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open_cache(self, **settings):
+        cache = ResponseCache(self.path, **settings)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_round_trip_and_counters(self):
+        cache = self.open_cache()
+        self.assertIsNone(cache.get(key("a")))
+        cache.put(key("a"), {"text": "A"})
+        self.assertEqual(cache.get(key("a")), {"text": "A"})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_entries_persist_across_instances(self):
+        cache = ResponseCache(self.path)
+        cache.put(key("a"), {"text": "A"})
+        cache.close()
+        self.assertEqual(self.open_cache().get(key("a")), {"text": "A"})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = self.open_cache(max_entries=2)
+        cache.put(key("a"), {"text": "A"})
+        cache.put(key("b"), {"text": "B"})
+        # Reading "a" makes "b" the least recently used
+        cache.get(key("a"))
+        cache.put(key("c"), {"text": "C"})
+
+        self.assertEqual(cache.entries, 2)
+        self.assertIsNone(cache.get(key("b")))
+        self.assertIsNotNone(cache.get(key("a")))
+        self.assertIsNotNone(cache.get(key("c")))
+
+    def test_size_limit_evicts(self):
+        cache = self.open_cache(max_bytes=100)
+        for name in "abcd":
+            cache.put(key(name), {"text": name * 30})
+        self.assertLessEqual(cache.size, 100)
+        self.assertIsNotNone(cache.get(key("d")))
+        self.assertIsNone(cache.get(key("a")))
+
+    def test_replacing_an_entry_keeps_the_counts(self):
+        cache = self.open_cache()
+        cache.put(key("a"), {"text": "A"})
+        cache.put(key("a"), {"text": "AAAA"})
+        self.assertEqual(cache.entries, 1)
+        self.assertEqual(cache.get(key("a")), {"text": "AAAA"})
+
+    def test_lowered_limits_apply_on_open(self):
+        cache = ResponseCache(self.path)
+        for name in "abc":
+            cache.put(key(name), {"text": name})
+        cache.close()
+        self.assertEqual(self.open_cache(max_entries=1).entries, 1)
+
+    def test_read_only_serves_hits_without_writing(self):
+        cache = ResponseCache(self.path)
+        cache.put(key("a"), {"text": "A"})
+        cache.close()
+
+        cache = self.open_cache(read_only=True)
+        self.assertEqual(cache.get(key("a")), {"text": "A"})
+        cache.put(key("b"), {"text": "B"})
+        self.assertIsNone(cache.get(key("b")))
+        self.assertEqual(cache.entries, 1)
+
+    def test_read_only_needs_an_existing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            ResponseCache(self.path, read_only=True)
+
+    def test_clear(self):
+        cache = self.open_cache()
+        cache.put(key("a"), {"text": "A"})
+        cache.clear()
+        self.assertEqual((cache.entries, cache.size), (0, 0))
+        self.assertIsNone(cache.get(key("a")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Usage accounting of a simulation's provider calls"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_strategies import LLMSummarizer, create_context_strategy
+from conversation import SUMMARIZER_USAGE_NAME, ConversationManager
+from fake_provider import configure_fake_provider
+from llm_clients import LLMClientPool
+
+
+class SummarizerUsageTest(unittest.TestCase):
+    def test_summary_calls_are_counted(self):
+        configure_fake_provider(latency="0", response_tokens="40", seed=0)
+        client_pool = LLMClientPool()
+        summarizer = LLMSummarizer(client_pool.get(provider="fake", api_key="", model_version="fake-summary"))
+        conversation = ConversationManager(
+            models_list=[{"name": f"Panelist{i}", "provider": "fake", "apikey": "", "version": "fake-1"}
+                         for i in range(1, 4)],
+            topic="Testing",
+            style_prompt="Discuss.",
+            final_round_prompt="Conclude.",
+            max_characters=3000,
+            client_pool=client_pool,
+            context_strategy=create_context_strategy("summary", summary_every=2, summarizer=summarizer)
+        )
+        conversation.start_simulation()
+
+        summary_usage = conversation.usage.speakers.get(SUMMARIZER_USAGE_NAME)
+        self.assertIsNotNone(summary_usage)
+        self.assertGreater(summary_usage.calls, 0)
+        self.assertGreater(summary_usage.completion_tokens, 0)
+        panelist_calls = sum(totals.calls for name, totals in conversation.usage.speakers.items()
+                             if name != SUMMARIZER_USAGE_NAME)
+        self.assertEqual(conversation.usage.total.calls, panelist_calls + summary_usage.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+Span tracing of simulation phases, written as a Chrome trace (the JSON
+"Trace Event Format"), which chrome://tracing and https://ui.perfetto.dev
+can open.
+
+Each run, round and turn is a span, with child spans for building the
+prompt, getting the speaker's client, the provider call (split into waiting
+on the rate limiter, the request itself and any retry backoff), sanitizing
+the reply and the on_message callback. Spans are grouped into one track per
+thread, or per asyncio task on the async engine.
+
+Tracing is off unless start_tracing() is called. While it is off, span()
+returns a shared do-nothing span, so the instrumentation costs one function
+call and a None check.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+
+class _NullSpan:
+    """Stands in for a span while tracing is off"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed phase; extra args can be attached with set() while it is open"""
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.track = None
+        self.started_at = None
+
+    def __enter__(self):
+        self.track = self.tracer.current_track()
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        ended_at = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self, ended_at)
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+class Tracer:
+    """Collects spans in memory and writes them to `path` when closed"""
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._events = []
+        self._tracks = {}  # id of a thread or task -> track number
+        self._lock = threading.Lock()
+
+    def span(self, name, category, args):
+        return Span(self, name, category, args)
+
+    def current_track(self):
+        """The track number for the running asyncio task, or else the current thread"""
+        try:
+            owner = asyncio.current_task()
+        except RuntimeError:
+            owner = None
+        if owner is None:
+            owner = threading.current_thread()
+        key = id(owner)
+        track = self._tracks.get(key)
+        if track is None:
+            with self._lock:
+                track = self._tracks.get(key)
+                if track is None:
+                    track = self._tracks[key] = len(self._tracks) + 1
+                    label = owner.get_name() if isinstance(owner, asyncio.Task) else owner.name
+                    self._events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": track,
+                                         "args": {"name": label}})
+        return track
+
+    def record(self, span, ended_at):
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": round((span.started_at - self._origin) * 1e6, 3),
+            "dur": round((ended_at - span.started_at) * 1e6, 3),
+            "pid": self.pid,
+            "tid": span.track,
+        }
+        if span.args:
+            event["args"] = span.args
+        with self._lock:
+            self._events.append(event)
+
+    def close(self):
+        """Write the trace file (again, if spans were added since the last close)"""
+        with self._lock:
+            events = list(self._events)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+
+# Process-wide tracer (None while tracing is off)
+_tracer = None
+
+
+def span(name, category="conversation", **args):
+    """A context manager timing one phase, or a shared no-op while tracing is off"""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, category, args)
+
+
+def get_tracer():
+    """The process-wide tracer, or None when tracing is off"""
+    return _tracer
+
+
+def start_tracing(path):
+    """Start collecting spans for a trace written to `path` by stop_tracing()"""
+    global _tracer
+    _tracer = Tracer(path)
+    return _tracer
+
+
+def stop_tracing():
+    """Write the trace file and turn tracing off; returns the file's path (None if tracing was off)"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    tracer.close()
+    return tracer.path
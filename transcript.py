@@ -0,0 +1,107 @@
+"""
+Append-only transcript output. Every message is written to the output file as
+soon as it is added to the conversation, so a crash, Ctrl+C or a stopped run
+still leaves everything generated so far on disk, and writing the finished
+conversation costs nothing.
+"""
+
+import os
+import signal
+import threading
+
+from messages import write_message
+
+
+FLUSH_POLICIES = ("none", "message", "fsync")
+DEFAULT_FLUSH_POLICY = "message"
+
+
+class TranscriptWriter:
+    """
+    Writes messages to `path` in the same format as
+    ConversationManager.write_to_file, one append per message. The flush
+    policy decides how far each message is pushed:
+
+        none     left to Python's buffering until the transcript is closed
+        message  flushed to the OS (survives the program crashing)
+        fsync    flushed and fsynced (survives the machine crashing)
+
+    The file is always flushed and fsynced when the transcript is closed.
+    """
+    def __init__(self, path, flush_policy=DEFAULT_FLUSH_POLICY):
+        if flush_policy not in FLUSH_POLICIES:
+            raise ValueError(f"Unknown flush policy '{flush_policy}' (choose from {', '.join(FLUSH_POLICIES)})")
+        self.path = path
+        self.flush_policy = flush_policy
+        self.messages_written = 0
+        self._file = None
+        # Re-entrant so a signal handler can close the file mid-append
+        self._lock = threading.RLock()
+
+    def start(self):
+        """Begin a new transcript, replacing the file's contents"""
+        with self._lock:
+            self.close()
+            self._open('w')
+            self.messages_written = 0
+
+    def _open(self, mode):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, mode, encoding='utf-8')
+
+    def append(self, message):
+        """Write one message, then flush according to the policy"""
+        with self._lock:
+            if self._file is None:
+                # Closed early (e.g. by a signal): keep adding to what's there
+                self._open('a')
+            write_message(self._file, message)
+            self.messages_written += 1
+            if self.flush_policy != "none":
+                self._flush(fsync=self.flush_policy == "fsync")
+
+    def _flush(self, fsync):
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def holds(self, filename, message_count):
+        """True if this transcript is `filename` and already contains `message_count` messages"""
+        return (os.path.abspath(filename) == os.path.abspath(self.path)
+                and self.messages_written == message_count)
+
+    def close(self):
+        """Flush and fsync whatever is buffered, then close the file"""
+        with self._lock:
+            if self._file is not None:
+                self._flush(fsync=True)
+                self._file.close()
+                self._file = None
+
+
+def close_on_signals(*writers, signals=(signal.SIGINT, signal.SIGTERM)):
+    """
+    Close (flush and fsync) each writer, e.g. a TranscriptWriter, when the
+    process gets SIGINT or SIGTERM, before the signal's previous handling
+    (KeyboardInterrupt for SIGINT, exiting for SIGTERM). None entries are
+    ignored. Only works from the main thread.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    writers = [writer for writer in writers if writer is not None]
+
+    previous_handlers = {}
+
+    def handler(signum, frame):
+        for writer in writers:
+            writer.close()
+        previous = previous_handlers.get(signum)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            raise SystemExit(128 + signum)
+
+    for signum in signals:
+        previous_handlers[signum] = signal.signal(signum, handler)
@@ -0,0 +1,144 @@
+"""Token usage and latency totals for a simulation, per speaker and per run"""
+
+import threading
+from collections import Counter
+
+
+class UsageTotals:
+    """Running totals over a set of LLM responses"""
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.characters = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.finish_reasons = Counter()
+
+    def add(self, response):
+        """Fold one LLMResponse into the totals"""
+        self.calls += 1
+        if response.is_error:
+            self.errors += 1
+        else:
+            self.characters += len(response.text)
+        if getattr(response, "from_cache", False):
+            # Cache hits cost nothing, so their tokens aren't counted
+            self.cache_hits += 1
+        else:
+            self.prompt_tokens += response.prompt_tokens or 0
+            self.completion_tokens += response.completion_tokens or 0
+            self.cached_tokens += response.cached_tokens or 0
+        if response.latency is not None:
+            self.latency_total += response.latency
+            self.latency_max = max(self.latency_max, response.latency)
+        if response.finish_reason:
+            self.finish_reasons[str(response.finish_reason)] += 1
+
+    def merge(self, other):
+        """Add another UsageTotals into this one"""
+        self.calls += other.calls
+        self.errors += other.errors
+        self.cache_hits += other.cache_hits
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cached_tokens += other.cached_tokens
+        self.characters += other.characters
+        self.latency_total += other.latency_total
+        self.latency_max = max(self.latency_max, other.latency_max)
+        self.finish_reasons.update(other.finish_reasons)
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def latency_mean(self):
+        return self.latency_total / self.calls if self.calls else 0.0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "total_tokens": self.total_tokens,
+            "characters": self.characters,
+            "latency_mean": round(self.latency_mean, 3),
+            "latency_max": round(self.latency_max, 3),
+            "latency_total": round(self.latency_total, 3),
+            "finish_reasons": dict(self.finish_reasons),
+        }
+
+
+class UsageReport:
+    """Thread-safe usage totals keyed by speaker, plus the run total"""
+    def __init__(self):
+        self.speakers = {}
+        self._lock = threading.Lock()
+
+    def record(self, speaker, response):
+        """Add a response from `speaker`"""
+        with self._lock:
+            totals = self.speakers.get(speaker)
+            if totals is None:
+                totals = self.speakers[speaker] = UsageTotals()
+            totals.add(response)
+
+    def reset(self):
+        with self._lock:
+            self.speakers = {}
+
+    @property
+    def total(self):
+        """UsageTotals across every speaker"""
+        total = UsageTotals()
+        with self._lock:
+            for totals in self.speakers.values():
+                total.merge(totals)
+        return total
+
+    def as_dict(self):
+        with self._lock:
+            speakers = {name: totals.as_dict() for name, totals in self.speakers.items()}
+        return {"speakers": speakers, "total": self.total.as_dict()}
+
+
+def format_usage_table(report):
+    """Render a UsageReport as a plain-text table"""
+    header = ("Speaker", "Calls", "Errors", "Cache hits", "Prompt", "Completion", "Cached", "Avg s", "Max s", "Finish")
+    rows = []
+    for name, totals in list(report.speakers.items()) + [("TOTAL", report.total)]:
+        finish = ", ".join(f"{reason} {count}" for reason, count in totals.finish_reasons.most_common())
+        rows.append((
+            name,
+            str(totals.calls),
+            str(totals.errors),
+            str(totals.cache_hits),
+            str(totals.prompt_tokens),
+            str(totals.completion_tokens),
+            str(totals.cached_tokens),
+            f"{totals.latency_mean:.2f}",
+            f"{totals.latency_max:.2f}",
+            finish or "-",
+        ))
+
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+
+    def format_row(row):
+        # Left-align names and finish reasons, right-align the numbers
+        cells = [row[0].ljust(widths[0])]
+        cells += [cell.rjust(width) for cell, width in zip(row[1:-1], widths[1:-1])]
+        cells.append(row[-1])
+        return "  ".join(cells)
+
+    separator = "-" * len(format_row(header))
+    lines = [format_row(header), separator]
+    lines += [format_row(row) for row in rows[:-1]]
+    lines += [separator, format_row(rows[-1])]
+    return "\n".join(lines)
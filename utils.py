@@ -33,7 +33,8 @@ def load_models_from_config(config_data: dict) -> list:
     """
     Reads model info from the config dictionary.
     Expects keys like MODEL1_NAME, MODEL1_APIKEY, MODEL1_VERSION, MODEL2_NAME, etc.
-    Returns a list of dicts, each with 'name', 'apikey', and 'version'.
+    Returns a list of dicts, each with 'name', 'apikey', and 'version', plus
+    'provider' when an optional MODELn_PROVIDER key is given.
     """
     models = []
     i = 1
@@ -48,6 +49,8 @@ def load_models_from_config(config_data: dict) -> list:
                 'apikey': config_data.get(api_key, None),
                 'version': config_data.get(version_key, None)
             }
+            if config_data.get(f"MODEL{i}_PROVIDER"):
+                model_info['provider'] = config_data[f"MODEL{i}_PROVIDER"]
             models.append(model_info)
             i += 1
         else:
@@ -66,8 +69,11 @@ def get_default_models() -> list:
     ]
 
 
-def create_config_file_content(models, output_file="conversation_output.txt") -> str:
-    """Creates the content for a config.txt file based on model configurations"""
+def create_config_file_content(models, output_file="conversation_output.txt", extra_settings=None) -> str:
+    """
+    Creates the content for a config.txt file based on model configurations.
+    Any other settings (e.g. rate limits) in `extra_settings` are written after OUTPUT_FILE.
+    """
     config_lines = ["# config.txt\n"]
     
     # Add API URLs as comments
@@ -93,10 +99,35 @@ def create_config_file_content(models, output_file="conversation_output.txt") ->
             if 'version' in model and model['version']:
                 config_lines.append(f"MODEL{index}_VERSION={model['version']}")
                 
+            if model.get('provider'):
+                config_lines.append(f"MODEL{index}_PROVIDER={model['provider']}")
+                
             # Add a blank line between models
             config_lines.append("")
     
     # Add output file
     config_lines.append(f"OUTPUT_FILE={output_file}")
     
-    return "\n".join(config_lines)
\ No newline at end of file
+    # Keep any other settings
+    if extra_settings:
+        config_lines.append("")
+        for key, value in extra_settings.items():
+            config_lines.append(f"{key}={value}")
+    
+    return "\n".join(config_lines)
+
+
+def describe_provider_event(speaker: str, event: str, details: dict) -> str:
+    """Human-readable line for a retry / rate-limit / circuit-breaker event"""
+    provider = details['provider']
+    if event == "retry":
+        return (f"{speaker} ({provider}): retry {details['attempt']}/{details['max_retries']} "
+                f"in {details['delay']:.1f}s after error: {details['error']}")
+    if event == "rate_limited":
+        return f"{speaker} ({provider}): rate limited, re-queued (attempt {details['requeue']})"
+    if event == "circuit_open":
+        return (f"{speaker} ({provider}): circuit opened after repeated failures, "
+                f"pausing for {details['reset_timeout']:.0f}s")
+    if event == "circuit_closed":
+        return f"{speaker} ({provider}): provider recovered, circuit closed"
+    return f"{speaker} ({provider}): {event}"
\ No newline at end of file